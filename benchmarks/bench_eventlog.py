@@ -0,0 +1,72 @@
+"""Event loop time spent per access log event, synchronous vs. batched writer.
+
+The synchronous writer encodes and writes each event where it happens, as a
+logging FileHandler would. The EventLog only queues a dict for its writer
+thread. Reported is the time the emitting thread spends per event, plus the
+events the EventLog dropped with a small queue.
+
+Run with: uv run python -m benchmarks.bench_eventlog [-n 200000]
+"""
+
+import argparse
+import json
+import os
+import tempfile
+import time
+from typing import Any
+
+from src.config import AccessLogConfig
+from src.eventlog import EventLog
+
+
+def synchronous(path: str, events: int) -> float:
+    start = time.perf_counter()
+    with open(path, "a") as f:
+        for i in range(events):
+            record: dict[str, Any] = {
+                "ts": round(time.time(), 3),
+                "event": "join",
+                "nick": f"u{i % 1000}",
+                "channel": "#bench",
+            }
+            f.write(json.dumps(record, separators=(",", ":")) + "\n")
+            f.flush()
+    return time.perf_counter() - start
+
+
+def batched(path: str, events: int, queue_size: int) -> tuple[float, float, int]:
+    log = EventLog(AccessLogConfig(path=path, queue_size=queue_size))
+    start = time.perf_counter()
+    for i in range(events):
+        log.emit("join", nick=f"u{i % 1000}", channel="#bench")
+    emitted = time.perf_counter() - start
+    log.close()
+    return emitted, time.perf_counter() - start, log.dropped
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("-n", "--events", type=int, default=200000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        print(f"{args.events} events")
+        print(f"{'writer':<22}{'us/event on loop':>18}{'total s':>9}{'dropped':>9}")
+
+        elapsed = synchronous(os.path.join(directory, "sync.jsonl"), args.events)
+        per_event = elapsed / args.events * 1e6
+        print(f"{'synchronous':<22}{per_event:>18.2f}{elapsed:>9.2f}{0:>9}")
+
+        for queue_size in (args.events, 1000):
+            emitted, total, dropped = batched(
+                os.path.join(directory, f"batched-{queue_size}.jsonl"),
+                args.events,
+                queue_size,
+            )
+            name = f"batched, queue {queue_size}"
+            per_event = emitted / args.events * 1e6
+            print(f"{name:<22}{per_event:>18.2f}{total:>9.2f}{dropped:>9}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+"""Small-message latency while a very large channel is busy.
+
+One user keeps talking in a channel of 10,000 members while another pair
+exchanges messages in a small channel every couple of milliseconds. Each
+small message is timed from when it was due to when its delivery finished,
+with large fan-outs run in one go and then in slices under the tick budget.
+Event loop lag is sampled alongside.
+
+Run with: uv run python -m benchmarks.bench_fairness [-m 10000] [-n 40]
+"""
+
+import argparse
+import asyncio
+import logging
+import sys
+
+from benchmarks.common import make_session
+from src.channel_manager import ChannelManager
+from src.commands import CommandHandler
+from src.config import SchedulingConfig, ServerConfig
+from src.protocol import IRCMessage
+from src.scheduling import LagMonitor, set_scheduling
+from src.session import FLUSH_TICK
+from src.user_manager import UserManager
+
+
+def percentile(samples: list[float], fraction: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+async def run(
+    scheduling: SchedulingConfig, members: int, messages: int, interval: float
+) -> tuple[list[float], LagMonitor]:
+    UserManager().users.clear()
+    ChannelManager().channels.clear()
+    config = ServerConfig(
+        name="bench.server", host="", port=0, password="", scheduling=scheduling
+    )
+    handler = CommandHandler(config)
+
+    big = handler.channel_manager.get_or_create_channel("#big")
+    for i in range(members):
+        big.add_user(make_session(f"m{i}", flush_policy=FLUSH_TICK))
+    talker = make_session("talker")
+    big.add_user(talker)
+
+    small = handler.channel_manager.get_or_create_channel("#small")
+    alice, bob = make_session("alice"), make_session("bob")
+    small.add_user(alice)
+    small.add_user(bob)
+
+    loop = asyncio.get_running_loop()
+    latencies: list[float] = []
+    probes: set[asyncio.Task[None]] = set()
+
+    async def probe(due: float) -> None:
+        await handler.handle(alice, IRCMessage("PRIVMSG", ["#small", "hi"]))
+        latencies.append(loop.time() - due)
+
+    def fire(due: float) -> None:
+        task = asyncio.create_task(probe(due))
+        probes.add(task)
+        task.add_done_callback(probes.discard)
+
+    monitor = LagMonitor(SchedulingConfig(lag_interval=interval, lag_report=0))
+    monitor.start()
+
+    done = False
+
+    def schedule_probe() -> None:
+        if done:
+            return
+        due = loop.time() + interval
+        loop.call_at(due, fire, due)
+        loop.call_at(due, schedule_probe)
+
+    schedule_probe()
+    for _ in range(messages):
+        await handler.handle(talker, IRCMessage("PRIVMSG", ["#big", "busy"]))
+        await asyncio.sleep(0)
+
+    done = True
+    monitor.stop()
+    await asyncio.gather(*probes)
+    handler.close()
+    return latencies, monitor
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("-m", "--members", type=int, default=10000)
+    parser.add_argument("-n", "--messages", type=int, default=40)
+    parser.add_argument("-i", "--interval", type=float, default=0.002)
+    args = parser.parse_args()
+
+    logging.disable(logging.CRITICAL)
+
+    print(
+        f"{args.messages} messages to {args.members} members,"
+        f" a small message due every {args.interval * 1000:.0f} ms"
+    )
+    print(
+        f"{'fan-out':<10}{'probes':>8}{'p50 ms':>9}{'p99 ms':>9}"
+        f"{'lag p99':>9}{'lag max':>9}"
+    )
+    for name, scheduling in (
+        ("one go", SchedulingConfig(large_fanout=sys.maxsize)),
+        ("sliced", SchedulingConfig()),
+    ):
+        latencies, monitor = await run(
+            scheduling, args.members, args.messages, args.interval
+        )
+        lag = monitor.stats()
+        print(
+            f"{name:<10}{len(latencies):>8}"
+            f"{percentile(latencies, 0.5) * 1000:>9.2f}"
+            f"{percentile(latencies, 0.99) * 1000:>9.2f}"
+            f"{lag.p99 * 1000:>9.2f}{lag.peak * 1000:>9.2f}"
+        )
+    set_scheduling(SchedulingConfig())
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,77 @@
+"""NICK/QUIT fan-out when users share hundreds of channels.
+
+Compares a send per channel membership (what a loop over the user's
+channels does) with the deduplicated peer set, counting the lines each
+approach writes and the CPU it takes.
+
+Run with: uv run python -m benchmarks.bench_fanout [-n 500] [-c 300] [-m 200]
+"""
+
+import argparse
+import asyncio
+import logging
+import random
+import time
+
+from benchmarks.common import make_session, writer_of
+from src.channel_manager import ChannelManager
+from src.session import ClientSession
+from src.user_manager import UserManager
+
+
+def build(
+    users: int, channels: int, members: int
+) -> tuple[ChannelManager, list[ClientSession]]:
+    UserManager().users.clear()
+    manager = ChannelManager()
+    manager.channels.clear()
+    manager.by_size.clear()
+    rng = random.Random(42)
+
+    sessions = [make_session(f"u{i}") for i in range(users)]
+    for i in range(channels):
+        channel = manager.create_channel(f"#c{i}")
+        # Everyone measured below sits in every channel
+        channel.add_user(sessions[0])
+        for session in rng.sample(sessions[1:], members - 1):
+            channel.add_user(session)
+    return manager, sessions
+
+
+async def per_channel(session: ClientSession, line: str) -> None:
+    for channel in session.channels:
+        await channel.broadcast(line, skip_user=session)
+
+
+async def deduplicated(session: ClientSession, line: str) -> None:
+    for peer in ChannelManager.common_peers(session):
+        await peer.send_reply(line)
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("-n", "--users", type=int, default=500)
+    parser.add_argument("-c", "--channels", type=int, default=300)
+    parser.add_argument("-m", "--members", type=int, default=200)
+    parser.add_argument("-r", "--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    logging.disable(logging.CRITICAL)
+
+    print(
+        f"{args.users} users, one of them in {args.channels} channels"
+        f" of {args.members} members"
+    )
+    print(f"{'fan-out':<14}{'lines':>10}{'ms/event':>12}")
+    for name, fanout in (("per channel", per_channel), ("deduplicated", deduplicated)):
+        _, sessions = build(args.users, args.channels, args.members)
+        start = time.process_time()
+        for _ in range(args.repeat):
+            await fanout(sessions[0], ":u0!u0@127.0.0.1 NICK u0_")
+        elapsed = (time.process_time() - start) / args.repeat
+        lines = sum(writer_of(s).lines for s in sessions) // args.repeat
+        print(f"{name:<14}{lines:>10,}{elapsed * 1000:>12.2f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
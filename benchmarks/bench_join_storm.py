@@ -0,0 +1,72 @@
+"""Bytes, writes and CPU when a crowd rejoins one channel.
+
+Run with: uv run python -m benchmarks.bench_join_storm [-n 5000] [--window 0.05]
+"""
+
+import argparse
+import asyncio
+import logging
+import time
+
+from benchmarks.common import make_session, writer_of
+from src.channel_manager import ChannelManager
+from src.commands import CommandHandler
+from src.config import ServerConfig
+from src.protocol import IRCMessage
+from src.user_manager import UserManager
+
+
+async def storm(users: int, window: float, quiet: bool) -> tuple[int, int, float]:
+    UserManager().users.clear()
+    ChannelManager().channels.clear()
+
+    config = ServerConfig(name="bench.server", host="", port=0, password="")
+    config.channels.join_batch_window = window
+    handler = CommandHandler(config)
+
+    sessions = [make_session(f"u{i}") for i in range(users)]
+    for session in sessions:
+        assert session.nickname
+        handler.user_manager.add_user(session.nickname, session)
+
+    channel = handler.channel_manager.get_or_create_channel("#storm")
+    channel.quiet_joins = quiet
+
+    join = IRCMessage("JOIN", ["#storm"])
+    start = time.process_time()
+    for i, session in enumerate(sessions):
+        await handler.handle(session, join)
+        # Let batching timers fire now and then, as real traffic would
+        if i % 100 == 99:
+            await asyncio.sleep(0)
+    await channel.flush_joins()
+    cpu = time.process_time() - start
+
+    total_bytes = sum(writer_of(s).bytes for s in sessions)
+    total_writes = sum(writer_of(s).writes for s in sessions)
+    handler.close()
+    return total_bytes, total_writes, cpu
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("-n", "--users", type=int, default=5000)
+    parser.add_argument("--window", type=float, default=0.05)
+    args = parser.parse_args()
+
+    logging.disable(logging.CRITICAL)
+
+    modes = [
+        ("immediate", 0.0, False),
+        (f"batched ({args.window}s)", args.window, False),
+        ("quiet joins", 0.0, True),
+    ]
+    print(f"{args.users} users joining one channel")
+    print(f"{'mode':<20}{'bytes':>14}{'writes':>12}{'cpu s':>10}")
+    for name, window, quiet in modes:
+        total_bytes, writes, cpu = await storm(args.users, window, quiet)
+        print(f"{name:<20}{total_bytes:>14,}{writes:>12,}{cpu:>10.2f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
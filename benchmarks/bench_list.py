@@ -0,0 +1,99 @@
+"""LIST over a large number of channels, with and without ELIST filters.
+
+Reports the time to produce each listing, the bytes sent and the longest
+stretch the event loop was blocked while the listing was streamed.
+
+Run with: uv run python -m benchmarks.bench_list [-n 100000]
+"""
+
+import argparse
+import asyncio
+import logging
+import random
+import time
+
+from benchmarks.common import make_session, writer_of
+from src.channel_manager import ChannelManager
+from src.commands import CommandHandler
+from src.config import ServerConfig
+from src.protocol import IRCMessage
+from src.user_manager import UserManager
+
+
+def populate(handler: CommandHandler, channels: int, users: int) -> None:
+    rng = random.Random(1)
+    sessions = [make_session(f"u{i}") for i in range(users)]
+
+    for i in range(channels):
+        channel = handler.channel_manager.get_or_create_channel(f"#chan{i}")
+        # Most channels are tiny, a few are large
+        size = min(int(rng.paretovariate(1.2)), users)
+        for member in rng.sample(sessions, size):
+            channel.add_user(member)
+
+
+async def run_list(
+    handler: CommandHandler, params: list[str]
+) -> tuple[float, int, int, float]:
+    asker = make_session("asker")
+    done = False
+    longest = 0.0
+
+    async def monitor() -> None:
+        nonlocal longest
+        while not done:
+            start = time.perf_counter()
+            await asyncio.sleep(0)
+            longest = max(longest, time.perf_counter() - start)
+
+    watcher = asyncio.create_task(monitor())
+    await asyncio.sleep(0)
+
+    start = time.perf_counter()
+    await handler.handle(asker, IRCMessage("LIST", params))
+    elapsed = time.perf_counter() - start
+
+    done = True
+    await watcher
+
+    writer = writer_of(asker)
+    return elapsed, writer.bytes, writer.writes, longest
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("-n", "--channels", type=int, default=100_000)
+    parser.add_argument("--users", type=int, default=2000)
+    args = parser.parse_args()
+
+    logging.disable(logging.CRITICAL)
+    UserManager().users.clear()
+    ChannelManager().channels.clear()
+
+    handler = CommandHandler(
+        ServerConfig(name="bench.server", host="", port=0, password="")
+    )
+    start = time.perf_counter()
+    populate(handler, args.channels, args.users)
+    print(f"{args.channels:,} channels populated in {time.perf_counter() - start:.1f}s")
+
+    queries = [
+        ("LIST", []),
+        ("LIST >20", [">20"]),
+        ("LIST <3", ["<3"]),
+        ("LIST #chan1*", ["#chan1*"]),
+        ("LIST C<60", ["C<60"]),
+    ]
+    print(
+        f"{'query':<16}{'seconds':>10}{'bytes':>14}{'writes':>10}{'max stall ms':>14}"
+    )
+    for name, params in queries:
+        elapsed, sent, writes, longest = await run_list(handler, params)
+        print(
+            f"{name:<16}{elapsed:>10.3f}{sent:>14,}{writes:>10,}{longest * 1000:>14.2f}"
+        )
+    handler.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
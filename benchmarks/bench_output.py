@@ -0,0 +1,99 @@
+"""Socket writes per delivered line under chat load, per flush policy.
+
+Users join a handful of channels each and then chat: every loop iteration a
+batch of users each send one PRIVMSG, as concurrent readers would. Each
+write()/writelines() on the session's writer stands for one send syscall.
+
+Run with: uv run python -m benchmarks.bench_output [-n 2000] [-m 50000]
+"""
+
+import argparse
+import asyncio
+import logging
+import random
+import time
+
+from benchmarks.common import make_session, writer_of
+from src.channel_manager import ChannelManager
+from src.commands import CommandHandler
+from src.config import ServerConfig
+from src.protocol import IRCMessage
+from src.session import FLUSH_IMMEDIATE, FLUSH_TICK, ClientSession
+from src.user_manager import UserManager
+
+
+async def chat(
+    policy: str, users: int, channels: int, messages: int, burst: int
+) -> tuple[int, int, float]:
+    UserManager().users.clear()
+    ChannelManager().channels.clear()
+    handler = CommandHandler(
+        ServerConfig(name="bench.server", host="", port=0, password="")
+    )
+    rng = random.Random(42)
+
+    sessions: list[ClientSession] = []
+    for i in range(users):
+        session = make_session(f"u{i}", flush_policy=policy)
+        assert session.nickname
+        handler.user_manager.add_user(session.nickname, session)
+        sessions.append(session)
+
+    start = time.process_time()
+    for session in sessions:
+        names = {f"#c{rng.randrange(channels)}" for _ in range(3)}
+        await handler.handle(session, IRCMessage("JOIN", [",".join(sorted(names))]))
+        await asyncio.sleep(0)
+
+    for sent in range(0, messages, burst):
+        senders = rng.sample(sessions, min(burst, messages - sent))
+        await asyncio.gather(
+            *(
+                handler.handle(
+                    sender,
+                    IRCMessage(
+                        "PRIVMSG",
+                        [
+                            rng.choice(sorted(c.name for c in sender.channels)),
+                            "hello there",
+                        ],
+                    ),
+                )
+                for sender in senders
+            )
+        )
+        await asyncio.sleep(0)
+    cpu = time.process_time() - start
+
+    writes = sum(writer_of(s).writes for s in sessions)
+    lines = sum(writer_of(s).lines for s in sessions)
+    handler.close()
+    return writes, lines, cpu
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("-n", "--users", type=int, default=2000)
+    parser.add_argument("-c", "--channels", type=int, default=50)
+    parser.add_argument("-m", "--messages", type=int, default=50000)
+    parser.add_argument("-b", "--burst", type=int, default=50)
+    args = parser.parse_args()
+
+    logging.disable(logging.CRITICAL)
+
+    print(
+        f"{args.users} users in {args.channels} channels,"
+        f" {args.messages} messages in bursts of {args.burst}"
+    )
+    print(f"{'policy':<12}{'lines':>12}{'writes':>12}{'writes/line':>14}{'cpu s':>8}")
+    for policy in (FLUSH_IMMEDIATE, FLUSH_TICK):
+        writes, lines, cpu = await chat(
+            policy, args.users, args.channels, args.messages, args.burst
+        )
+        print(
+            f"{policy:<12}{lines:>12,}{writes:>12,}{writes / lines:>14.3f}{cpu:>8.2f}"
+        )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
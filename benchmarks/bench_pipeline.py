@@ -0,0 +1,135 @@
+"""Reply latency behind slow work, inline handling vs. the command pipeline.
+
+Two scenarios, each run with commands handled inline by the read loop (one
+line at a time, as lines arrive) and through per-client pipelines:
+
+- keep-alive: a client sends a LIST over many channels followed by a PING;
+  reported is the time until its PONG is written.
+- fairness: one client has a backlog of messages to a large channel
+  buffered when a second client sends a single NAMES; reported is the time
+  until that NAMES is done.
+
+Run with: uv run python -m benchmarks.bench_pipeline [-n 50000] [-b 300]
+"""
+
+import argparse
+import asyncio
+import logging
+import time
+
+from benchmarks.common import make_session
+from src.channel_manager import ChannelManager
+from src.commands import CommandHandler
+from src.config import PipelineConfig, ServerConfig
+from src.pipeline import CommandPipeline
+from src.protocol import IRCMessage
+from src.session import ClientSession
+from src.user_manager import UserManager
+
+
+def make_handler() -> CommandHandler:
+    UserManager().users.clear()
+    ChannelManager().channels.clear()
+    return CommandHandler(
+        ServerConfig(name="bench.server", host="", port=0, password="")
+    )
+
+
+async def feed(
+    handler: CommandHandler,
+    session: ClientSession,
+    messages: list[IRCMessage],
+    piped: bool,
+) -> None:
+    # Stands in for the read loop with the client's lines already buffered
+    if not piped:
+        for message in messages:
+            await handler.handle(session, message)
+        return
+
+    pipeline = CommandPipeline(session, handler, PipelineConfig(queue_size=1024))
+    pipeline.start()
+    for message in messages:
+        await pipeline.submit(message)
+    await pipeline.close()
+
+
+async def keep_alive(channels: int, piped: bool) -> float:
+    handler = make_handler()
+    for i in range(channels):
+        handler.channel_manager.get_or_create_channel(f"#chan{i}")
+
+    client = make_session("client")
+    ponged = 0.0
+    write = client.writer.write
+
+    def watch(data: bytes) -> None:
+        nonlocal ponged
+        if b" PONG " in data and not ponged:
+            ponged = time.perf_counter()
+        write(data)
+
+    client.writer.write = watch  # type: ignore[method-assign]
+
+    start = time.perf_counter()
+    await feed(
+        handler,
+        client,
+        [IRCMessage("LIST", []), IRCMessage("PING", ["bench"])],
+        piped,
+    )
+    handler.close()
+    return ponged - start
+
+
+async def fairness(backlog: int, members: int, piped: bool) -> float:
+    handler = make_handler()
+    channel = handler.channel_manager.get_or_create_channel("#big")
+    for i in range(members):
+        channel.add_user(make_session(f"m{i}"))
+
+    heavy = make_session("heavy")
+    channel.add_user(heavy)
+    light = make_session("light")
+    light_done = 0.0
+
+    async def light_client() -> None:
+        nonlocal light_done
+        await feed(handler, light, [IRCMessage("NAMES", ["#big"])], piped)
+        light_done = time.perf_counter()
+
+    start = time.perf_counter()
+    await asyncio.gather(
+        feed(
+            handler,
+            heavy,
+            [IRCMessage("PRIVMSG", ["#big", "spam"])] * backlog,
+            piped,
+        ),
+        light_client(),
+    )
+    handler.close()
+    return light_done - start
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("-n", "--channels", type=int, default=50000)
+    parser.add_argument("-b", "--backlog", type=int, default=300)
+    parser.add_argument("-m", "--members", type=int, default=200)
+    args = parser.parse_args()
+
+    logging.disable(logging.CRITICAL)
+
+    print(f"{'scenario':<12}{'inline ms':>12}{'pipeline ms':>14}")
+    inline = await keep_alive(args.channels, piped=False)
+    piped = await keep_alive(args.channels, piped=True)
+    print(f"{'keep-alive':<12}{inline * 1000:>12.2f}{piped * 1000:>14.2f}")
+
+    inline = await fairness(args.backlog, args.members, piped=False)
+    piped = await fairness(args.backlog, args.members, piped=True)
+    print(f"{'fairness':<12}{inline * 1000:>12.2f}{piped * 1000:>14.2f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
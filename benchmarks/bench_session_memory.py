@@ -0,0 +1,81 @@
+"""Memory held per registered session, measured with tracemalloc.
+
+Sessions connect from a limited set of hosts and register with the kind of
+usernames and realnames real clients send, so most of those strings repeat.
+
+Run with: uv run python -m benchmarks.bench_session_memory [-n 100000]
+"""
+
+import argparse
+import asyncio
+import gc
+import logging
+import tracemalloc
+
+from benchmarks.common import CountingWriter
+from src.channel_manager import ChannelManager
+from src.commands import CommandHandler
+from src.config import ServerConfig
+from src.protocol import IRCMessage
+from src.session import ClientSession
+from src.user_manager import UserManager
+
+USERNAMES = ["user", "~user", "znc", "~irc", "guest", "bot"]
+REALNAMES = ["realname", "Unknown", "HexChat", "WeeChat", "irssi", "Guest"]
+
+
+async def register(handler: CommandHandler, sessions: int, hosts: int) -> None:
+    # Every peername, nick and parameter is a fresh string, as off the wire
+    for i in range(sessions):
+        host = f"10.{(i % hosts) // 65536}.{(i % hosts) // 256 % 256}.{i % 256}"
+        writer = CountingWriter((host, 40000 + i % 20000))
+        session = ClientSession(
+            asyncio.StreamReader(),
+            writer,
+            handler.config.name,
+        )
+        username = f"{USERNAMES[i % len(USERNAMES)]}"
+        realname = f"{REALNAMES[i % len(REALNAMES)]} "[:-1]
+        await handler.handle(session, IRCMessage("NICK", [f"n{i}"]))
+        await handler.handle(
+            session, IRCMessage("USER", [username, "0", "*", realname])
+        )
+        assert session.hostmask
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("-n", "--sessions", type=int, default=100_000)
+    parser.add_argument("--hosts", type=int, default=1000)
+    args = parser.parse_args()
+
+    logging.disable(logging.CRITICAL)
+    UserManager().users.clear()
+    ChannelManager().channels.clear()
+    handler = CommandHandler(
+        ServerConfig(name="bench.server", host="", port=0, password="")
+    )
+
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+
+    await register(handler, args.sessions, args.hosts)
+    gc.collect()
+
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+
+    stats = after.compare_to(before, "filename")
+    total = sum(stat.size_diff for stat in stats)
+    print(f"{args.sessions:,} sessions from {args.hosts:,} hosts")
+    print(f"total {total / 2**20:.1f} MiB, {total / args.sessions:.0f} bytes/session")
+    print("largest contributors:")
+    for stat in stats[:6]:
+        name = stat.traceback[0].filename.rsplit("/", 2)[-2:]
+        print(f"  {'/'.join(name):<40}{stat.size_diff / args.sessions:>8.0f} B/session")
+    handler.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
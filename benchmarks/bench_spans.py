@@ -0,0 +1,84 @@
+"""Cost of per-stage timing spans on the line handling path.
+
+A client's lines (PRIVMSGs to a channel of 20, with the odd WHO) are fed
+through Server.handle_client from an in-memory reader, once with spans off
+and once on, and the CPU time per line is compared.
+
+Run with: uv run python -m benchmarks.bench_spans [-n 200000]
+"""
+
+import argparse
+import asyncio
+import logging
+import time
+
+from benchmarks.common import CountingWriter, make_session
+from src.channel_manager import ChannelManager
+from src.config import ServerConfig
+from src.profiling import spans
+from src.server import Server
+from src.session import FLUSH_TICK
+from src.user_manager import UserManager
+
+
+class ScriptedReader:
+    """Hands out prepared lines, then end of file."""
+
+    def __init__(self, lines: list[bytes]) -> None:
+        self.lines = iter(lines)
+
+    async def readline(self) -> bytes:
+        return next(self.lines, b"")
+
+
+def script(lines: int) -> list[bytes]:
+    registration = [b"NICK talker\r\n", b"USER talker 0 * :Talker\r\n"]
+    join = [b"JOIN #room\r\n"]
+    chat = [
+        b"WHO #room\r\n" if i % 50 == 0 else b"PRIVMSG #room :hello there\r\n"
+        for i in range(lines)
+    ]
+    return registration + join + chat
+
+
+async def run(lines: list[bytes], enabled: bool) -> float:
+    UserManager().users.clear()
+    ChannelManager().channels.clear()
+    server = Server(ServerConfig(name="bench.server", host="", port=0, password=""))
+    channel = server.command_handler.channel_manager.get_or_create_channel("#room")
+    for i in range(19):
+        channel.add_user(make_session(f"m{i}", flush_policy=FLUSH_TICK))
+
+    spans().reset()
+    spans().enabled = enabled
+    start = time.process_time()
+    await server.handle_client(ScriptedReader(lines), CountingWriter())
+    elapsed = time.process_time() - start
+    spans().enabled = False
+    server.command_handler.close()
+    return elapsed
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("-n", "--lines", type=int, default=200000)
+    parser.add_argument("-r", "--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    logging.disable(logging.CRITICAL)
+
+    lines = script(args.lines)
+    print(f"{args.lines} lines through handle_client, best of {args.repeat}")
+    print(f"{'spans':<8}{'us/line':>10}")
+    results = {}
+    for enabled in (False, True):
+        best = min([await run(lines, enabled) for _ in range(args.repeat)])
+        results[enabled] = best
+        print(f"{'on' if enabled else 'off':<8}{best / len(lines) * 1e6:>10.2f}")
+    print(f"overhead {(results[True] / results[False] - 1) * 100:.1f}%")
+    for line in spans().summary():
+        print(f"  {line}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
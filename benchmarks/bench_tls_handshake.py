@@ -0,0 +1,127 @@
+"""Handshakes per second against a TLS listener with a self-signed cert.
+
+Run with: uv run python -m benchmarks.bench_tls_handshake [-n 500] [-c 8]
+"""
+
+import argparse
+import asyncio
+import logging
+import socket
+import ssl
+import subprocess
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from src.config import ServerConfig, TLSListenerConfig
+from src.server import Server
+
+
+def generate_cert(directory: Path) -> tuple[str, str]:
+    certfile = directory / "cert.pem"
+    keyfile = directory / "key.pem"
+    subprocess.run(
+        [
+            "openssl",
+            "req",
+            "-x509",
+            "-newkey",
+            "rsa:2048",
+            "-nodes",
+            "-days",
+            "1",
+            "-subj",
+            "/CN=localhost",
+            "-keyout",
+            str(keyfile),
+            "-out",
+            str(certfile),
+        ],
+        check=True,
+        capture_output=True,
+    )
+    return str(certfile), str(keyfile)
+
+
+def run_server(server_app: Server, ready: threading.Event) -> None:
+    async def serve() -> None:
+        task = asyncio.create_task(server_app.start())
+        while not server_app.server or not server_app.server.sockets:
+            await asyncio.sleep(0.01)
+        ready.set()
+        await task
+
+    try:
+        asyncio.run(serve())
+    except asyncio.CancelledError:
+        pass
+
+
+def handshake(
+    port: int, context: ssl.SSLContext, session: ssl.SSLSession | None
+) -> ssl.SSLSession | None:
+    with socket.create_connection(("127.0.0.1", port)) as raw:
+        with context.wrap_socket(raw, session=session) as tls:
+            tls.sendall(b"PING bench\r\n")
+            tls.recv(512)
+            return tls.session
+
+
+def measure(
+    port: int,
+    context: ssl.SSLContext,
+    count: int,
+    concurrency: int,
+    session: ssl.SSLSession | None,
+) -> float:
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(lambda _: handshake(port, context, session), range(count)))
+    return count / (time.perf_counter() - start)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("-n", "--count", type=int, default=500)
+    parser.add_argument("-c", "--concurrency", type=int, default=8)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        certfile, keyfile = generate_cert(Path(tmp))
+        listener = TLSListenerConfig(
+            host="127.0.0.1", port=0, certfile=certfile, keyfile=keyfile
+        )
+        config = ServerConfig(
+            name="bench.tls", host="127.0.0.1", port=0, password="", tls=[listener]
+        )
+        server_app = Server(config)
+        ready = threading.Event()
+        threading.Thread(
+            target=run_server, args=(server_app, ready), daemon=True
+        ).start()
+        ready.wait()
+
+        port = server_app.tls_servers[0].sockets[0].getsockname()[1]
+        context = ssl.SSLContext(ssl.PROTOCOL_TLS_CLIENT)
+        context.check_hostname = False
+        context.verify_mode = ssl.CERT_NONE
+
+        full = measure(port, context, args.count, args.concurrency, None)
+        session = handshake(port, context, None)
+        resumed = measure(port, context, args.count, args.concurrency, session)
+
+        handshaker = server_app.tls_handshakers[0]
+        print(f"full handshakes:    {full:10.1f} /s")
+        print(f"resumed handshakes: {resumed:10.1f} /s")
+        print(
+            f"server counters: handshakes={handshaker.handshakes}"
+            f" resumed={handshaker.resumed} failures={handshaker.failures}"
+        )
+
+
+if __name__ == "__main__":
+    main()
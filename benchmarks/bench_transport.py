@@ -0,0 +1,85 @@
+"""Lines per second through the StreamReader/StreamWriter path and Connection.
+
+Each client registers and then pipelines ISON queries, so every line read
+produces one 303 reply. Run with:
+uv run python -m benchmarks.bench_transport [-n 20000] [-c 20] [-r 3]
+"""
+
+import argparse
+import asyncio
+import logging
+import time
+from functools import partial
+
+from src.channel_manager import ChannelManager
+from src.config import ServerConfig
+from src.server import Server
+from src.transport import Connection
+from src.user_manager import UserManager
+
+
+async def client(port: int, nick: str, count: int) -> None:
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    writer.write(f"NICK {nick}\r\nUSER {nick} 0 * :{nick}\r\n".encode())
+    while b" 001 " not in await reader.readline():
+        pass
+
+    writer.write(f"ISON {nick}\r\n".encode() * count)
+    await writer.drain()
+    replies = 0
+    while replies < count:
+        if b" 303 " in await reader.readline():
+            replies += 1
+
+    writer.write(b"QUIT\r\n")
+    await reader.read()
+    writer.close()
+
+
+async def measure(streams: bool, count: int, clients: int) -> float:
+    UserManager().users.clear()
+    ChannelManager().channels.clear()
+    config = ServerConfig(name="bench.irc", host="127.0.0.1", port=0, password="")
+    server = Server(config)
+
+    if streams:
+        listener = await asyncio.start_server(server.handle_client, "127.0.0.1", 0)
+    else:
+        listener = await asyncio.get_running_loop().create_server(
+            partial(Connection, server.handle_connection), "127.0.0.1", 0
+        )
+    port = listener.sockets[0].getsockname()[1]
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client(port, f"c{i}", count) for i in range(clients)))
+    elapsed = time.perf_counter() - start
+
+    listener.close()
+    await listener.wait_closed()
+    server.command_handler.close()
+    return count * clients / elapsed
+
+
+async def run(count: int, clients: int, rounds: int) -> None:
+    # Alternate the two paths and keep the best round of each
+    streams = protocol = 0.0
+    for _ in range(rounds):
+        streams = max(streams, await measure(True, count, clients))
+        protocol = max(protocol, await measure(False, count, clients))
+    print(f"streams:    {streams:10.0f} lines/s")
+    print(f"connection: {protocol:10.0f} lines/s ({protocol / streams - 1:+.0%})")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("-n", "--count", type=int, default=20000)
+    parser.add_argument("-c", "--clients", type=int, default=20)
+    parser.add_argument("-r", "--rounds", type=int, default=3)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    asyncio.run(run(args.count, args.clients, args.rounds))
+
+
+if __name__ == "__main__":
+    main()
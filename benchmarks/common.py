@@ -0,0 +1,67 @@
+"""In-process fakes shared by the benchmarks."""
+
+import asyncio
+from collections.abc import Iterable
+from typing import Any
+
+from src.session import FLUSH_IMMEDIATE, ClientSession
+
+
+class CountingWriter:
+    """Stands in for a StreamWriter and counts what would hit the socket."""
+
+    def __init__(self, peer: tuple[str, int] = ("127.0.0.1", 0)) -> None:
+        self.peer = peer
+        self.bytes: int = 0
+        self.writes: int = 0
+        self.lines: int = 0
+
+    def write(self, data: bytes) -> None:
+        self.bytes += len(data)
+        self.writes += 1
+        self.lines += data.count(b"\n")
+
+    def writelines(self, data: Iterable[bytes]) -> None:
+        for chunk in data:
+            self.bytes += len(chunk)
+            self.lines += chunk.count(b"\n")
+        self.writes += 1
+
+    async def drain(self) -> None:
+        pass
+
+    def close(self) -> None:
+        pass
+
+    def is_closing(self) -> bool:
+        return False
+
+    async def wait_closed(self) -> None:
+        pass
+
+    def get_extra_info(self, name: str, default: Any = None) -> Any:
+        return self.peer if name == "peername" else default
+
+
+def make_session(
+    nickname: str,
+    server_name: str = "bench.server",
+    flush_policy: str = FLUSH_IMMEDIATE,
+) -> ClientSession:
+    writer = CountingWriter()
+    session = ClientSession(
+        asyncio.StreamReader(),
+        writer,
+        server_name,
+        flush_policy=flush_policy,
+    )
+    session.nickname = nickname
+    session.username = nickname.lower()
+    session.is_registered = True
+    return session
+
+
+def writer_of(session: ClientSession) -> CountingWriter:
+    writer = session.writer
+    assert isinstance(writer, CountingWriter)
+    return writer
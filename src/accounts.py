@@ -0,0 +1,183 @@
+from __future__ import annotations
+
+import asyncio
+import sqlite3
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+
+from src.auth import is_hashed, protect_plaintext
+from src.config import AccountsConfig
+
+
+@dataclass(frozen=True)
+class Account:
+    name: str
+    password_hash: str
+    certfps: tuple[str, ...] = ()
+
+
+def _key(name: str) -> str:
+    return name.lower()
+
+
+class AccountStore(ABC):
+    @abstractmethod
+    async def get(self, name: str) -> Account | None: ...
+
+    @abstractmethod
+    async def find_by_certfp(self, certfp: str) -> Account | None: ...
+
+    def close(self) -> None:
+        pass
+
+
+class MemoryAccountStore(AccountStore):
+    def __init__(self, accounts: list[Account] | None = None) -> None:
+        self.accounts: dict[str, Account] = {}
+        self.by_certfp: dict[str, Account] = {}
+        for account in accounts or []:
+            self.add_account(account)
+
+    def add_account(self, account: Account) -> None:
+        self.accounts[_key(account.name)] = account
+        for certfp in account.certfps:
+            self.by_certfp[certfp.lower()] = account
+
+    async def get(self, name: str) -> Account | None:
+        return self.accounts.get(_key(name))
+
+    async def find_by_certfp(self, certfp: str) -> Account | None:
+        return self.by_certfp.get(certfp.lower())
+
+
+class SQLiteAccountStore(AccountStore):
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS accounts (
+            key TEXT PRIMARY KEY,
+            name TEXT NOT NULL,
+            password_hash TEXT NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS certfps (
+            certfp TEXT PRIMARY KEY,
+            account_key TEXT NOT NULL REFERENCES accounts(key) ON DELETE CASCADE
+        );
+        CREATE INDEX IF NOT EXISTS certfps_account ON certfps(account_key);
+    """
+
+    def __init__(self, path: str) -> None:
+        # One connection, one thread: sqlite3 connections must not be shared
+        # between threads concurrently, and this keeps queries off the loop.
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="accounts")
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.executescript(self.SCHEMA)
+
+    def add_account(self, account: Account) -> None:
+        with self.connection:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO accounts (key, name, password_hash)"
+                " VALUES (?, ?, ?)",
+                (_key(account.name), account.name, account.password_hash),
+            )
+            self.connection.execute(
+                "DELETE FROM certfps WHERE account_key = ?", (_key(account.name),)
+            )
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO certfps (certfp, account_key) VALUES (?, ?)",
+                [(fp.lower(), _key(account.name)) for fp in account.certfps],
+            )
+
+    def _load(self, key: str) -> Account | None:
+        row = self.connection.execute(
+            "SELECT name, password_hash FROM accounts WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return None
+
+        certfps = self.connection.execute(
+            "SELECT certfp FROM certfps WHERE account_key = ?", (key,)
+        ).fetchall()
+        return Account(row[0], row[1], tuple(fp for (fp,) in certfps))
+
+    def _load_by_certfp(self, certfp: str) -> Account | None:
+        row = self.connection.execute(
+            "SELECT account_key FROM certfps WHERE certfp = ?", (certfp.lower(),)
+        ).fetchone()
+        return self._load(row[0]) if row else None
+
+    async def get(self, name: str) -> Account | None:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, self._load, _key(name))
+
+    async def find_by_certfp(self, certfp: str) -> Account | None:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, self._load_by_certfp, certfp)
+
+    def close(self) -> None:
+        self.executor.shutdown(wait=True)
+        self.connection.close()
+
+
+class CachingAccountStore(AccountStore):
+    def __init__(self, inner: AccountStore, size: int, ttl: float) -> None:
+        self.inner = inner
+        self.size = size
+        self.ttl = ttl
+        self._cache: OrderedDict[str, tuple[float, Account | None]] = OrderedDict()
+
+    def _lookup(self, key: str) -> tuple[bool, Account | None]:
+        entry = self._cache.get(key)
+        if entry is None or entry[0] < time.monotonic():
+            return False, None
+        self._cache.move_to_end(key)
+        return True, entry[1]
+
+    def _store(self, key: str, account: Account | None) -> None:
+        self._cache[key] = (time.monotonic() + self.ttl, account)
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.size:
+            self._cache.popitem(last=False)
+
+    async def get(self, name: str) -> Account | None:
+        key = "name:" + _key(name)
+        hit, account = self._lookup(key)
+        if not hit:
+            account = await self.inner.get(name)
+            self._store(key, account)
+        return account
+
+    async def find_by_certfp(self, certfp: str) -> Account | None:
+        key = "certfp:" + certfp.lower()
+        hit, account = self._lookup(key)
+        if not hit:
+            account = await self.inner.find_by_certfp(certfp)
+            self._store(key, account)
+        return account
+
+    def invalidate(self) -> None:
+        self._cache.clear()
+
+    def close(self) -> None:
+        self.inner.close()
+
+
+def create_account_store(config: AccountsConfig) -> AccountStore:
+    if config.backend == "memory":
+        accounts = []
+        for name, entry in config.accounts.items():
+            password = entry["password"]
+            # Plaintext passwords are protected like the server and oper ones
+            if not is_hashed(password):
+                password = protect_plaintext(password)
+            accounts.append(Account(name, password, tuple(entry.get("certfp", []))))
+        return MemoryAccountStore(accounts)
+
+    if config.backend == "sqlite":
+        store: AccountStore = SQLiteAccountStore(config.path)
+        if config.cache_size > 0:
+            store = CachingAccountStore(store, config.cache_size, config.cache_ttl)
+        return store
+
+    raise ValueError(f"Unknown account store backend: {config.backend}")
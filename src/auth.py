@@ -0,0 +1,159 @@
+import asyncio
+import getpass
+import hashlib
+import hmac
+import logging
+import os
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from src.config import AuthConfig
+
+SCRYPT_N = 2**14
+SCRYPT_R = 8
+SCRYPT_P = 1
+
+
+class AuthBusyError(RuntimeError):
+    pass
+
+
+def hash_password(
+    password: str, n: int = SCRYPT_N, r: int = SCRYPT_R, p: int = SCRYPT_P
+) -> str:
+    salt = os.urandom(16)
+    digest = hashlib.scrypt(
+        password.encode("utf-8"), salt=salt, n=n, r=r, p=p, dklen=32
+    )
+    return f"scrypt${n}${r}${p}${salt.hex()}${digest.hex()}"
+
+
+def is_hashed(secret: str) -> bool:
+    return secret.startswith(("scrypt$", "pbkdf2_sha256$", "sha256$"))
+
+
+def protect_plaintext(secret: str) -> str:
+    # Plaintext secrets from the config are salted and digested right away so
+    # they are never kept in memory as-is; a KDF buys nothing for them.
+    salt = os.urandom(16)
+    digest = hashlib.sha256(salt + secret.encode("utf-8")).hexdigest()
+    return f"sha256${salt.hex()}${digest}"
+
+
+def is_expensive(stored: str) -> bool:
+    return stored.startswith(("scrypt$", "pbkdf2_sha256$"))
+
+
+def verify_password(password: str, stored: str) -> bool:
+    scheme, _, rest = stored.partition("$")
+    fields = rest.split("$")
+    secret = password.encode("utf-8")
+
+    try:
+        if scheme == "scrypt":
+            n, r, p, salt, expected = fields
+            digest = hashlib.scrypt(
+                secret,
+                salt=bytes.fromhex(salt),
+                n=int(n),
+                r=int(r),
+                p=int(p),
+                dklen=len(expected) // 2,
+            ).hex()
+        elif scheme == "pbkdf2_sha256":
+            iterations, salt, expected = fields
+            digest = hashlib.pbkdf2_hmac(
+                "sha256", secret, bytes.fromhex(salt), int(iterations)
+            ).hex()
+        elif scheme == "sha256":
+            salt, expected = fields
+            digest = hashlib.sha256(bytes.fromhex(salt) + secret).hexdigest()
+        else:
+            return False
+    except ValueError:
+        return False
+
+    return hmac.compare_digest(digest, expected)
+
+
+class Authenticator:
+    def __init__(self, config: AuthConfig, server_password: str = "") -> None:
+        self.config = config
+        self.logger = logging.getLogger(self.__class__.__name__)
+
+        self.server_password: str | None = None
+        if server_password:
+            self.server_password = (
+                server_password
+                if is_hashed(server_password)
+                else protect_plaintext(server_password)
+            )
+
+        self.executor = ThreadPoolExecutor(
+            max_workers=config.workers, thread_name_prefix="auth"
+        )
+        self.pending: int = 0
+
+        # Keyed by (stored hash, HMAC of the attempt) so the cache never holds
+        # anything that could be replayed as a password.
+        self._cache_key = os.urandom(32)
+        self._cache: OrderedDict[tuple[str, bytes], float] = OrderedDict()
+
+    def _fingerprint(self, password: str) -> bytes:
+        return hmac.digest(self._cache_key, password.encode("utf-8"), "sha256")
+
+    def _cache_hit(self, key: tuple[str, bytes]) -> bool:
+        expires = self._cache.get(key)
+        if expires is None:
+            return False
+        if expires < time.monotonic():
+            del self._cache[key]
+            return False
+        self._cache.move_to_end(key)
+        return True
+
+    def _remember(self, key: tuple[str, bytes]) -> None:
+        self._cache[key] = time.monotonic() + self.config.cache_ttl
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.config.cache_size:
+            self._cache.popitem(last=False)
+
+    async def verify(self, password: str | None, stored: str) -> bool:
+        if password is None:
+            return False
+
+        if not is_expensive(stored):
+            return verify_password(password, stored)
+
+        key = (stored, self._fingerprint(password))
+        if self._cache_hit(key):
+            return True
+
+        if self.pending >= self.config.max_pending:
+            raise AuthBusyError("Too many pending authentications")
+
+        self.pending += 1
+        try:
+            loop = asyncio.get_running_loop()
+            valid = await loop.run_in_executor(
+                self.executor, verify_password, password, stored
+            )
+        finally:
+            self.pending -= 1
+
+        if valid:
+            self._remember(key)
+        return valid
+
+    async def verify_server_password(self, password: str | None) -> bool:
+        if self.server_password is None:
+            return True
+        return await self.verify(password, self.server_password)
+
+    def close(self) -> None:
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+if __name__ == "__main__":
+    print(hash_password(getpass.getpass("Password: ")))
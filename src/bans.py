@@ -0,0 +1,277 @@
+import asyncio
+import heapq
+import ipaddress
+import logging
+import re
+import time
+from dataclasses import dataclass
+
+from src.casemapping import casefold
+from src.config import BansConfig
+from src.masks import MaskList, compile_mask
+from src.snapshots import JsonSnapshot
+
+IPAddress = ipaddress.IPv4Address | ipaddress.IPv6Address
+IPNetwork = ipaddress.IPv4Network | ipaddress.IPv6Network
+
+
+@dataclass
+class ServerBan:
+    kind: str  # "K" (local) or "G" (global)
+    mask: str  # user@host, the host part may be a CIDR network
+    reason: str
+    setter: str
+    set_at: float
+    expires_at: float | None = None
+
+    def is_expired(self, now: float) -> bool:
+        return self.expires_at is not None and self.expires_at <= now
+
+
+def normalize_ban_mask(mask: str) -> str:
+    user, _, host = mask.rpartition("@")
+    return casefold(f"{user or '*'}@{host or '*'}")
+
+
+def parse_network(host: str) -> IPNetwork | None:
+    # Plain addresses count as single-host networks
+    try:
+        return ipaddress.ip_network(host, strict=False)
+    except ValueError:
+        return None
+
+
+class _RadixNode:
+    __slots__ = ("children", "masks")
+
+    def __init__(self) -> None:
+        self.children: list[_RadixNode | None] = [None, None]
+        self.masks: list[str] = []
+
+
+class CIDRTrie:
+    """Binary radix trie over address bits; a lookup walks at most 128 nodes."""
+
+    def __init__(self) -> None:
+        self.roots = {4: _RadixNode(), 6: _RadixNode()}
+
+    @staticmethod
+    def _bits(value: int, width: int, length: int) -> list[int]:
+        return [(value >> (width - 1 - i)) & 1 for i in range(length)]
+
+    def insert(self, network: IPNetwork, mask: str) -> None:
+        node = self.roots[network.version]
+        width = network.max_prefixlen
+        for bit in self._bits(int(network.network_address), width, network.prefixlen):
+            child = node.children[bit]
+            if child is None:
+                child = node.children[bit] = _RadixNode()
+            node = child
+        node.masks.append(mask)
+
+    def remove(self, network: IPNetwork, mask: str) -> None:
+        node: _RadixNode | None = self.roots[network.version]
+        width = network.max_prefixlen
+        for bit in self._bits(int(network.network_address), width, network.prefixlen):
+            if node is None:
+                return
+            node = node.children[bit]
+        if node is not None and mask in node.masks:
+            node.masks.remove(mask)
+
+    def lookup(self, address: IPAddress) -> list[str]:
+        node: _RadixNode | None = self.roots[address.version]
+        value = int(address)
+        width = address.max_prefixlen
+        found: list[str] = []
+        for i in range(width + 1):
+            if node is None:
+                break
+            found.extend(node.masks)
+            if i < width:
+                node = node.children[(value >> (width - 1 - i)) & 1]
+        return found
+
+
+class BanEngine:
+    """Server-wide K-lines and G-lines."""
+
+    def __init__(self, config: BansConfig) -> None:
+        self.config = config
+        self.logger = logging.getLogger(self.__class__.__name__)
+
+        self.bans: dict[str, ServerBan] = {}
+        # Address and CIDR hosts go in the trie, wildcard hosts in MaskLists,
+        # so a check costs the same with ten bans or tens of thousands
+        self._networks = CIDRTrie()
+        self._user_patterns: dict[str, re.Pattern[str] | None] = {}
+        # Wildcard host bans on any user, and those naming a user pattern
+        self._masks = MaskList()
+        self._user_masks = MaskList()
+
+        self._expiry: list[tuple[float, str]] = []
+        self._expiry_timer: asyncio.TimerHandle | None = None
+        self._expiry_at: float | None = None
+        self._snapshot = JsonSnapshot(
+            config.path, lambda: list(self.bans.values()), self.logger, "bans"
+        )
+
+        self.load()
+
+    def __len__(self) -> int:
+        return len(self.bans)
+
+    def add(
+        self,
+        kind: str,
+        mask: str,
+        reason: str,
+        setter: str,
+        duration: float | None = None,
+    ) -> ServerBan:
+        mask = normalize_ban_mask(mask)
+        self.remove(mask)
+
+        now = time.time()
+        expires_at = now + duration if duration else None
+        ban = ServerBan(kind, mask, reason, setter, now, expires_at)
+        self._insert(ban)
+        self.logger.info(f"{kind}-line added by {setter} on {mask}: {reason}")
+        self._changed()
+        return ban
+
+    def _insert(self, ban: ServerBan) -> None:
+        self.bans[ban.mask] = ban
+        user, _, host = ban.mask.partition("@")
+
+        network = parse_network(host)
+        if network is not None:
+            self._networks.insert(network, ban.mask)
+            self._user_patterns[ban.mask] = None if user == "*" else compile_mask(user)
+        elif user == "*":
+            self._masks.add(f"*!{ban.mask}")
+        else:
+            self._user_masks.add(f"*!{ban.mask}")
+
+        if ban.expires_at is not None:
+            heapq.heappush(self._expiry, (ban.expires_at, ban.mask))
+            self._schedule_expiry()
+
+    def remove(self, mask: str) -> ServerBan | None:
+        mask = normalize_ban_mask(mask)
+        ban = self.bans.pop(mask, None)
+        if ban is None:
+            return None
+
+        host = mask.partition("@")[2]
+        network = parse_network(host)
+        if network is not None:
+            self._networks.remove(network, mask)
+            self._user_patterns.pop(mask, None)
+        elif mask.startswith("*@"):
+            self._masks.remove(f"*!{mask}")
+        else:
+            self._user_masks.remove(f"*!{mask}")
+
+        self._changed()
+        return ban
+
+    def check(self, username: str | None, host: str) -> ServerBan | None:
+        # At accept time only the address is known, so only bans on any
+        # user can match; registration checks again with the username.
+        if not self.bans:
+            return None
+
+        now = time.time()
+        # Expired bans go first so none can shadow a live one below
+        if self._expiry and self._expiry[0][0] <= now:
+            self.expire(now)
+        user = casefold(username) if username else None
+
+        try:
+            address: IPAddress | None = ipaddress.ip_address(host)
+        except ValueError:
+            address = None
+
+        if address is not None:
+            for mask in self._networks.lookup(address):
+                pattern = self._user_patterns.get(mask)
+                if pattern is None or (user and pattern.fullmatch(user)):
+                    ban = self.bans[mask]
+                    if not ban.is_expired(now):
+                        return ban
+
+        # A user pattern cannot be judged without the username; matching it
+        # against a "*" stand-in would let "?" match and "a*" miss
+        found = self._masks.find(f"*!*@{host}")
+        if found is None and username:
+            found = self._user_masks.find(f"*!{username}@{host}")
+        if found is not None:
+            matched = self.bans.get(found[2:])
+            if matched is not None and not matched.is_expired(now):
+                return matched
+        return None
+
+    def expire(self, now: float | None = None) -> list[ServerBan]:
+        now = time.time() if now is None else now
+        expired: list[ServerBan] = []
+
+        while self._expiry and self._expiry[0][0] <= now:
+            expires_at, mask = heapq.heappop(self._expiry)
+            ban = self.bans.get(mask)
+            # Entries for bans removed or replaced since are skipped
+            if ban is not None and ban.expires_at == expires_at:
+                self.remove(mask)
+                expired.append(ban)
+                self.logger.info(f"{ban.kind}-line on {mask} expired")
+        return expired
+
+    def _schedule_expiry(self) -> None:
+        if not self._expiry:
+            return
+
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+
+        earliest = self._expiry[0][0]
+        if self._expiry_timer is not None:
+            if self._expiry_at is not None and self._expiry_at <= earliest:
+                return
+            self._expiry_timer.cancel()
+
+        self._expiry_at = earliest
+        self._expiry_timer = loop.call_later(
+            max(earliest - time.time(), 0), self._on_expiry
+        )
+
+    def _on_expiry(self) -> None:
+        self._expiry_timer = None
+        self._expiry_at = None
+        self.expire()
+        self._schedule_expiry()
+
+    def _changed(self) -> None:
+        self._snapshot.changed()
+
+    def save(self) -> None:
+        self._snapshot.save()
+
+    def load(self) -> None:
+        entries = self._snapshot.load()
+        if not entries:
+            return
+
+        now = time.time()
+        for entry in entries:
+            ban = ServerBan(**entry)
+            if not ban.is_expired(now):
+                self._insert(ban)
+        self.logger.info(f"Loaded {len(self.bans)} bans from {self.config.path}")
+
+    def close(self) -> None:
+        if self._expiry_timer is not None:
+            self._expiry_timer.cancel()
+            self._expiry_timer = None
+        self._snapshot.close()
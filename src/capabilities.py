@@ -0,0 +1,130 @@
+import itertools
+from collections.abc import Callable, Iterable
+from dataclasses import dataclass
+from datetime import datetime, timezone
+
+MessageRenderer = Callable[[int], str]
+
+TAG_ESCAPES = {";": "\\:", " ": "\\s", "\\": "\\\\", "\r": "\\r", "\n": "\\n"}
+
+
+@dataclass(frozen=True)
+class Capability:
+    name: str
+    bit: int
+    value: str | None = None
+
+
+class CapabilityRegistry:
+    def __init__(self) -> None:
+        self.by_name: dict[str, Capability] = {}
+
+    def register(self, name: str, value: str | None = None) -> int:
+        if name in self.by_name:
+            raise ValueError(f"Capability {name} is already registered")
+
+        bit = 1 << len(self.by_name)
+        self.by_name[name] = Capability(name, bit, value)
+        return bit
+
+    def advertise(self, version: int) -> list[str]:
+        tokens: list[str] = []
+        for cap in self.by_name.values():
+            if version >= 302 and cap.value:
+                tokens.append(f"{cap.name}={cap.value}")
+            else:
+                tokens.append(cap.name)
+        return tokens
+
+    def parse_request(self, request: str) -> tuple[int, int] | None:
+        # Returns (bits to enable, bits to disable), or None if any capability
+        # is unknown, since a CAP REQ is accepted or rejected as a whole.
+        enable = 0
+        disable = 0
+        for token in request.split():
+            cap = self.by_name.get(token.lstrip("-"))
+            if cap is None:
+                return None
+            if token.startswith("-"):
+                disable |= cap.bit
+            else:
+                enable |= cap.bit
+        return enable, disable
+
+    def names(self, mask: int) -> list[str]:
+        return [cap.name for cap in self.by_name.values() if mask & cap.bit]
+
+
+CAPABILITIES = CapabilityRegistry()
+
+SASL = CAPABILITIES.register("sasl", "PLAIN,EXTERNAL")
+BATCH = CAPABILITIES.register("batch")
+MESSAGE_TAGS = CAPABILITIES.register("message-tags")
+ECHO_MESSAGE = CAPABILITIES.register("echo-message")
+SERVER_TIME = CAPABILITIES.register("server-time")
+MULTI_PREFIX = CAPABILITIES.register("multi-prefix")
+AWAY_NOTIFY = CAPABILITIES.register("away-notify")
+
+# Capabilities that change how a relayed message is serialized
+TAG_CAPS = SERVER_TIME | MESSAGE_TAGS
+
+_batch_ids = itertools.count(1)
+
+
+def server_time() -> str:
+    now = datetime.now(timezone.utc)
+    return now.strftime("%Y-%m-%dT%H:%M:%S.") + f"{now.microsecond // 1000:03d}Z"
+
+
+def format_tags(tags: dict[str, str]) -> str:
+    parts: list[str] = []
+    for key, value in tags.items():
+        if value:
+            escaped = "".join(TAG_ESCAPES.get(char, char) for char in value)
+            parts.append(f"{key}={escaped}")
+        else:
+            parts.append(key)
+    return ";".join(parts)
+
+
+def client_tags(tags: dict[str, str]) -> dict[str, str]:
+    return {key: value for key, value in tags.items() if key.startswith("+")}
+
+
+def batch_reference() -> str:
+    return f"b{next(_batch_ids):x}"
+
+
+def add_tag(line: str, tag: str) -> str:
+    if line.startswith("@"):
+        return f"@{tag};{line[1:]}"
+    return f"@{tag} {line}"
+
+
+def tagged(line: str, relayed: dict[str, str] | None = None) -> MessageRenderer:
+    # Tags are fixed when the event happens, not when each variant is built
+    timestamp = server_time()
+    relayed = relayed or {}
+
+    def render(caps: int) -> str:
+        tags: dict[str, str] = {}
+        if caps & SERVER_TIME:
+            tags["time"] = timestamp
+        if caps & MESSAGE_TAGS:
+            tags.update(relayed)
+        return f"@{format_tags(tags)} {line}" if tags else line
+
+    return render
+
+
+def chunk_tokens(tokens: Iterable[str], limit: int, separator: str = " ") -> list[str]:
+    chunks: list[str] = []
+    current = ""
+    for token in tokens:
+        if current and len(current) + len(separator) + len(token) > limit:
+            chunks.append(current)
+            current = token
+        else:
+            current = f"{current}{separator}{token}" if current else token
+    chunks.append(current)
+    return chunks
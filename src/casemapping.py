@@ -0,0 +1,36 @@
+import string
+
+# Characters folded by each mapping on top of ASCII A-Z
+_EXTRA = {
+    "ascii": ("", ""),
+    "strict-rfc1459": ("[]\\", "{}|"),
+    "rfc1459": ("[]\\~", "{}|^"),
+}
+
+TABLES: dict[str, dict[int, int]] = {
+    name: str.maketrans(string.ascii_uppercase + upper, string.ascii_lowercase + lower)
+    for name, (upper, lower) in _EXTRA.items()
+}
+
+DEFAULT_CASEMAPPING = "rfc1459"
+
+_name = DEFAULT_CASEMAPPING
+_table = TABLES[DEFAULT_CASEMAPPING]
+
+
+def set_casemapping(name: str) -> None:
+    global _name, _table
+
+    table = TABLES.get(name)
+    if table is None:
+        raise ValueError(f"Unknown casemapping: {name}")
+    _name, _table = name, table
+
+
+def casemapping() -> str:
+    return _name
+
+
+def casefold(text: str) -> str:
+    """Folds a nick or channel name under the server's casemapping."""
+    return text.translate(_table)
@@ -1,58 +1,456 @@
 from __future__ import annotations
 
+import asyncio
 import logging
+import sys
+import time
+from collections.abc import Callable
 from typing import TYPE_CHECKING
 
+from src.capabilities import (
+    BATCH,
+    TAG_CAPS,
+    MessageRenderer,
+    add_tag,
+    batch_reference,
+)
+from src.casemapping import casefold
+from src.interning import intern_string
+from src.limits import limits
+from src.masks import MaskList
+from src.scheduling import fanout
+
 if TYPE_CHECKING:
     from src.session import ClientSession
 
+# One logger for every channel; the messages already name the channel
+logger = logging.getLogger("Channel")
+
+
+def _width(entry: str) -> int:
+    return len(entry.encode("utf-8"))
+
+
+class NamesList:
+    """Member entries packed into RPL_NAMREPLY-sized chunks, kept up to date."""
+
+    def __init__(self, budget: int) -> None:
+        self.budget = budget
+        self.chunks: list[dict[ClientSession, str]] = []
+        self.lengths: list[int] = []
+        self.lines: list[str | None] = []
+        self.where: dict[ClientSession, int] = {}
+        self.total: int = 0
+
+    def _size(self, index: int) -> int:
+        # Entry lengths plus the spaces between them
+        return self.lengths[index] + len(self.chunks[index]) - 1
+
+    def add(self, session: ClientSession, entry: str) -> None:
+        width = _width(entry)
+        if self.chunks and self._size(-1) + 1 + width <= self.budget:
+            index = len(self.chunks) - 1
+        else:
+            self.chunks.append({})
+            self.lengths.append(0)
+            self.lines.append(None)
+            index = len(self.chunks) - 1
+
+        self.chunks[index][session] = entry
+        self.lengths[index] += width
+        self.lines[index] = None
+        self.where[session] = index
+        self.total += width + 1
+
+    def remove(self, session: ClientSession) -> None:
+        index = self.where.pop(session, None)
+        if index is None:
+            return
+
+        width = _width(self.chunks[index].pop(session))
+        self.lengths[index] -= width
+        self.lines[index] = None
+        self.total -= width + 1
+
+    def update(self, session: ClientSession, entry: str) -> None:
+        index = self.where.get(session)
+        if index is None:
+            self.add(session, entry)
+            return
+
+        delta = _width(entry) - _width(self.chunks[index][session])
+        if self._size(index) + delta <= self.budget:
+            self.chunks[index][session] = entry
+            self.lengths[index] += delta
+            self.total += delta
+            self.lines[index] = None
+        else:
+            self.remove(session)
+            self.add(session, entry)
+
+    def needs_compaction(self) -> bool:
+        # Parts leave holes behind; repack once they double the line count
+        needed = self.total // max(self.budget, 1) + 1
+        return len(self.chunks) > 2 * needed + 1
+
+    def memory_usage(self) -> int:
+        size = sys.getsizeof(self.chunks) + sys.getsizeof(self.where)
+        size += sys.getsizeof(self.lengths) + sys.getsizeof(self.lines)
+        for chunk in self.chunks:
+            size += sys.getsizeof(chunk)
+            size += sum(sys.getsizeof(entry) for entry in chunk.values())
+        size += sum(sys.getsizeof(line) for line in self.lines if line)
+        return size
+
+    def render(self) -> list[str]:
+        result: list[str] = []
+        for index, chunk in enumerate(self.chunks):
+            if not chunk:
+                continue
+            line = self.lines[index]
+            if line is None:
+                line = self.lines[index] = " ".join(chunk.values())
+            result.append(line)
+        return result
+
 
 class Channel:
     def __init__(self, name: str) -> None:
         if not self.is_valid_name(name):
             raise ValueError(f"Invalid channel name: {name}")
 
-        self.name: str = name
+        self.name: str = intern_string(name)
+        self.name_key: str = intern_string(casefold(name))
         # Hack for ordered set
         self.members: dict[ClientSession, None] = {}
         self.operators: set[ClientSession] = set()
-        self.logger: logging.Logger = logging.getLogger(f"Channel:{name}")
+        self.voiced: set[ClientSession] = set()
+        self.created_at: float = time.time()
+        self.topic: str = ""
+        self.topic_set_by: str = ""
+        self.topic_set_at: float = 0.0
+        # RPL_TOPIC/RPL_TOPICWHOTIME after the recipient's nick, built once
+        # per topic change instead of on every JOIN
+        self._topic_replies: tuple[str, str] | None = None
+        # Called with the previous member count whenever it changes
+        self.on_resize: Callable[[Channel, int], None] | None = None
+
+        # NAMES payloads, keyed by (line budget, multi-prefix)
+        self._names: dict[tuple[int, bool], NamesList] = {}
+
+        # Join announcements: aggregated over join_window seconds, or held
+        # back entirely until the member first speaks when quiet_joins is set.
+        self.join_window: float = 0.0
+        self.quiet_joins: bool = False
+        self.unannounced: dict[ClientSession, MessageRenderer] = {}
+        self._pending_joins: dict[ClientSession, MessageRenderer] = {}
+        self._join_timer: asyncio.TimerHandle | None = None
+        self._join_flush: asyncio.Task[None] | None = None
+
+        # Channel modes: simple flags plus the parameterized ones
+        self.modes: set[str] = {"n", "t"}
+        self.key: str | None = None
+        self.limit: int | None = None
+        self.bans = MaskList()
+        self.exceptions = MaskList()
+        self.invite_exceptions = MaskList()
+        self.invited: set[ClientSession] = set()
 
     def add_user(self, session: ClientSession) -> None:
         if not self.members:
             self.operators.add(session)
-            self.logger.info(f"User {session.nickname} became operator of {self.name}")
+            logger.info(f"User {session.nickname} became operator of {self.name}")
 
+        size = len(self.members)
         self.members[session] = None
-        self.logger.info(f"User {session.nickname} joined {self.name}")
+        if self.on_resize and len(self.members) != size:
+            self.on_resize(self, size)
+        session.channels.add(self)
+        self.refresh_names(session)
+        logger.info(f"User {session.nickname} joined {self.name}")
 
     def remove_user(self, session: ClientSession) -> None:
-        self.members.pop(session, None)
+        if session in self.members:
+            del self.members[session]
+            if self.on_resize:
+                self.on_resize(self, len(self.members) + 1)
+        self.unannounced.pop(session, None)
+        self._pending_joins.pop(session, None)
         self.operators.discard(session)
-        self.logger.info(f"User {session.nickname} left {self.name}")
+        self.voiced.discard(session)
+        self.invited.discard(session)
+        session.channels.discard(self)
+        for names in self._names.values():
+            names.remove(session)
+        logger.info(f"User {session.nickname} left {self.name}")
 
         if self.members and not self.operators:
             new_op = next(iter(self.members))
 
             self.operators.add(new_op)
-            self.logger.info(
+            self.refresh_names(new_op)
+            logger.info(
                 f"User {new_op.nickname} (oldest member) automatically"
                 f" became operator of {self.name}"
             )
 
+    def memory_usage(self) -> int:
+        """Approximate bytes held by the channel; members are counted as references."""
+        size = sys.getsizeof(self) + sys.getsizeof(self.__dict__)
+        size += sys.getsizeof(self.name) + sys.getsizeof(self.topic)
+        for container in (
+            self.members,
+            self.operators,
+            self.voiced,
+            self.invited,
+            self.modes,
+            self.unannounced,
+            self._pending_joins,
+            self._names,
+        ):
+            size += sys.getsizeof(container)
+        size += sum(names.memory_usage() for names in self._names.values())
+        for masks in (self.bans, self.exceptions, self.invite_exceptions):
+            size += masks.memory_usage()
+        return size
+
+    def prefixes(self, session: ClientSession) -> str:
+        # Highest rank first, so that prefixes[:1] is the single-prefix form
+        prefixes = "@" if session in self.operators else ""
+        if session in self.voiced:
+            prefixes += "+"
+        return prefixes
+
+    def set_operator(self, session: ClientSession, value: bool) -> bool:
+        return self._set_rank(self.operators, session, value)
+
+    def set_voice(self, session: ClientSession, value: bool) -> bool:
+        return self._set_rank(self.voiced, session, value)
+
+    def _set_rank(
+        self, ranks: set[ClientSession], session: ClientSession, value: bool
+    ) -> bool:
+        if (session in ranks) == value:
+            return False
+
+        if value:
+            ranks.add(session)
+        else:
+            ranks.discard(session)
+        self.refresh_names(session)
+        return True
+
+    def mode_string(self, show_key: bool = True) -> list[str]:
+        flags = sorted(self.modes)
+        if self.quiet_joins:
+            flags.append("D")
+        args: list[str] = []
+        if self.key:
+            flags.append("k")
+            args.append(self.key if show_key else "*")
+        if self.limit is not None:
+            flags.append("l")
+            args.append(str(self.limit))
+        return ["+" + "".join(flags), *args]
+
+    def set_topic(self, topic: str, set_by: str, set_at: float | None = None) -> None:
+        self.topic = topic
+        if topic:
+            self.topic_set_by = set_by
+            self.topic_set_at = time.time() if set_at is None else set_at
+        else:
+            self.topic_set_by = ""
+            self.topic_set_at = 0.0
+        self._topic_replies = None
+
+    def topic_replies(self) -> tuple[str, str]:
+        # 332 and 333 parameters; only meaningful while a topic is set
+        if self._topic_replies is None:
+            self._topic_replies = (
+                f"{self.name} :{self.topic}",
+                f"{self.name} {self.topic_set_by} {int(self.topic_set_at)}",
+            )
+        return self._topic_replies
+
+    def is_banned(self, session: ClientSession) -> bool:
+        if not self.bans:
+            return False
+        mask = session.hostmask
+        return self.bans.matches(mask) and not self.exceptions.matches(mask)
+
+    def is_invited(self, session: ClientSession) -> bool:
+        if session in self.invited:
+            return True
+        return self.invite_exceptions.matches(session.hostmask)
+
+    def can_send(self, session: ClientSession) -> bool:
+        if session in self.operators or session in self.voiced:
+            return True
+        if session not in self.members and "n" in self.modes:
+            return False
+        if "m" in self.modes:
+            return False
+        return not self.is_banned(session)
+
+    def refresh_names(self, session: ClientSession) -> None:
+        # Called whenever a member's nick or prefixes change. Members whose
+        # quiet JOIN is still held back are left out until they are revealed.
+        if (
+            session not in self.members
+            or session in self.unannounced
+            or not session.nickname
+        ):
+            return
+
+        prefixes = self.prefixes(session)
+        for (_, multi_prefix), names in self._names.items():
+            shown = prefixes if multi_prefix else prefixes[:1]
+            names.update(session, shown + session.nickname)
+
+    def names_lines(
+        self,
+        budget: int,
+        multi_prefix: bool = False,
+        viewer: ClientSession | None = None,
+    ) -> list[str]:
+        names = self._names.get((budget, multi_prefix))
+        if names is None or names.needs_compaction():
+            names = self._names[(budget, multi_prefix)] = NamesList(budget)
+            for member in self.members:
+                if member.nickname and member not in self.unannounced:
+                    prefixes = self.prefixes(member)
+                    shown = prefixes if multi_prefix else prefixes[:1]
+                    names.add(member, shown + member.nickname)
+        lines = names.render()
+
+        # A member who joined quietly still sees themselves
+        if viewer is not None and viewer in self.unannounced and viewer.nickname:
+            prefixes = self.prefixes(viewer)
+            entry = (prefixes if multi_prefix else prefixes[:1]) + viewer.nickname
+            if lines and _width(lines[-1]) + 1 + _width(entry) <= budget:
+                lines[-1] += " " + entry
+            else:
+                lines.append(entry)
+        return lines
+
     def is_operator(self, session: ClientSession) -> bool:
         return session in self.operators
 
     async def broadcast(
         self, message: str, skip_user: ClientSession | None = None
     ) -> None:
-        for member in self.members:
-            if member != skip_user:
-                await member.send_reply(message)
+        async for part in fanout().slices(self.members):
+            for member in part:
+                if member != skip_user:
+                    await member.send_reply(message)
+
+    async def broadcast_variants(
+        self,
+        render: MessageRenderer,
+        caps_mask: int,
+        skip_user: ClientSession | None = None,
+        required_caps: int = 0,
+    ) -> None:
+        # Members are grouped by the capabilities that affect serialization,
+        # so each distinct variant of the message is rendered only once.
+        variants: dict[int, str] = {}
+        async for part in fanout().slices(self.members):
+            for member in part:
+                if member == skip_user or member.caps & required_caps != required_caps:
+                    continue
+
+                key = member.caps & caps_mask
+                line = variants.get(key)
+                if line is None:
+                    line = variants[key] = render(key)
+                await member.send_reply(line)
+
+    async def announce_join(
+        self, session: ClientSession, render: MessageRenderer
+    ) -> None:
+        # The joiner always sees their own JOIN right away
+        await session.send_reply(render(session.caps & TAG_CAPS))
+
+        if self.quiet_joins:
+            self.unannounced[session] = render
+            for names in self._names.values():
+                names.remove(session)
+            return
+
+        if self.join_window <= 0:
+            await self.broadcast_variants(render, TAG_CAPS, skip_user=session)
+            return
+
+        self._pending_joins[session] = render
+        if self._join_timer is None:
+            loop = asyncio.get_running_loop()
+            self._join_timer = loop.call_later(self.join_window, self._start_flush)
+
+    def _start_flush(self) -> None:
+        self._join_timer = None
+        self._join_flush = asyncio.ensure_future(self.flush_joins())
+
+    def is_announced(self, session: ClientSession) -> bool:
+        return session not in self.unannounced and session not in self._pending_joins
+
+    async def reveal(self, session: ClientSession) -> None:
+        # Others must see a member's JOIN before anything the member says
+        render = self.unannounced.pop(session, None)
+        if render is not None:
+            self.refresh_names(session)
+            await self.broadcast_variants(render, TAG_CAPS, skip_user=session)
+        elif session in self._pending_joins:
+            await self.flush_joins()
+
+    async def flush_joins(self) -> None:
+        if self._join_timer is not None:
+            self._join_timer.cancel()
+            self._join_timer = None
+
+        pending = list(self._pending_joins.items())
+        self._pending_joins.clear()
+        if not pending:
+            return
+
+        order = {joiner: i for i, (joiner, _) in enumerate(pending)}
+        reference = batch_reference()
+        variants: dict[int, list[str]] = {}
+
+        async for part in fanout().slices(self.members):
+            # Flushing a corked member may yield, and with it change the set
+            for member in list(part):
+                # A joiner already learned about earlier joiners from NAMES
+                start = order.get(member, -1) + 1
+                if start >= len(pending):
+                    continue
+
+                key = member.caps & (TAG_CAPS | BATCH)
+                lines = variants.get(key)
+                if lines is None:
+                    lines = [render(key & TAG_CAPS) for _, render in pending]
+                    if key & BATCH:
+                        lines = [add_tag(line, f"batch={reference}") for line in lines]
+                    variants[key] = lines
+
+                server_prefix = f":{member.server_name}"
+                use_batch = key & BATCH and len(lines) - start > 1
+                async with member.corked():
+                    if use_batch:
+                        await member.send_reply(
+                            server_prefix,
+                            "BATCH",
+                            f"+{reference}",
+                            "pyirc/joins",
+                            self.name,
+                        )
+                    for line in lines[start:]:
+                        await member.send_reply(line)
+                    if use_batch:
+                        await member.send_reply(server_prefix, "BATCH", f"-{reference}")
 
     @staticmethod
     def is_valid_name(name: str) -> bool:
-        if not name or len(name) > 200:
+        if not name or len(name) > limits().channellen:
             return False
 
         if not name.startswith("#"):
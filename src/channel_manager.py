@@ -1,32 +1,152 @@
 from __future__ import annotations
 
 import logging
+import re
+import time
+from collections.abc import Iterable, Iterator
+from dataclasses import dataclass, field
 from typing import TYPE_CHECKING
 
+from src.casemapping import casefold
 from src.channel import Channel
+from src.masks import WILDCARDS, compile_mask
 
 if TYPE_CHECKING:
     from src.session import ClientSession
 
 
+@dataclass
+class ListFilter:
+    """LIST conditions (ELIST C, M, N, T and U) over stored channel stats."""
+
+    min_users: int = 0
+    max_users: int | None = None
+    created_after: float | None = None
+    created_before: float | None = None
+    topic_after: float | None = None
+    topic_before: float | None = None
+    names: list[str] = field(default_factory=list)
+    masks: list[re.Pattern[str]] = field(default_factory=list)
+    excluded: list[re.Pattern[str]] = field(default_factory=list)
+
+    @classmethod
+    def parse(cls, tokens: Iterable[str], now: float | None = None) -> "ListFilter":
+        now = time.time() if now is None else now
+        query = cls()
+
+        for token in tokens:
+            if not token:
+                continue
+
+            kind, op, value = "", token[:1], token[1:]
+            if token[:1] in "CT" and token[1:2] in "<>":
+                kind, op, value = token[0], token[1], token[2:]
+
+            if op in "<>" and value.isdigit():
+                number = int(value)
+                if kind == "":
+                    if op == ">":
+                        query.min_users = max(query.min_users, number + 1)
+                    else:
+                        query.max_users = number - 1
+                    continue
+
+                # C and T take minutes ago: "<" means more recent than that
+                cutoff = now - number * 60
+                if kind == "C" and op == "<":
+                    query.created_after = cutoff
+                elif kind == "C":
+                    query.created_before = cutoff
+                elif op == "<":
+                    query.topic_after = cutoff
+                else:
+                    query.topic_before = cutoff
+            elif token.startswith("!"):
+                query.excluded.append(compile_mask(casefold(token[1:])))
+            elif WILDCARDS.intersection(token):
+                query.masks.append(compile_mask(casefold(token)))
+            else:
+                query.names.append(token)
+
+        return query
+
+    def matches(self, channel: Channel) -> bool:
+        size = len(channel.members)
+        if size < self.min_users:
+            return False
+        if self.max_users is not None and size > self.max_users:
+            return False
+
+        if self.created_after is not None and channel.created_at <= self.created_after:
+            return False
+        if (
+            self.created_before is not None
+            and channel.created_at >= self.created_before
+        ):
+            return False
+
+        if self.topic_after is not None or self.topic_before is not None:
+            if not channel.topic:
+                return False
+            if (
+                self.topic_after is not None
+                and channel.topic_set_at <= self.topic_after
+            ):
+                return False
+            if (
+                self.topic_before is not None
+                and channel.topic_set_at >= self.topic_before
+            ):
+                return False
+
+        if self.masks or self.excluded:
+            name = channel.name_key
+            if self.masks and not any(mask.fullmatch(name) for mask in self.masks):
+                return False
+            if any(mask.fullmatch(name) for mask in self.excluded):
+                return False
+
+        return True
+
+
+class ChannelLimitError(Exception):
+    """Raised when creating a channel would exceed the server-wide cap."""
+
+
 class ChannelManager:
     _instance: ChannelManager | None = None
 
+    # Seconds between warnings about refused channels
+    WARN_INTERVAL = 10.0
+
     def __new__(cls) -> ChannelManager:
         if cls._instance is None:
             cls._instance = super().__new__(cls)
             cls._instance.channels = {}
+            cls._instance.by_size = {}
+            cls._instance.max_channels = 0
+            cls._instance.refused = 0
+            cls._instance._unwarned = 0
+            cls._instance._warned_at = 0.0
             cls._instance.logger = logging.getLogger("ChannelManager")
         return cls._instance
 
     def __init__(self) -> None:
         self.channels: dict[str, Channel]
+        # Normalized channel names bucketed by member count
+        self.by_size: dict[int, dict[str, None]]
+        # Server-wide channel cap; 0 means no limit
+        self.max_channels: int
+        # Channels refused at the cap, in all and since the last warning
+        self.refused: int
+        self._unwarned: int
+        self._warned_at: float
         self.logger: logging.Logger
 
     def _normalize_name(self, name: str) -> str:
         if not name.startswith("#"):
             name = "#" + name
-        return name.lower()
+        return casefold(name)
 
     def channel_exists(self, name: str) -> bool:
         return self._normalize_name(name) in self.channels
@@ -46,27 +166,116 @@ class ChannelManager:
         if normalized in self.channels:
             raise ValueError(f"Channel {normalized} already exists!")
 
+        if self.max_channels and len(self.channels) >= self.max_channels:
+            self._refuse()
+            raise ChannelLimitError(f"Channel limit reached: {self.max_channels}")
+
         display_name = name if name.startswith("#") else "#" + name
 
         new_channel = Channel(display_name)
+        new_channel.on_resize = self._on_resize
         self.channels[normalized] = new_channel
+        self.by_size.setdefault(0, {})[normalized] = None
         self.logger.info(f"Created new channel: {normalized}")
         return new_channel
 
+    def _refuse(self) -> None:
+        # A client can keep trying, so this is cheap and rarely logged
+        self.refused += 1
+        self._unwarned += 1
+        now = time.monotonic()
+        if now - self._warned_at >= self.WARN_INTERVAL:
+            self.logger.warning(
+                f"Channel limit of {self.max_channels} reached:"
+                f" refused {self._unwarned} new channels"
+            )
+            self._unwarned = 0
+            self._warned_at = now
+
     def get_or_create_channel(self, name: str) -> Channel:
         channel = self.get_channel(name)
         if channel:
             return channel
         return self.create_channel(name)
 
-    def remove_user_from_all_channels(self, session: ClientSession) -> None:
-        to_delete: list[str] = []
+    def _unindex(self, size: int, name: str) -> None:
+        bucket = self.by_size.get(size)
+        if bucket is not None:
+            bucket.pop(name, None)
+            if not bucket:
+                del self.by_size[size]
 
-        for name, channel in self.channels.items():
-            channel.remove_user(session)
-            if not channel.members:
-                to_delete.append(name)
-
-        for name in to_delete:
+    def _on_resize(self, channel: Channel, old_size: int) -> None:
+        name = channel.name_key
+        self._unindex(old_size, name)
+        if channel.members:
+            self.by_size.setdefault(len(channel.members), {})[name] = None
+        elif self.channels.get(name) is channel:
+            # The last member left, so the channel goes with them
             del self.channels[name]
             self.logger.info(f"Auto-deleted empty channel: {name}")
+
+    def channels_by_size(
+        self, min_users: int = 0, max_users: int | None = None
+    ) -> Iterator[Channel]:
+        # Largest channels first; sizes outside the range are never visited
+        for size in sorted(self.by_size, reverse=True):
+            if size < min_users:
+                break
+            if max_users is not None and size > max_users:
+                continue
+
+            for name in list(self.by_size.get(size, ())):
+                channel = self.channels.get(name)
+                # Skip entries that outlived a reset of the channel table
+                if channel is not None and len(channel.members) == size:
+                    yield channel
+
+    def list_candidates(self, query: ListFilter) -> Iterator[Channel]:
+        # Channels the indexes cannot rule out; query.matches() decides
+        if query.names:
+            for name in query.names:
+                channel = self.get_channel(name)
+                if channel:
+                    yield channel
+            return
+
+        yield from self.channels_by_size(query.min_users, query.max_users)
+
+    def list_channels(self, query: ListFilter) -> Iterator[Channel]:
+        return (
+            channel for channel in self.list_candidates(query) if query.matches(channel)
+        )
+
+    def remove_user_from_all_channels(self, session: ClientSession) -> None:
+        # Only the session's own channels are visited. Channels emptied by
+        # the session leaving delete themselves in _on_resize; the sweep
+        # below catches one that was left without members another way.
+        for channel in list(session.channels):
+            channel.remove_user(session)
+            name = channel.name_key
+            if not channel.members and self.channels.get(name) is channel:
+                self._unindex(0, name)
+                del self.channels[name]
+                self.logger.info(f"Auto-deleted empty channel: {name}")
+
+    @staticmethod
+    def common_peers(
+        session: ClientSession, required_caps: int = 0
+    ) -> set[ClientSession]:
+        # Members who can see the session in any of its channels, each once;
+        # set.update() over the member dicts deduplicates in C
+        peers: set[ClientSession] = set()
+        for channel in session.channels:
+            # Nobody else has seen a quiet or still-batched JOIN
+            if channel.is_announced(session):
+                peers.update(channel.members)
+        peers.discard(session)
+        if required_caps:
+            return {
+                peer for peer in peers if peer.caps & required_caps == required_caps
+            }
+        return peers
+
+    def memory_usage(self) -> int:
+        return sum(channel.memory_usage() for channel in self.channels.values())
@@ -1,38 +1,160 @@
+import asyncio
+import base64
+import binascii
 import logging
+import re
+import time
+from collections.abc import Iterable
 
-from src.channel_manager import ChannelManager
+from src.accounts import Account, create_account_store
+from src.auth import AuthBusyError, Authenticator, is_hashed, protect_plaintext
+from src.bans import BanEngine, ServerBan
+from src.capabilities import (
+    AWAY_NOTIFY,
+    CAPABILITIES,
+    ECHO_MESSAGE,
+    MESSAGE_TAGS,
+    MULTI_PREFIX,
+    SASL,
+    TAG_CAPS,
+    MessageRenderer,
+    chunk_tokens,
+    client_tags,
+    tagged,
+)
+from src.casemapping import casefold, casemapping, set_casemapping
+from src.channel import Channel
+from src.channel_manager import ChannelLimitError, ChannelManager, ListFilter
 from src.config import ServerConfig
+from src.eventlog import EventLog
+from src.interning import intern_string
+from src.limits import TARGET_PARAM, limits, set_limits, targmax_token
+from src.masks import WILDCARDS, MaskList, compile_mask
+from src.profiling import (
+    PROFILE_CPU,
+    PROFILE_SAMPLE,
+    Profiler,
+    ProfilerBusyError,
+    spans,
+)
 from src.protocol import IRCMessage
+from src.scheduling import fanout, set_scheduling
 from src.session import ClientSession
+from src.topics import TopicStore
 from src.user_manager import UserManager
 
+SASL_MECHANISMS = ("PLAIN", "EXTERNAL")
+CAP_LINE_LIMIT = 400
+SASL_CHUNK = 400
+SASL_MAX_LENGTH = 4096
+# Replies sent between yields to the event loop in long listings
+REPLY_CHUNK = 100
+SERVER_INFO = "PyIRC Server"
+ISUPPORT_PER_LINE = 13
+
+CHANNEL_FLAGS = "imntD"
+# Mode letter -> (list reply, end-of-list reply, description)
+LIST_MODES = {
+    "b": ("367", "368", "ban"),
+    "e": ("348", "349", "exception"),
+    "I": ("346", "347", "invite"),
+}
+
 
 class CommandHandler:
     def __init__(self, config: ServerConfig):
         self.config = config
+        set_casemapping(config.casemapping)
+        set_limits(config.limits)
+        set_scheduling(config.scheduling)
         self.logger = logging.getLogger(self.__class__.__name__)
         self.user_manager = UserManager()
         self.channel_manager = ChannelManager()
+        self.channel_manager.max_channels = config.channels.max_channels
+        self.authenticator = Authenticator(config.auth, config.password)
+        self.account_store = create_account_store(config.accounts)
+        self.bans = BanEngine(config.bans)
+        self.topics = TopicStore(config.channels)
+        self.profiler = Profiler(config.profiling)
+        self.events = EventLog(config.access_log)
+        spans().enabled = config.profiling.spans
+        self.opers = {
+            name.lower(): password
+            if is_hashed(password)
+            else protect_plaintext(password)
+            for name, password in config.opers.items()
+        }
+
+    def close(self) -> None:
+        self.authenticator.close()
+        self.account_store.close()
+        self.bans.close()
+        self.topics.close()
+        self.profiler.stop()
+        self.events.close()
 
     async def handle(self, session: ClientSession, msg: IRCMessage) -> None:
         command = msg.command
         handlers = {
+            "CAP": self.handle_cap,
+            "AUTHENTICATE": self.handle_authenticate,
             "PASS": self.handle_pass,
             "NICK": self.handle_nick,
             "USER": self.handle_user,
             "QUIT": self.handle_quit,
+            "PING": self.handle_ping,
+            "PONG": self.handle_pong,
             "JOIN": self.handle_join,
             "PRIVMSG": self.handle_privmsg,
+            "TAGMSG": self.handle_tagmsg,
             "PART": self.handle_part,
+            "NAMES": self.handle_names,
+            "TOPIC": self.handle_topic,
             "KICK": self.handle_kick,
+            "MODE": self.handle_mode,
+            "INVITE": self.handle_invite,
+            "WHO": self.handle_who,
+            "WHOIS": self.handle_whois,
+            "LIST": self.handle_list,
+            "ISON": self.handle_ison,
+            "AWAY": self.handle_away,
+            "MONITOR": self.handle_monitor,
+            "USERHOST": self.handle_userhost,
+            "OPER": self.handle_oper,
+            "KLINE": self.handle_kline,
+            "GLINE": self.handle_kline,
+            "UNKLINE": self.handle_unkline,
+            "UNGLINE": self.handle_unkline,
+            "PROFILE": self.handle_profile,
         }
 
         handler = handlers.get(command)
-        if handler:
-            await handler(session, msg)
-        else:
-            self.logger.debug(f"Unknown command: {command}")
-            await session.send_error("421", command, ":Unknown command")
+        timing = spans()
+        async with session.corked():
+            if handler and await self.too_many_targets(session, msg):
+                return
+            if handler:
+                started = time.perf_counter() if timing.enabled else 0.0
+                await handler(session, msg)
+                if timing.enabled:
+                    timing.record("dispatch", started)
+                    timing.record(f"dispatch:{command}", started)
+            else:
+                self.logger.debug(f"Unknown command: {command}")
+                await session.send_error("421", command, ":Unknown command")
+
+    async def too_many_targets(self, session: ClientSession, msg: IRCMessage) -> bool:
+        # TARGMAX is advertised, so this only trips for misbehaving clients
+        limit = limits().targmax.get(msg.command)
+        if not limit or not msg.params:
+            return False
+
+        targets = msg.params[TARGET_PARAM.get(msg.command, 0)]
+        if targets.count(",") < limit:
+            return False
+
+        await session.send_error("407", targets.split(",")[limit], ":Too many targets")
+        return True
 
     async def handle_pass(self, session: ClientSession, msg: IRCMessage) -> None:
         if session.is_registered:
@@ -46,6 +168,187 @@ class CommandHandler:
         session.password_attempt = msg.params[0]
         self.logger.debug(f"Password attempt received from {session.host}")
 
+    async def handle_cap(self, session: ClientSession, msg: IRCMessage) -> None:
+        if not msg.params:
+            await session.send_error("461", "CAP", ":Not enough parameters")
+            return
+
+        subcommand = msg.params[0].upper()
+        server_prefix = f":{session.server_name}"
+        target = session.nickname or "*"
+
+        if subcommand == "LS":
+            if not session.is_registered:
+                session.cap_negotiating = True
+            version = msg.params[1] if len(msg.params) > 1 else ""
+            if version.isdigit():
+                session.cap_version = max(session.cap_version, int(version))
+
+            chunks = chunk_tokens(
+                CAPABILITIES.advertise(session.cap_version), CAP_LINE_LIMIT
+            )
+            for i, chunk in enumerate(chunks):
+                # CAP 302 clients are told that more lines follow with a "*"
+                more = session.cap_version >= 302 and i < len(chunks) - 1
+                if more:
+                    await session.send_reply(
+                        server_prefix, "CAP", target, "LS", "*", f":{chunk}"
+                    )
+                else:
+                    await session.send_reply(
+                        server_prefix, "CAP", target, "LS", f":{chunk}"
+                    )
+
+        elif subcommand == "LIST":
+            enabled = " ".join(CAPABILITIES.names(session.caps))
+            await session.send_reply(
+                server_prefix, "CAP", target, "LIST", f":{enabled}"
+            )
+
+        elif subcommand == "REQ":
+            if not session.is_registered:
+                session.cap_negotiating = True
+            requested = msg.params[1] if len(msg.params) > 1 else ""
+            change = CAPABILITIES.parse_request(requested)
+
+            if change and requested.strip():
+                enable, disable = change
+                session.caps = (session.caps | enable) & ~disable
+                reply = "ACK"
+            else:
+                reply = "NAK"
+            await session.send_reply(
+                server_prefix, "CAP", target, reply, f":{requested}"
+            )
+
+        elif subcommand == "END":
+            if session.cap_negotiating:
+                session.cap_negotiating = False
+                await self.check_registration(session)
+
+        else:
+            await session.send_error("410", subcommand, ":Invalid CAP command")
+
+    async def handle_authenticate(
+        self, session: ClientSession, msg: IRCMessage
+    ) -> None:
+        if not session.caps & SASL:
+            await session.send_error("904", ":SASL authentication failed")
+            return
+
+        if session.is_registered or session.account:
+            await session.send_error(
+                "907", ":You have already authenticated using SASL"
+            )
+            return
+
+        if not msg.params:
+            await session.send_error("461", "AUTHENTICATE", ":Not enough parameters")
+            return
+
+        data = msg.params[0]
+
+        if data == "*":
+            session.sasl_mechanism = None
+            session.sasl_buffer = ""
+            await session.send_error("906", ":SASL authentication aborted")
+            return
+
+        if session.sasl_mechanism is None:
+            mechanism = data.upper()
+            if mechanism not in SASL_MECHANISMS or (
+                mechanism == "EXTERNAL" and not session.certfp
+            ):
+                await session.send_error(
+                    "908",
+                    ",".join(SASL_MECHANISMS),
+                    ":are available SASL mechanisms",
+                )
+                await session.send_error("904", ":SASL authentication failed")
+                return
+
+            session.sasl_mechanism = mechanism
+            session.sasl_buffer = ""
+            await session.send_reply("AUTHENTICATE", "+")
+            return
+
+        if data != "+":
+            session.sasl_buffer += data
+
+        if len(session.sasl_buffer) > SASL_MAX_LENGTH:
+            session.sasl_mechanism = None
+            session.sasl_buffer = ""
+            await session.send_error("905", ":SASL message too long")
+            return
+
+        # A full-size chunk means the client has more to send
+        if len(data) == SASL_CHUNK:
+            return
+
+        mechanism = session.sasl_mechanism
+        encoded = session.sasl_buffer
+        session.sasl_mechanism = None
+        session.sasl_buffer = ""
+
+        try:
+            payload = base64.b64decode(encoded, validate=True)
+            account = await self.sasl_authenticate(session, mechanism, payload)
+        except (binascii.Error, UnicodeDecodeError, AuthBusyError):
+            account = None
+
+        if account is None:
+            self.logger.warning(f"SASL {mechanism} failed from {session.host}")
+            await session.send_error("904", ":SASL authentication failed")
+            return
+
+        session.account = account.name
+        server_prefix = f":{session.server_name}"
+        target = session.nickname or "*"
+        mask = f"{target}!{session.username or '*'}@{session.host}"
+
+        await session.send_reply(
+            server_prefix,
+            "900",
+            target,
+            mask,
+            account.name,
+            f":You are now logged in as {account.name}",
+        )
+        await session.send_reply(
+            server_prefix, "903", target, ":SASL authentication successful"
+        )
+        self.logger.info(
+            f"SASL {mechanism} login as {account.name} from {session.host}"
+        )
+
+    async def sasl_authenticate(
+        self, session: ClientSession, mechanism: str, payload: bytes
+    ) -> Account | None:
+        if mechanism == "EXTERNAL":
+            if not session.certfp:
+                return None
+            account = await self.account_store.find_by_certfp(session.certfp)
+            authzid = payload.decode("utf-8")
+            if account and authzid and authzid.lower() != account.name.lower():
+                return None
+            return account
+
+        fields = payload.split(b"\0")
+        if len(fields) != 3:
+            return None
+
+        authzid, authcid, password = (field.decode("utf-8") for field in fields)
+        if authzid and authzid.lower() != authcid.lower():
+            return None
+
+        account = await self.account_store.get(authcid)
+        if account is None:
+            return None
+
+        if not await self.authenticator.verify(password, account.password_hash):
+            return None
+        return account
+
     async def handle_nick(self, session: ClientSession, msg: IRCMessage) -> None:
         if not msg.params:
             await session.send_error("431", ":No nickname given")
@@ -53,7 +356,7 @@ class CommandHandler:
 
         new_nick = msg.params[0]
 
-        if len(new_nick) > 9 or not new_nick.isalnum():
+        if len(new_nick) > limits().nicklen or not new_nick.isalnum():
             await session.send_error("432", new_nick, ":Erroneus nickname")
             return
 
@@ -63,13 +366,26 @@ class CommandHandler:
             )
             return
 
+        if session.is_registered:
+            # Peers must have seen the JOIN under the old nick before the NICK
+            for channel in list(session.channels):
+                await channel.reveal(session)
+
         old_nick = session.nickname
+        old_mask = session.hostmask
         session.nickname = new_nick
 
         if session.is_registered:
             if old_nick:
                 self.user_manager.change_nick(old_nick, new_nick)
-            await session.send_reply(f":{old_nick}", "NICK", new_nick)
+            for channel in session.channels:
+                channel.refresh_names(session)
+            render = tagged(f":{old_mask} NICK {new_nick}")
+            await session.send_reply(render(session.caps & TAG_CAPS))
+            await self.broadcast_to_peers(session, render)
+            if old_nick and casefold(old_nick) != casefold(new_nick):
+                await self.notify_watchers(old_nick, None)
+                await self.notify_watchers(new_nick, session)
         else:
             await self.check_registration(session)
 
@@ -82,8 +398,9 @@ class CommandHandler:
             await session.send_error("461", "USER", ":Not enough parameters")
             return
 
-        session.username = msg.params[0]
-        session.realname = msg.params[3]
+        # Usernames and realnames repeat across many clients; share one copy
+        session.username = intern_string(msg.params[0])
+        session.realname = intern_string(msg.params[3])
         await self.check_registration(session)
 
     async def handle_join(self, session: ClientSession, msg: IRCMessage) -> None:
@@ -95,91 +412,293 @@ class CommandHandler:
             await session.send_error("461", "JOIN", ":Not enough parameters")
             return
 
+        if msg.params[0] == "0":
+            for channel in list(session.channels):
+                await self.part_channel(session, channel, None)
+            return
+
+        keys = msg.params[1].split(",") if len(msg.params) > 1 else []
+        for i, channel_name in enumerate(msg.params[0].split(",")):
+            if channel_name:
+                key = keys[i] if i < len(keys) else None
+                await self.join_channel(session, channel_name, key)
+
+    async def join_channel(
+        self, session: ClientSession, channel_name: str, key: str | None
+    ) -> None:
         # This if is for type narrowing only (due to mypy errors)
         if session.nickname is None or session.username is None:
             return
 
-        channel_name = msg.params[0]
+        existing = self.channel_manager.get_channel(channel_name)
+        if existing is not None and session in existing.members:
+            return
+
+        # Checked before anything is allocated for the channel
+        maxchannels = limits().maxchannels
+        if maxchannels and len(session.channels) >= maxchannels:
+            await session.send_error(
+                "405", channel_name, ":You have joined too many channels"
+            )
+            return
 
         try:
-            channel = self.channel_manager.get_or_create_channel(channel_name)
+            channel = existing
+            if channel is None:
+                channel = self.channel_manager.create_channel(channel_name)
+                self.topics.restore(channel)
+
+            invited = channel.is_invited(session)
+            if channel.is_banned(session) and not invited:
+                await session.send_error(
+                    "474", channel.name, ":Cannot join channel (+b)"
+                )
+                return
+
+            if "i" in channel.modes and not invited:
+                await session.send_error(
+                    "473", channel.name, ":Cannot join channel (+i)"
+                )
+                return
+
+            if channel.key and key != channel.key:
+                await session.send_error(
+                    "475", channel.name, ":Cannot join channel (+k)"
+                )
+                return
+
+            if channel.limit is not None and len(channel.members) >= channel.limit:
+                await session.send_error(
+                    "471", channel.name, ":Cannot join channel (+l)"
+                )
+                return
+
+            if not channel.members:
+                channel.join_window = self.config.channels.join_batch_window
+            channel.invited.discard(session)
             channel.add_user(session)
+            self.events.emit("join", session, channel=channel.name)
 
             join_msg = (
                 f":{session.nickname}!{session.username}@{session.host} "
                 f"JOIN {channel.name}"
             )
-            await channel.broadcast(join_msg)
-
-            nicks = " ".join([m.nickname for m in channel.members if m.nickname])
+            await channel.announce_join(session, tagged(join_msg))
+            if session.away and channel.is_announced(session):
+                away_msg = f":{session.hostmask} AWAY :{session.away}"
+                for member in channel.members:
+                    if member is not session and member.caps & AWAY_NOTIFY:
+                        await member.send_reply(away_msg)
+            if channel.topic:
+                await self.send_topic(session, channel)
+            await self.send_names(session, channel)
 
-            await session.send_reply(
-                f":{session.server_name}",
-                "353",
-                session.nickname,
-                "=",
-                channel.name,
-                f":{nicks}",
+        except ChannelLimitError:
+            await session.send_error(
+                "405", channel_name, ":Too many channels on this server"
             )
+        except ValueError:
+            await session.send_error("403", channel_name, ":No such channel")
+
+    async def handle_names(self, session: ClientSession, msg: IRCMessage) -> None:
+        if not session.is_registered:
+            await session.send_error("451", ":You have not registered")
+            return
+
+        if not msg.params:
             await session.send_reply(
                 f":{session.server_name}",
                 "366",
-                session.nickname,
-                channel.name,
+                session.nickname or "*",
+                "*",
                 ":End of /NAMES list",
             )
+            return
 
-        except ValueError:
-            await session.send_error("403", channel_name, ":No such channel")
+        for channel_name in msg.params[0].split(","):
+            if not channel_name:
+                continue
+
+            channel = self.channel_manager.get_channel(channel_name)
+            if channel:
+                await self.send_names(session, channel)
+            else:
+                await session.send_reply(
+                    f":{session.server_name}",
+                    "366",
+                    session.nickname or "*",
+                    channel_name,
+                    ":End of /NAMES list",
+                )
+
+    async def send_names(self, session: ClientSession, channel: Channel) -> None:
+        server_prefix = f":{session.server_name}"
+        target = session.nickname or "*"
+
+        # Size chunks for the longest possible nick so that every client can
+        # share the same cached lines.
+        header = f"{server_prefix} 353 {'*' * limits().nicklen} = {channel.name} :"
+        budget = limits().linelen - 2 - len(header.encode("utf-8"))
+
+        multi_prefix = bool(session.caps & MULTI_PREFIX)
+        for line in channel.names_lines(budget, multi_prefix, viewer=session):
+            await session.send_reply(
+                server_prefix, "353", target, "=", channel.name, f":{line}"
+            )
+        await session.send_reply(
+            server_prefix, "366", target, channel.name, ":End of /NAMES list"
+        )
+
+    async def handle_topic(self, session: ClientSession, msg: IRCMessage) -> None:
+        if not session.is_registered:
+            await session.send_error("451", ":You have not registered")
+            return
 
-    async def handle_part(self, session: ClientSession, msg: IRCMessage) -> None:
         if not msg.params:
-            await session.send_error("461", "PART", ":Not enough parameters")
+            await session.send_error("461", "TOPIC", ":Not enough parameters")
             return
 
-        channel_name = msg.params[0]
-        channel = self.channel_manager.get_channel(channel_name)
+        channel = self.channel_manager.get_channel(msg.params[0])
+        if channel is None:
+            await session.send_error("403", msg.params[0], ":No such channel")
+            return
 
-        if not channel:
-            await session.send_error("403", channel_name, ":No such channel")
+        if len(msg.params) < 2:
+            if channel.topic:
+                await self.send_topic(session, channel)
+            else:
+                await session.send_error("331", channel.name, ":No topic is set")
             return
 
         if session not in channel.members:
-            await session.send_error("442", channel_name, ":You're not on that channel")
+            await session.send_error("442", channel.name, ":You're not on that channel")
+            return
+
+        if "t" in channel.modes and not channel.is_operator(session):
+            await session.send_error(
+                "482", channel.name, ":You're not channel operator"
+            )
             return
 
+        channel.set_topic(msg.params[1][: limits().topiclen], session.hostmask)
+        self.topics.update(channel)
+        await channel.reveal(session)
+        await channel.broadcast_variants(
+            tagged(f":{session.hostmask} TOPIC {channel.name} :{channel.topic}"),
+            TAG_CAPS,
+        )
+
+    async def send_topic(self, session: ClientSession, channel: Channel) -> None:
+        topic, who_time = channel.topic_replies()
+        server_prefix = f":{session.server_name}"
+        nick = session.nickname or "*"
+        await session.send_reply(server_prefix, "332", nick, topic)
+        await session.send_reply(server_prefix, "333", nick, who_time)
+
+    async def handle_part(self, session: ClientSession, msg: IRCMessage) -> None:
+        if not msg.params:
+            await session.send_error("461", "PART", ":Not enough parameters")
+            return
+
+        reason = msg.params[1] if len(msg.params) > 1 else None
+
+        for channel_name in msg.params[0].split(","):
+            if not channel_name:
+                continue
+
+            channel = self.channel_manager.get_channel(channel_name)
+
+            if not channel:
+                await session.send_error("403", channel_name, ":No such channel")
+                continue
+
+            if session not in channel.members:
+                await session.send_error(
+                    "442", channel_name, ":You're not on that channel"
+                )
+                continue
+
+            await self.part_channel(session, channel, reason)
+
+    async def part_channel(
+        self, session: ClientSession, channel: Channel, reason: str | None
+    ) -> None:
         part_msg = f":{session.nickname} PART {channel.name}"
-        await channel.broadcast(part_msg)
+        if reason:
+            part_msg += f" :{reason}"
+
+        render = tagged(part_msg)
+        if channel.is_announced(session):
+            await channel.broadcast_variants(render, TAG_CAPS)
+        else:
+            # Nobody else saw this member join, so nobody else sees them leave
+            await session.send_reply(render(session.caps & TAG_CAPS))
         channel.remove_user(session)
+        self.events.emit("part", session, channel=channel.name, reason=reason)
 
     async def handle_privmsg(self, session: ClientSession, msg: IRCMessage) -> None:
         if len(msg.params) < 2:
             await session.send_error("411", ":No recipient given (PRIVMSG)")
             return
 
-        target = msg.params[0]
         content = msg.params[1]
+        relayed = client_tags(msg.tags)
+
+        for target in dict.fromkeys(msg.params[0].split(",")):
+            if not target:
+                continue
+            render = tagged(f":{session.nickname} PRIVMSG {target} :{content}", relayed)
+            await self.relay(session, target, render)
+
+    async def handle_tagmsg(self, session: ClientSession, msg: IRCMessage) -> None:
+        if not msg.params:
+            await session.send_error("461", "TAGMSG", ":Not enough parameters")
+            return
 
+        target = msg.params[0]
+        relayed = client_tags(msg.tags)
+        if not relayed:
+            return
+
+        render = tagged(f":{session.nickname} TAGMSG {target}", relayed)
+        await self.relay(session, target, render, required_caps=MESSAGE_TAGS)
+
+    async def relay(
+        self,
+        session: ClientSession,
+        target: str,
+        render: MessageRenderer,
+        required_caps: int = 0,
+    ) -> None:
         if target.startswith("#"):
             channel = self.channel_manager.get_channel(target)
-            if channel:
-                if session not in channel.members:
-                    await session.send_error("404", target, ":Cannot send to channel")
-                    return
-                await channel.broadcast(
-                    f":{session.nickname} PRIVMSG {target} :{content}",
-                    skip_user=session,
-                )
-            else:
+            if not channel:
                 await session.send_error("401", target, ":No such nick/channel")
+                return
+            if not channel.can_send(session):
+                await session.send_error("404", target, ":Cannot send to channel")
+                return
+            await channel.reveal(session)
+            await channel.broadcast_variants(
+                render, TAG_CAPS, skip_user=session, required_caps=required_caps
+            )
         else:
             target_user = self.user_manager.get_session(target)
-            if target_user:
-                await target_user.send_reply(
-                    f":{session.nickname} PRIVMSG {target} :{content}"
-                )
-            else:
+            if not target_user:
                 await session.send_error("401", target, ":No such nick/channel")
+                return
+            if target_user.caps & required_caps == required_caps:
+                await target_user.send_reply(render(target_user.caps & TAG_CAPS))
+            if target_user.away and not required_caps:
+                await session.send_error(
+                    "301", target_user.nickname or target, f":{target_user.away}"
+                )
+
+        if (
+            session.caps & ECHO_MESSAGE
+            and session.caps & required_caps == required_caps
+        ):
+            await session.send_reply(render(session.caps & TAG_CAPS))
 
     async def handle_kick(self, session: ClientSession, msg: IRCMessage) -> None:
         if len(msg.params) < 2:
@@ -215,24 +734,941 @@ class CommandHandler:
             return
 
         kick_msg = f":{session.nickname} KICK {channel.name} {target_nick} :{reason}"
-        await channel.broadcast(kick_msg)
+        # Nobody may learn of a held-back JOIN from a KICK first
+        await channel.reveal(session)
+        await channel.reveal(target_session)
+        await channel.broadcast_variants(tagged(kick_msg), TAG_CAPS)
         channel.remove_user(target_session)
+        self.events.emit(
+            "kick", session, channel=channel.name, target=target_nick, reason=reason
+        )
+
+    async def handle_mode(self, session: ClientSession, msg: IRCMessage) -> None:
+        if not session.is_registered:
+            await session.send_error("451", ":You have not registered")
+            return
+
+        if not msg.params:
+            await session.send_error("461", "MODE", ":Not enough parameters")
+            return
+
+        target = msg.params[0]
+        if not target.startswith("#"):
+            await self.user_mode(session, target)
+            return
+
+        channel = self.channel_manager.get_channel(target)
+        if not channel:
+            await session.send_error("403", target, ":No such channel")
+            return
+
+        if len(msg.params) == 1:
+            server_prefix = f":{session.server_name}"
+            nick = session.nickname or "*"
+            modes = channel.mode_string(show_key=session in channel.members)
+            await session.send_reply(server_prefix, "324", nick, channel.name, *modes)
+            await session.send_reply(
+                server_prefix, "329", nick, channel.name, str(int(channel.created_at))
+            )
+            return
+
+        await self.channel_mode(session, channel, msg.params[1], msg.params[2:])
+
+    async def user_mode(self, session: ClientSession, target: str) -> None:
+        if not self.user_manager.get_session(target):
+            await session.send_error("401", target, ":No such nick/channel")
+        elif casefold(target) != session.nick_key:
+            await session.send_error("502", ":Can't change mode for other users")
+        else:
+            await session.send_error("221", "+")
+
+    async def channel_mode(
+        self,
+        session: ClientSession,
+        channel: Channel,
+        modestring: str,
+        params: list[str],
+    ) -> None:
+        args = iter(params)
+        requested: list[tuple[str, str, str | None]] = []
+        sign = "+"
+
+        for char in modestring:
+            if char in "+-":
+                sign = char
+            elif char in CHANNEL_FLAGS:
+                requested.append((sign, char, None))
+            elif char in LIST_MODES:
+                arg = next(args, None)
+                if arg is None:
+                    await self.send_mask_list(session, channel, char)
+                else:
+                    requested.append((sign, char, arg))
+            elif char in "ov" or (char in "kl" and sign == "+"):
+                arg = next(args, None)
+                if arg is not None:
+                    requested.append((sign, char, arg))
+            elif char in "kl":
+                # Clients send the old key along with -k
+                if char == "k":
+                    next(args, None)
+                requested.append((sign, char, None))
+            else:
+                await session.send_error(
+                    "472", char, f":is unknown mode char to me for {channel.name}"
+                )
+
+        if not requested:
+            return
+
+        if not channel.is_operator(session):
+            await session.send_error(
+                "482", channel.name, ":You're not channel operator"
+            )
+            return
+
+        applied: list[tuple[str, str, str | None]] = []
+        for sign, char, arg in requested:
+            change = await self.apply_mode(session, channel, sign == "+", char, arg)
+            if change is not None:
+                applied.append((sign, char, change or None))
+
+        if not applied:
+            return
+
+        modes = ""
+        mode_args: list[str] = []
+        last_sign = ""
+        for sign, char, arg in applied:
+            if sign != last_sign:
+                modes += sign
+                last_sign = sign
+            modes += char
+            if arg is not None:
+                mode_args.append(arg)
+
+        mode_msg = " ".join([f":{session.hostmask}", "MODE", channel.name, modes])
+        if mode_args:
+            mode_msg += " " + " ".join(mode_args)
+        await channel.reveal(session)
+        await channel.broadcast_variants(tagged(mode_msg), TAG_CAPS)
+
+    async def apply_mode(
+        self,
+        session: ClientSession,
+        channel: Channel,
+        adding: bool,
+        char: str,
+        arg: str | None,
+    ) -> str | None:
+        # Returns the argument to announce ("" for none), or None if the
+        # mode change had no effect.
+        if char == "D":
+            if channel.quiet_joins == adding:
+                return None
+            channel.quiet_joins = adding
+            if not adding:
+                for member in list(channel.unannounced):
+                    await channel.reveal(member)
+            return ""
+
+        if char in CHANNEL_FLAGS:
+            if (char in channel.modes) == adding:
+                return None
+            if adding:
+                channel.modes.add(char)
+            else:
+                channel.modes.discard(char)
+            return ""
+
+        if char == "k":
+            if adding:
+                if not arg or " " in arg or "," in arg:
+                    return None
+                channel.key = arg
+                return arg
+            if channel.key is None:
+                return None
+            channel.key = None
+            return "*"
+
+        if char == "l":
+            if adding:
+                if arg is None or not arg.isdigit() or int(arg) <= 0:
+                    return None
+                channel.limit = int(arg)
+                return str(channel.limit)
+            if channel.limit is None:
+                return None
+            channel.limit = None
+            return ""
+
+        if char in LIST_MODES:
+            assert arg is not None
+            masks = self.mask_list(channel, char)
+            if not adding:
+                return masks.remove(arg)
+            if len(masks) >= self.config.channels.max_list_entries:
+                await session.send_error(
+                    "478", channel.name, char, ":Channel list is full"
+                )
+                return None
+            setter = session.hostmask
+            return masks.add(arg, setter)
+
+        # Member prefixes: +o and +v
+        assert arg is not None
+        target = self.user_manager.get_session(arg)
+        if not target:
+            await session.send_error("401", arg, ":No such nick/channel")
+            return None
+        if target not in channel.members:
+            await session.send_error(
+                "441", arg, channel.name, ":They aren't on that channel"
+            )
+            return None
+
+        if char == "o":
+            changed = channel.set_operator(target, adding)
+        else:
+            changed = channel.set_voice(target, adding)
+        if changed:
+            # The MODE names the target, so their JOIN goes out first
+            await channel.reveal(target)
+        return target.nickname if changed and target.nickname else None
+
+    @staticmethod
+    def mask_list(channel: Channel, char: str) -> MaskList:
+        if char == "b":
+            return channel.bans
+        if char == "e":
+            return channel.exceptions
+        return channel.invite_exceptions
+
+    async def send_mask_list(
+        self, session: ClientSession, channel: Channel, char: str
+    ) -> None:
+        server_prefix = f":{session.server_name}"
+        nick = session.nickname or "*"
+        item_code, end_code, description = LIST_MODES[char]
+
+        for entry in self.mask_list(channel, char).entries.values():
+            await session.send_reply(
+                server_prefix,
+                item_code,
+                nick,
+                channel.name,
+                entry.mask,
+                entry.setter or session.server_name,
+                str(int(entry.set_at)),
+            )
+        await session.send_reply(
+            server_prefix,
+            end_code,
+            nick,
+            channel.name,
+            f":End of channel {description} list",
+        )
+
+    async def handle_invite(self, session: ClientSession, msg: IRCMessage) -> None:
+        if not session.is_registered:
+            await session.send_error("451", ":You have not registered")
+            return
+
+        if len(msg.params) < 2:
+            await session.send_error("461", "INVITE", ":Not enough parameters")
+            return
+
+        target_nick, channel_name = msg.params[0], msg.params[1]
+
+        target = self.user_manager.get_session(target_nick)
+        if not target:
+            await session.send_error("401", target_nick, ":No such nick/channel")
+            return
+
+        channel = self.channel_manager.get_channel(channel_name)
+        if not channel:
+            await session.send_error("403", channel_name, ":No such channel")
+            return
+
+        if session not in channel.members:
+            await session.send_error("442", channel_name, ":You're not on that channel")
+            return
+
+        if "i" in channel.modes and not channel.is_operator(session):
+            await session.send_error(
+                "482", channel_name, ":You're not channel operator"
+            )
+            return
+
+        if target in channel.members:
+            await session.send_error(
+                "443", target_nick, channel_name, ":is already on channel"
+            )
+            return
+
+        channel.invited.add(target)
+        await session.send_reply(
+            f":{session.server_name}",
+            "341",
+            session.nickname or "*",
+            target_nick,
+            channel.name,
+        )
+        source = session.hostmask
+        await target.send_reply(f":{source}", "INVITE", target_nick, channel.name)
+
+    async def pace(self, session: ClientSession, sent: int) -> bool:
+        # Long listings go out in chunks so that other clients get to run in
+        # between. Flushing waits for the client's send buffer to drain, and
+        # False is returned once the client has gone away.
+        if sent % REPLY_CHUNK == 0:
+            await session.flush()
+            await asyncio.sleep(0)
+        return session.is_alive()
+
+    async def handle_who(self, session: ClientSession, msg: IRCMessage) -> None:
+        if not session.is_registered:
+            await session.send_error("451", ":You have not registered")
+            return
+
+        mask = msg.params[0] if msg.params else "*"
+        opers_only = len(msg.params) > 1 and "o" in msg.params[1]
+
+        channel: Channel | None = None
+        pattern: re.Pattern[str] | None = None
+        if mask.startswith("#"):
+            channel = self.channel_manager.get_channel(mask)
+            candidates = []
+            if channel:
+                # Members whose quiet JOIN is still held back are not listed
+                candidates = [
+                    member
+                    for member in channel.members
+                    if member is session or member not in channel.unannounced
+                ]
+        else:
+            candidates, pattern = self.who_candidates(mask)
+
+        # Yield by users examined, not users sent, so that a mask matching
+        # nobody still lets the event loop run.
+        examined = 0
+        for user in candidates:
+            examined += 1
+            if (not opers_only or user.is_oper) and (
+                pattern is None or self.who_matches(pattern, user)
+            ):
+                await self.send_who_reply(session, channel, user)
+            if not await self.pace(session, examined):
+                return
+
+        await session.send_reply(
+            f":{session.server_name}",
+            "315",
+            session.nickname or "*",
+            mask,
+            ":End of WHO list",
+        )
+
+    def who_candidates(
+        self, mask: str
+    ) -> tuple[list[ClientSession], re.Pattern[str] | None]:
+        users = self.user_manager
+        if mask in ("*", "0"):
+            return list(users.users.values()), None
+
+        if not WILDCARDS.intersection(mask):
+            # Exact nick, host or username: answered from the indexes
+            exact = users.get_session(mask)
+            found = [exact] if exact else []
+            found.extend(users.find_by_host(mask))
+            found.extend(users.find_by_username(mask))
+            return list(dict.fromkeys(found)), None
+
+        return list(users.users.values()), compile_mask(casefold(mask))
+
+    @staticmethod
+    def who_matches(pattern: re.Pattern[str], user: ClientSession) -> bool:
+        if user.nick_key and pattern.fullmatch(user.nick_key):
+            return True
+        fields = (user.username, user.host, user.realname)
+        return any(field and pattern.fullmatch(casefold(field)) for field in fields)
+
+    async def send_who_reply(
+        self, session: ClientSession, channel: Channel | None, user: ClientSession
+    ) -> None:
+        flags = "H"
+        if user.is_oper:
+            flags += "*"
+        if channel is not None:
+            prefixes = channel.prefixes(user)
+            flags += prefixes if session.caps & MULTI_PREFIX else prefixes[:1]
+
+        await session.send_reply(
+            f":{session.server_name}",
+            "352",
+            session.nickname or "*",
+            channel.name if channel else "*",
+            user.username or "*",
+            user.host,
+            session.server_name,
+            user.nickname or "*",
+            flags,
+            f":0 {user.realname or ''}",
+        )
+
+    async def handle_whois(self, session: ClientSession, msg: IRCMessage) -> None:
+        if not session.is_registered:
+            await session.send_error("451", ":You have not registered")
+            return
+
+        if not msg.params:
+            await session.send_error("431", ":No nickname given")
+            return
+
+        server_prefix = f":{session.server_name}"
+        nick = session.nickname or "*"
+        multi_prefix = bool(session.caps & MULTI_PREFIX)
+
+        # WHOIS [server] nick[,nick]
+        for target in msg.params[-1].split(","):
+            if not target:
+                continue
+
+            user = self.user_manager.get_session(target)
+            if user is None or not user.nickname:
+                await session.send_error("401", target, ":No such nick/channel")
+                await session.send_reply(
+                    server_prefix, "318", nick, target, ":End of /WHOIS list"
+                )
+                continue
+
+            await session.send_reply(
+                server_prefix,
+                "311",
+                nick,
+                user.nickname,
+                user.username or "*",
+                user.host,
+                "*",
+                f":{user.realname or ''}",
+            )
+
+            channels = []
+            for channel in user.channels:
+                if user is not session and user in channel.unannounced:
+                    continue
+                prefixes = channel.prefixes(user)
+                channels.append(
+                    (prefixes if multi_prefix else prefixes[:1]) + channel.name
+                )
+            if channels:
+                header = f"{server_prefix} 319 {nick} {user.nickname} :"
+                limit = limits().linelen - 2 - len(header.encode("utf-8"))
+                for chunk in chunk_tokens(channels, limit):
+                    await session.send_reply(
+                        server_prefix, "319", nick, user.nickname, f":{chunk}"
+                    )
+
+            await session.send_reply(
+                server_prefix,
+                "312",
+                nick,
+                user.nickname,
+                session.server_name,
+                f":{SERVER_INFO}",
+            )
+            if user.away:
+                await session.send_reply(
+                    server_prefix, "301", nick, user.nickname, f":{user.away}"
+                )
+            if user.is_oper:
+                await session.send_reply(
+                    server_prefix, "313", nick, user.nickname, ":is an IRC operator"
+                )
+            if user.account:
+                await session.send_reply(
+                    server_prefix,
+                    "330",
+                    nick,
+                    user.nickname,
+                    user.account,
+                    ":is logged in as",
+                )
+            await session.send_reply(
+                server_prefix, "318", nick, user.nickname, ":End of /WHOIS list"
+            )
+
+    async def handle_list(self, session: ClientSession, msg: IRCMessage) -> None:
+        if not session.is_registered:
+            await session.send_error("451", ":You have not registered")
+            return
+
+        server_prefix = f":{session.server_name}"
+        nick = session.nickname or "*"
+
+        query = ListFilter.parse(msg.params[0].split(",") if msg.params else [])
+
+        await session.send_reply(server_prefix, "321", nick, "Channel", ":Users  Name")
+
+        examined = 0
+        for channel in self.channel_manager.list_candidates(query):
+            examined += 1
+            if query.matches(channel):
+                await session.send_reply(
+                    server_prefix,
+                    "322",
+                    nick,
+                    channel.name,
+                    str(len(channel.members)),
+                    f":{channel.topic}",
+                )
+            if not await self.pace(session, examined):
+                return
+
+        await session.send_reply(server_prefix, "323", nick, ":End of /LIST")
+
+    async def handle_ison(self, session: ClientSession, msg: IRCMessage) -> None:
+        if not msg.params:
+            await session.send_error("461", "ISON", ":Not enough parameters")
+            return
+
+        online: list[str] = []
+        for name in " ".join(msg.params).split():
+            user = self.user_manager.get_session(name)
+            if user and user.nickname:
+                online.append(user.nickname)
+
+        await session.send_reply(
+            f":{session.server_name}",
+            "303",
+            session.nickname or "*",
+            f":{' '.join(online)}",
+        )
+
+    async def handle_userhost(self, session: ClientSession, msg: IRCMessage) -> None:
+        if not msg.params:
+            await session.send_error("461", "USERHOST", ":Not enough parameters")
+            return
+
+        replies: list[str] = []
+        for name in " ".join(msg.params).split()[:5]:
+            user = self.user_manager.get_session(name)
+            if user and user.nickname:
+                oper = "*" if user.is_oper else ""
+                away = "-" if user.away else "+"
+                replies.append(
+                    f"{user.nickname}{oper}={away}{user.username}@{user.host}"
+                )
+
+        await session.send_reply(
+            f":{session.server_name}",
+            "302",
+            session.nickname or "*",
+            f":{' '.join(replies)}",
+        )
+
+    async def handle_away(self, session: ClientSession, msg: IRCMessage) -> None:
+        if not session.is_registered:
+            await session.send_error("451", ":You have not registered")
+            return
+
+        message = msg.params[0][: limits().awaylen] if msg.params else ""
+        changed = message != (session.away or "")
+        session.away = message or None
+        if message:
+            await session.send_error("306", ":You have been marked as being away")
+        else:
+            await session.send_error("305", ":You are no longer marked as being away")
+        if not changed:
+            return
+
+        # away-notify: each capable peer hears it once, whatever the channels
+        line = f":{session.hostmask} AWAY"
+        if message:
+            line += f" :{message}"
+        for peer in self.channel_manager.common_peers(session, AWAY_NOTIFY):
+            await peer.send_reply(line)
+
+    async def broadcast_to_peers(
+        self, session: ClientSession, render: MessageRenderer
+    ) -> None:
+        # NICK and QUIT reach everyone sharing a channel exactly once
+        variants: dict[int, str] = {}
+        peers = self.channel_manager.common_peers(session)
+        async for part in fanout().slices(peers):
+            for peer in part:
+                key = peer.caps & TAG_CAPS
+                line = variants.get(key)
+                if line is None:
+                    line = variants[key] = render(key)
+                await peer.send_reply(line)
+
+    async def handle_monitor(self, session: ClientSession, msg: IRCMessage) -> None:
+        if not session.is_registered:
+            await session.send_error("451", ":You have not registered")
+            return
+
+        if not msg.params:
+            await session.send_error("461", "MONITOR", ":Not enough parameters")
+            return
+
+        action = msg.params[0].upper()
+        if action in ("+", "-") and len(msg.params) < 2:
+            await session.send_error("461", "MONITOR", ":Not enough parameters")
+            return
+
+        if action == "+":
+            await self.monitor_add(session, msg.params[1].split(","))
+        elif action == "-":
+            for target in msg.params[1].split(","):
+                key = casefold(target)
+                if session.monitored.pop(key, None) is not None:
+                    self.user_manager.unwatch(session, key)
+        elif action == "C":
+            self.monitor_clear(session)
+        elif action == "L":
+            await self.send_monitor_list(session)
+        elif action == "S":
+            online, offline = self.monitor_status(session, session.monitored.values())
+            await self.send_monitor_status(session, online, offline)
+
+    async def monitor_add(self, session: ClientSession, targets: list[str]) -> None:
+        limit = limits().monitor
+        added: list[str] = []
+        for i, target in enumerate(targets):
+            if not target:
+                continue
+
+            key = casefold(target)
+            if key not in session.monitored:
+                if limit and len(session.monitored) >= limit:
+                    await session.send_error(
+                        "734",
+                        str(limit),
+                        ",".join(filter(None, targets[i:])),
+                        ":Monitor list is full.",
+                    )
+                    break
+                session.monitored[key] = target
+                self.user_manager.watch(session, key)
+            added.append(target)
+
+        online, offline = self.monitor_status(session, added)
+        await self.send_monitor_status(session, online, offline)
+
+    def monitor_status(
+        self, session: ClientSession, targets: Iterable[str]
+    ) -> tuple[list[str], list[str]]:
+        online: list[str] = []
+        offline: list[str] = []
+        for target in targets:
+            user = self.user_manager.get_session(target)
+            if user is not None and user.is_registered:
+                online.append(user.hostmask)
+            else:
+                offline.append(target)
+        return online, offline
+
+    def monitor_clear(self, session: ClientSession) -> None:
+        for key in session.monitored:
+            self.user_manager.unwatch(session, key)
+        session.monitored.clear()
+
+    async def send_monitor_status(
+        self, session: ClientSession, online: list[str], offline: list[str]
+    ) -> None:
+        for numeric, targets in (("730", online), ("731", offline)):
+            if targets:
+                await self.send_target_list(session, numeric, targets)
+
+    async def send_monitor_list(self, session: ClientSession) -> None:
+        if session.monitored:
+            await self.send_target_list(session, "732", session.monitored.values())
+        await session.send_error("733", ":End of MONITOR list")
+
+    async def send_target_list(
+        self, session: ClientSession, numeric: str, targets: Iterable[str]
+    ) -> None:
+        server_prefix = f":{session.server_name}"
+        nick = session.nickname or "*"
+        header = f"{server_prefix} {numeric} {nick} :"
+        budget = limits().linelen - 2 - len(header.encode("utf-8"))
+        for chunk in chunk_tokens(targets, budget, ","):
+            await session.send_reply(server_prefix, numeric, nick, f":{chunk}")
+
+    async def notify_watchers(self, nickname: str, user: ClientSession | None) -> None:
+        # Only the sessions monitoring this nick are told, not every client
+        watchers = self.user_manager.watchers_of(nickname)
+        if not watchers:
+            return
+
+        numeric = "730" if user is not None else "731"
+        target = user.hostmask if user is not None else nickname
+        for watcher in watchers:
+            await watcher.send_reply(
+                f":{watcher.server_name}",
+                numeric,
+                watcher.nickname or "*",
+                f":{target}",
+            )
+
+    async def unregister(self, session: ClientSession) -> None:
+        # Called once a connection is gone, whatever ended it
+        self.monitor_clear(session)
+        if session.is_registered and session.channels:
+            reason = session.quit_reason or "Connection closed"
+            await self.broadcast_to_peers(
+                session, tagged(f":{session.hostmask} QUIT :{reason}")
+            )
+
+        nickname = session.nickname
+        if nickname and self.user_manager.get_session(nickname) is session:
+            self.user_manager.remove_user(nickname)
+            await self.notify_watchers(nickname, None)
+        self.channel_manager.remove_user_from_all_channels(session)
+
+    def isupport_tokens(self) -> list[str]:
+        maxchannels = limits().maxchannels
+        tokens = [
+            f"CASEMAPPING={casemapping()}",
+            f"NICKLEN={limits().nicklen}",
+            f"CHANNELLEN={limits().channellen}",
+            f"LINELEN={limits().linelen}",
+            targmax_token(),
+            f"CHANLIMIT=#:{maxchannels or ''}",
+            "CHANTYPES=#",
+            "PREFIX=(ov)@+",
+            f"CHANMODES={''.join(LIST_MODES)},k,l,{CHANNEL_FLAGS}",
+            "ELIST=CMNTU",
+            "EXCEPTS",
+            "INVEX",
+            f"AWAYLEN={limits().awaylen}",
+            f"TOPICLEN={limits().topiclen}",
+            f"MONITOR={limits().monitor or ''}",
+        ]
+        if maxchannels:
+            tokens.append(f"MAXCHANNELS={maxchannels}")
+        return tokens
+
+    async def send_isupport(self, session: ClientSession) -> None:
+        tokens = self.isupport_tokens()
+        for i in range(0, len(tokens), ISUPPORT_PER_LINE):
+            await session.send_reply(
+                f":{session.server_name}",
+                "005",
+                session.nickname or "*",
+                *tokens[i : i + ISUPPORT_PER_LINE],
+                ":are supported by this server",
+            )
+
+    async def handle_oper(self, session: ClientSession, msg: IRCMessage) -> None:
+        if not session.is_registered:
+            await session.send_error("451", ":You have not registered")
+            return
+
+        if len(msg.params) < 2:
+            await session.send_error("461", "OPER", ":Not enough parameters")
+            return
+
+        name, password = msg.params[0], msg.params[1]
+        stored = self.opers.get(name.lower())
+        if stored is None:
+            await session.send_error("491", ":No O-lines for your host")
+            return
+
+        try:
+            valid = await self.authenticator.verify(password, stored)
+        except AuthBusyError:
+            await session.send_error("263", "OPER", ":Server busy, try again later")
+            return
+
+        if not valid:
+            self.logger.warning(f"Failed OPER attempt as {name} from {session.host}")
+            await session.send_error("464", ":Password incorrect")
+            return
+
+        session.is_oper = True
+        self.logger.info(f"{session.nickname} is now an operator ({name})")
+        await session.send_error("381", ":You are now an IRC operator")
+
+    async def require_oper(self, session: ClientSession) -> bool:
+        if session.is_registered and session.is_oper:
+            return True
+        await session.send_error(
+            "481", ":Permission Denied- You're not an IRC operator"
+        )
+        return False
+
+    async def handle_kline(self, session: ClientSession, msg: IRCMessage) -> None:
+        # KLINE [minutes] <user@host> [:reason]
+        if not await self.require_oper(session):
+            return
+
+        params = list(msg.params)
+        duration: float | None = None
+        if params and params[0].isdigit():
+            duration = int(params.pop(0)) * 60.0
+
+        if not params:
+            await session.send_error("461", msg.command, ":Not enough parameters")
+            return
+
+        kind = msg.command[0]
+        reason = params[1] if len(params) > 1 else "No reason"
+        ban = self.bans.add(kind, params[0], reason, session.hostmask, duration)
+
+        await session.send_reply(
+            f":{session.server_name}",
+            "NOTICE",
+            session.nickname or "*",
+            f":Added {kind}-line for [{ban.mask}]",
+        )
+
+        for user in list(self.user_manager.users.values()):
+            if self.bans.check(user.username, user.host) is ban:
+                await self.disconnect_banned(user, ban)
+
+    async def handle_unkline(self, session: ClientSession, msg: IRCMessage) -> None:
+        if not await self.require_oper(session):
+            return
+
+        if not msg.params:
+            await session.send_error("461", msg.command, ":Not enough parameters")
+            return
+
+        kind = msg.command[2]
+        ban = self.bans.remove(msg.params[0])
+        if ban is None:
+            notice = f":No {kind}-line for [{msg.params[0]}]"
+        else:
+            notice = f":{ban.kind}-line for [{ban.mask}] is removed"
+        await session.send_reply(
+            f":{session.server_name}", "NOTICE", session.nickname or "*", notice
+        )
+
+    async def handle_profile(self, session: ClientSession, msg: IRCMessage) -> None:
+        # PROFILE <seconds> [cpu|sample] | PROFILE STOP | PROFILE SPANS [ON|OFF|RESET]
+        if not await self.require_oper(session):
+            return
+
+        if not msg.params:
+            await session.send_error("461", "PROFILE", ":Not enough parameters")
+            return
+
+        action = msg.params[0].upper()
+        notices: list[str] = []
+        if action == "STOP":
+            path = self.profiler.stop()
+            notices.append(
+                f"Wrote profile to {path}" if path else "No profile is running"
+            )
+        elif action == "SPANS":
+            notices.extend(self.update_spans(msg.params[1:]))
+        elif action.isdigit():
+            mode = msg.params[1].lower() if len(msg.params) > 1 else PROFILE_SAMPLE
+            if mode not in (PROFILE_CPU, PROFILE_SAMPLE):
+                notices.append(f"Unknown profile mode {mode}, use cpu or sample")
+            else:
+                try:
+                    path = self.profiler.start(float(action), mode)
+                    notices.append(f"Profiling ({mode}) into {path}")
+                except ProfilerBusyError:
+                    notices.append("A profile is already running")
+                except (ValueError, RuntimeError, OSError) as e:
+                    # e.g. another profiler already hooked into the interpreter
+                    notices.append(f"Could not start a profile: {e}")
+        else:
+            notices.append(
+                "Usage: PROFILE <seconds> [cpu|sample], PROFILE STOP,"
+                " PROFILE SPANS [ON|OFF|RESET]"
+            )
+
+        for notice in notices:
+            await session.send_reply(
+                f":{session.server_name}",
+                "NOTICE",
+                session.nickname or "*",
+                f":{notice}",
+            )
+
+    def update_spans(self, params: list[str]) -> list[str]:
+        timing = spans()
+        option = params[0].upper() if params else ""
+        if option == "ON":
+            timing.enabled = True
+            return ["Stage timing is on"]
+        if option == "OFF":
+            timing.enabled = False
+            return ["Stage timing is off"]
+        if option == "RESET":
+            timing.reset()
+            return ["Stage timings are cleared"]
+
+        state = "on" if timing.enabled else "off"
+        return [f"Stage timing is {state}", *timing.summary()]
+
+    async def disconnect_banned(self, session: ClientSession, ban: ServerBan) -> None:
+        self.logger.info(f"Disconnecting {session.hostmask}: {ban.kind}-lined")
+        session.quit_reason = f"{ban.kind}-lined"
+        await session.send_error(
+            "465", f":You are banned from this server ({ban.reason})"
+        )
+        await session.send_reply(
+            f"ERROR :Closing Link: {session.host} ({ban.kind}-lined)"
+        )
+        await session.quit()
+
+    async def handle_ping(self, session: ClientSession, msg: IRCMessage) -> None:
+        if not msg.params or not msg.params[0]:
+            await session.send_error("409", ":No origin specified")
+            return
+
+        name = self.config.name
+        await session.send_now(f":{name}", "PONG", name, f":{msg.params[0]}")
+
+    async def handle_pong(self, session: ClientSession, msg: IRCMessage) -> None:
+        # The server does not ping idle clients, so a PONG is only accepted
+        pass
 
     async def handle_quit(self, session: ClientSession, msg: IRCMessage) -> None:
         reason = msg.params[0] if msg.params else "Client Quit"
         self.logger.info(f"User {session.nickname} quitting: {reason}")
+        session.quit_reason = f"Quit: {reason}"
         await session.quit()
 
     async def check_registration(self, session: ClientSession) -> None:
         if not (session.nickname and session.username and not session.is_registered):
             return
 
-        if self.config.password:
-            if session.password_attempt != self.config.password:
-                self.logger.warning(f"Bad password from {session.host}")
-                await session.send_error("464", ":Password incorrect")
-                await session.quit()
-                return
+        if session.cap_negotiating:
+            return
+
+        try:
+            # Logging in through SASL stands in for the shared server password
+            valid = session.account is not None or (
+                await self.authenticator.verify_server_password(
+                    session.password_attempt
+                )
+            )
+        except AuthBusyError:
+            self.logger.warning(
+                f"Too many pending registrations, dropping {session.host}"
+            )
+            await session.send_error("263", "PASS", ":Server busy, try again later")
+            await session.quit()
+            return
+
+        if not valid:
+            self.logger.warning(f"Bad password from {session.host}")
+            await session.send_error("464", ":Password incorrect")
+            await session.quit()
+            return
+
+        ban = self.bans.check(session.username, session.host)
+        if ban is not None:
+            await self.disconnect_banned(session, ban)
+            return
 
         try:
             self.user_manager.add_user(session.nickname, session)
@@ -246,7 +1682,15 @@ class CommandHandler:
                 f":Welcome to the IRC Server {session.nickname}!"
                 f" {session.username}@{session.host}",
             )
+            await self.send_isupport(session)
             self.logger.info(f"Registered: {session.nickname}")
+            self.events.emit(
+                "register",
+                session,
+                user=session.username,
+                account=session.account,
+            )
+            await self.notify_watchers(session.nickname, session)
 
         except ValueError:
             self.logger.warning(f"Registration failed: Nick {session.nickname} taken")
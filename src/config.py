@@ -1,16 +1,178 @@
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from pathlib import Path
 from typing import Any
 
 import yaml
 
 
+@dataclass
+class TLSListenerConfig:
+    host: str
+    port: int
+    certfile: str
+    keyfile: str
+    handshake_timeout: float = 10.0
+    max_pending_handshakes: int = 64
+    session_tickets: int = 2
+    client_ca: str | None = None
+
+
+@dataclass
+class WebSocketListenerConfig:
+    host: str
+    port: int
+    handshake_timeout: float = 10.0
+    # Largest client message accepted, after decompression
+    max_message_size: int = 16384
+    # IRC lines a single client message may carry
+    max_lines_per_message: int = 8
+    permessage_deflate: bool = False
+    # Origin header values allowed to connect; empty allows any origin
+    allowed_origins: list[str] = field(default_factory=list)
+
+
+@dataclass
+class AuthConfig:
+    workers: int = 2
+    max_pending: int = 256
+    cache_size: int = 4096
+    cache_ttl: float = 300.0
+
+
+@dataclass
+class AccountsConfig:
+    backend: str = "memory"
+    path: str = "accounts.db"
+    cache_size: int = 4096
+    cache_ttl: float = 60.0
+    accounts: dict[str, dict[str, Any]] = field(default_factory=dict)
+
+
+@dataclass
+class ChannelsConfig:
+    join_batch_window: float = 0.0
+    max_list_entries: int = 100
+    # Channels on the whole server; 0 means no limit
+    max_channels: int = 0
+    # Topics are kept in this JSON file across restarts when set
+    topics_path: str | None = None
+    # Saved topics kept at most, and seconds an unused one is kept
+    topics_max: int = 10000
+    topics_max_age: float = 30 * 86400.0
+
+
+@dataclass
+class BansConfig:
+    path: str | None = None
+
+
+def _default_targmax() -> dict[str, int]:
+    return {
+        "JOIN": 0,
+        "NAMES": 0,
+        "PART": 0,
+        "PRIVMSG": 4,
+        "TAGMSG": 1,
+        "WHOIS": 4,
+    }
+
+
+@dataclass
+class LimitsConfig:
+    nicklen: int = 9
+    channellen: int = 200
+    linelen: int = 512
+    # Channels one user may be in; 0 means no limit
+    maxchannels: int = 50
+    # Comma-separated targets accepted per command; 0 means no limit
+    targmax: dict[str, int] = field(default_factory=_default_targmax)
+    awaylen: int = 200
+    topiclen: int = 390
+    # Nicks one client may MONITOR; 0 means no limit
+    monitor: int = 100
+
+
+@dataclass
+class OutputConfig:
+    # "immediate" writes every reply on its own; "tick" gathers the replies
+    # queued during one event loop iteration into a single writelines()
+    flush_policy: str = "tick"
+    # Queued bytes that trigger a flush before the end of the iteration
+    max_buffered: int = 65536
+
+
+@dataclass
+class PipelineConfig:
+    # Commands one client may have waiting; reading stops while it is full
+    queue_size: int = 64
+    # Commands a client runs before letting other clients take a turn
+    burst: int = 8
+    # Seconds a disconnected client's remaining commands get to finish
+    close_timeout: float = 5.0
+
+
+@dataclass
+class SchedulingConfig:
+    # Fan-outs to more members than this are sliced; smaller ones go in one go
+    large_fanout: int = 1000
+    # Members served before a large fan-out checks the tick budget
+    broadcast_slice: int = 64
+    # Seconds large fan-outs may run per event loop iteration, all together
+    tick_budget: float = 0.001
+    # How often the event loop lag is sampled, and when a sample is logged
+    lag_interval: float = 0.25
+    lag_warning: float = 0.1
+    # Seconds between lag summaries in the log; 0 turns them off
+    lag_report: float = 60.0
+
+
+@dataclass
+class ProfilingConfig:
+    # Where PROFILE and SIGUSR1 write their profiles
+    directory: str = "profiles"
+    # Longest profile an operator may ask for, and the length of SIGUSR1's
+    max_seconds: float = 300.0
+    signal_seconds: float = 30.0
+    # Seconds between stack samples of the sampling profiler
+    sample_interval: float = 0.005
+    # Time the decode, parse, dispatch and send stages from startup
+    spans: bool = False
+
+
+@dataclass
+class AccessLogConfig:
+    # JSON lines file for client activity; nothing is logged without one
+    path: str | None = None
+    # The file is rotated past max_bytes, keeping this many old files
+    max_bytes: int = 10_000_000
+    backups: int = 5
+    # Events written per batch, and how long the writer waits for one
+    batch_size: int = 512
+    flush_interval: float = 1.0
+    # Events waiting for the writer; further events are dropped and counted
+    queue_size: int = 10000
+
+
 @dataclass
 class ServerConfig:
     name: str
     host: str
     port: int
     password: str
+    casemapping: str = "rfc1459"
+    tls: list[TLSListenerConfig] = field(default_factory=list)
+    websocket: list[WebSocketListenerConfig] = field(default_factory=list)
+    auth: AuthConfig = field(default_factory=AuthConfig)
+    accounts: AccountsConfig = field(default_factory=AccountsConfig)
+    channels: ChannelsConfig = field(default_factory=ChannelsConfig)
+    bans: BansConfig = field(default_factory=BansConfig)
+    limits: LimitsConfig = field(default_factory=LimitsConfig)
+    output: OutputConfig = field(default_factory=OutputConfig)
+    pipeline: PipelineConfig = field(default_factory=PipelineConfig)
+    scheduling: SchedulingConfig = field(default_factory=SchedulingConfig)
+    profiling: ProfilingConfig = field(default_factory=ProfilingConfig)
+    access_log: AccessLogConfig = field(default_factory=AccessLogConfig)
+    opers: dict[str, str] = field(default_factory=dict)
 
 
 @dataclass
@@ -19,6 +181,199 @@ class AppConfig:
     log_level: str
 
 
+def _load_tls_listeners(entries: list[dict[str, Any]]) -> list[TLSListenerConfig]:
+    listeners: list[TLSListenerConfig] = []
+    for entry in entries:
+        listener = TLSListenerConfig(
+            host=entry["host"],
+            port=entry["port"],
+            certfile=entry["certfile"],
+            keyfile=entry["keyfile"],
+        )
+        if "handshake_timeout" in entry:
+            listener.handshake_timeout = float(entry["handshake_timeout"])
+        if "max_pending_handshakes" in entry:
+            listener.max_pending_handshakes = int(entry["max_pending_handshakes"])
+        if "session_tickets" in entry:
+            listener.session_tickets = int(entry["session_tickets"])
+        if "client_ca" in entry:
+            listener.client_ca = str(entry["client_ca"])
+        listeners.append(listener)
+    return listeners
+
+
+def _load_websocket_listeners(
+    entries: list[dict[str, Any]],
+) -> list[WebSocketListenerConfig]:
+    listeners: list[WebSocketListenerConfig] = []
+    for entry in entries:
+        listener = WebSocketListenerConfig(host=entry["host"], port=entry["port"])
+        if "handshake_timeout" in entry:
+            listener.handshake_timeout = float(entry["handshake_timeout"])
+        if "max_message_size" in entry:
+            listener.max_message_size = int(entry["max_message_size"])
+        if "max_lines_per_message" in entry:
+            listener.max_lines_per_message = int(entry["max_lines_per_message"])
+        if "permessage_deflate" in entry:
+            listener.permessage_deflate = bool(entry["permessage_deflate"])
+        listener.allowed_origins = [
+            str(origin) for origin in entry.get("allowed_origins") or []
+        ]
+        listeners.append(listener)
+    return listeners
+
+
+def _load_auth(entry: dict[str, Any]) -> AuthConfig:
+    auth = AuthConfig()
+    if "workers" in entry:
+        auth.workers = int(entry["workers"])
+    if "max_pending" in entry:
+        auth.max_pending = int(entry["max_pending"])
+    if "cache_size" in entry:
+        auth.cache_size = int(entry["cache_size"])
+    if "cache_ttl" in entry:
+        auth.cache_ttl = float(entry["cache_ttl"])
+    return auth
+
+
+def _load_accounts(entry: dict[str, Any]) -> AccountsConfig:
+    accounts = AccountsConfig()
+    if "backend" in entry:
+        accounts.backend = str(entry["backend"])
+    if "path" in entry:
+        accounts.path = str(entry["path"])
+    if "cache_size" in entry:
+        accounts.cache_size = int(entry["cache_size"])
+    if "cache_ttl" in entry:
+        accounts.cache_ttl = float(entry["cache_ttl"])
+    accounts.accounts = dict(entry.get("accounts") or {})
+    return accounts
+
+
+def _load_channels(entry: dict[str, Any]) -> ChannelsConfig:
+    channels = ChannelsConfig()
+    if "join_batch_window" in entry:
+        channels.join_batch_window = float(entry["join_batch_window"])
+    if "max_list_entries" in entry:
+        channels.max_list_entries = int(entry["max_list_entries"])
+    if "max_channels" in entry:
+        channels.max_channels = int(entry["max_channels"])
+    if "topics_path" in entry:
+        channels.topics_path = str(entry["topics_path"])
+    if "topics_max" in entry:
+        channels.topics_max = int(entry["topics_max"])
+    if "topics_max_age" in entry:
+        channels.topics_max_age = float(entry["topics_max_age"])
+    return channels
+
+
+def _load_bans(entry: dict[str, Any]) -> BansConfig:
+    bans = BansConfig()
+    if "path" in entry:
+        bans.path = str(entry["path"])
+    return bans
+
+
+def _load_limits(entry: dict[str, Any]) -> LimitsConfig:
+    limits = LimitsConfig()
+    if "nicklen" in entry:
+        limits.nicklen = int(entry["nicklen"])
+    if "channellen" in entry:
+        limits.channellen = int(entry["channellen"])
+    if "linelen" in entry:
+        limits.linelen = int(entry["linelen"])
+    if "maxchannels" in entry:
+        limits.maxchannels = int(entry["maxchannels"])
+    if "awaylen" in entry:
+        limits.awaylen = int(entry["awaylen"])
+    if "topiclen" in entry:
+        limits.topiclen = int(entry["topiclen"])
+    if "monitor" in entry:
+        limits.monitor = int(entry["monitor"])
+    for command, count in (entry.get("targmax") or {}).items():
+        limits.targmax[str(command).upper()] = int(count or 0)
+    return limits
+
+
+def _load_output(entry: dict[str, Any]) -> OutputConfig:
+    output = OutputConfig()
+    if "flush_policy" in entry:
+        output.flush_policy = str(entry["flush_policy"])
+        if output.flush_policy not in ("immediate", "tick"):
+            raise ValueError(f"Unknown flush policy: {output.flush_policy}")
+    if "max_buffered" in entry:
+        output.max_buffered = int(entry["max_buffered"])
+    return output
+
+
+def _load_pipeline(entry: dict[str, Any]) -> PipelineConfig:
+    pipeline = PipelineConfig()
+    if "queue_size" in entry:
+        pipeline.queue_size = int(entry["queue_size"])
+    if "burst" in entry:
+        pipeline.burst = int(entry["burst"])
+    if "close_timeout" in entry:
+        pipeline.close_timeout = float(entry["close_timeout"])
+    if pipeline.queue_size < 1 or pipeline.burst < 1:
+        raise ValueError("Pipeline queue_size and burst must be at least 1")
+    return pipeline
+
+
+def _load_scheduling(entry: dict[str, Any]) -> SchedulingConfig:
+    scheduling = SchedulingConfig()
+    if "large_fanout" in entry:
+        scheduling.large_fanout = int(entry["large_fanout"])
+    if "broadcast_slice" in entry:
+        scheduling.broadcast_slice = int(entry["broadcast_slice"])
+    if "tick_budget" in entry:
+        scheduling.tick_budget = float(entry["tick_budget"])
+    if "lag_interval" in entry:
+        scheduling.lag_interval = float(entry["lag_interval"])
+    if "lag_warning" in entry:
+        scheduling.lag_warning = float(entry["lag_warning"])
+    if "lag_report" in entry:
+        scheduling.lag_report = float(entry["lag_report"])
+    if scheduling.broadcast_slice < 1 or scheduling.lag_interval <= 0:
+        raise ValueError("Scheduling broadcast_slice and lag_interval must be positive")
+    return scheduling
+
+
+def _load_profiling(entry: dict[str, Any]) -> ProfilingConfig:
+    profiling = ProfilingConfig()
+    if "directory" in entry:
+        profiling.directory = str(entry["directory"])
+    if "max_seconds" in entry:
+        profiling.max_seconds = float(entry["max_seconds"])
+    if "signal_seconds" in entry:
+        profiling.signal_seconds = float(entry["signal_seconds"])
+    if "sample_interval" in entry:
+        profiling.sample_interval = float(entry["sample_interval"])
+    if "spans" in entry:
+        profiling.spans = bool(entry["spans"])
+    if profiling.sample_interval <= 0:
+        raise ValueError("Profiling sample_interval must be positive")
+    return profiling
+
+
+def _load_access_log(entry: dict[str, Any]) -> AccessLogConfig:
+    access_log = AccessLogConfig()
+    if "path" in entry:
+        access_log.path = str(entry["path"])
+    if "max_bytes" in entry:
+        access_log.max_bytes = int(entry["max_bytes"])
+    if "backups" in entry:
+        access_log.backups = int(entry["backups"])
+    if "batch_size" in entry:
+        access_log.batch_size = int(entry["batch_size"])
+    if "flush_interval" in entry:
+        access_log.flush_interval = float(entry["flush_interval"])
+    if "queue_size" in entry:
+        access_log.queue_size = int(entry["queue_size"])
+    if access_log.batch_size < 1 or access_log.queue_size < 1:
+        raise ValueError("Access log batch_size and queue_size must be at least 1")
+    return access_log
+
+
 def load_config(config_path: str) -> AppConfig:
     path = Path(config_path)
     if not path.exists():
@@ -38,6 +393,23 @@ def load_config(config_path: str) -> AppConfig:
                 host=server_data["host"],
                 port=server_data["port"],
                 password=server_data["password"],
+                casemapping=str(server_data.get("casemapping") or "rfc1459"),
+                tls=_load_tls_listeners(server_data.get("tls") or []),
+                websocket=_load_websocket_listeners(server_data.get("websocket") or []),
+                auth=_load_auth(server_data.get("auth") or {}),
+                accounts=_load_accounts(server_data.get("accounts") or {}),
+                channels=_load_channels(server_data.get("channels") or {}),
+                bans=_load_bans(server_data.get("bans") or {}),
+                limits=_load_limits(server_data.get("limits") or {}),
+                output=_load_output(server_data.get("output") or {}),
+                pipeline=_load_pipeline(server_data.get("pipeline") or {}),
+                scheduling=_load_scheduling(server_data.get("scheduling") or {}),
+                profiling=_load_profiling(server_data.get("profiling") or {}),
+                access_log=_load_access_log(server_data.get("access_log") or {}),
+                opers={
+                    str(name): str(password)
+                    for name, password in (server_data.get("opers") or {}).items()
+                },
             ),
             log_level=data["logging"]["level"],
         )
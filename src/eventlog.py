@@ -0,0 +1,162 @@
+from __future__ import annotations
+
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+from typing import TYPE_CHECKING, Any, BinaryIO
+
+from src.config import AccessLogConfig
+
+if TYPE_CHECKING:
+    from src.session import ClientSession
+
+
+class EventLog:
+    """Client activity as JSON lines, written out by a background thread."""
+
+    # Seconds between warnings about dropped events
+    WARN_INTERVAL = 10.0
+
+    def __init__(self, config: AccessLogConfig) -> None:
+        self.path = config.path
+        self.max_bytes = config.max_bytes
+        self.backups = config.backups
+        self.batch_size = config.batch_size
+        self.flush_interval = config.flush_interval
+        self.logger = logging.getLogger(self.__class__.__name__)
+
+        self.queue_size = config.queue_size
+        self.dropped = 0
+        self.written = 0
+        self._reported = 0
+        self._unwarned = 0
+        self._warned_at = 0.0
+        self._pending: deque[dict[str, Any]] = deque()
+        self._wakeup = threading.Event()
+        self._closing = False
+        self._file: BinaryIO | None = None
+        self._size = 0
+        self._thread: threading.Thread | None = None
+
+        if self.path:
+            self._thread = threading.Thread(
+                target=self._run, name="event-log", daemon=True
+            )
+            self._thread.start()
+
+    @property
+    def enabled(self) -> bool:
+        return self._thread is not None
+
+    def emit(
+        self, event: str, session: ClientSession | None = None, **fields: Any
+    ) -> None:
+        if self._thread is None:
+            return
+
+        record: dict[str, Any] = {"ts": round(time.time(), 3), "event": event}
+        if session is not None:
+            record["host"] = session.host
+            record["port"] = session.port
+            record["nick"] = session.nickname
+            # Seconds since connecting: time to register, or connection length
+            record["age"] = round(time.monotonic() - session.connected_at, 3)
+        record.update(fields)
+
+        # deque appends need no lock; a lagging writer costs events, not loop time
+        pending = len(self._pending)
+        if pending >= self.queue_size:
+            self.dropped += 1
+            return
+        self._pending.append(record)
+        if pending + 1 == self.batch_size:
+            self._wakeup.set()
+
+    def close(self) -> None:
+        if self._thread is None:
+            return
+
+        # Whatever is still queued is written before the thread finishes
+        self._closing = True
+        self._wakeup.set()
+        self._thread.join()
+        self._thread = None
+
+    def _run(self) -> None:
+        while True:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            closing = self._closing
+
+            while self._pending:
+                batch = self._next_batch()
+                self._write(batch)
+            self._report_drops()
+
+            if closing:
+                break
+
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def _next_batch(self) -> list[dict[str, Any]]:
+        batch: list[dict[str, Any]] = []
+        pending = self._pending
+        while pending and len(batch) < self.batch_size:
+            batch.append(pending.popleft())
+        return batch
+
+    def _report_drops(self) -> None:
+        count = self.dropped - self._reported
+        if not count:
+            return
+
+        self._reported += count
+        self._write([{"ts": round(time.time(), 3), "event": "dropped", "count": count}])
+        self._unwarned += count
+        now = time.monotonic()
+        if now - self._warned_at >= self.WARN_INTERVAL:
+            self.logger.warning(f"Dropped {self._unwarned} access log events")
+            self._unwarned = 0
+            self._warned_at = now
+
+    def _write(self, batch: list[dict[str, Any]]) -> None:
+        data = "".join(
+            json.dumps(record, separators=(",", ":")) + "\n" for record in batch
+        ).encode("utf-8")
+        try:
+            if self._file is None:
+                self._open()
+            if self._size and self._size + len(data) > self.max_bytes:
+                self._rotate()
+            assert self._file is not None
+            self._file.write(data)
+            self._file.flush()
+            self._size += len(data)
+            self.written += len(batch)
+        except OSError as e:
+            self.logger.error(f"Could not write access log {self.path}: {e}")
+
+    def _open(self) -> None:
+        assert self.path is not None
+        self._file = open(self.path, "ab")
+        self._size = self._file.tell()
+
+    def _rotate(self) -> None:
+        assert self.path is not None and self._file is not None
+        self._file.close()
+        self._file = None
+
+        if self.backups > 0:
+            for index in range(self.backups - 1, 0, -1):
+                older = f"{self.path}.{index}"
+                if os.path.exists(older):
+                    os.replace(older, f"{self.path}.{index + 1}")
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.remove(self.path)
+        self._open()
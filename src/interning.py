@@ -0,0 +1,57 @@
+import ipaddress
+import weakref
+from collections import OrderedDict
+from dataclasses import dataclass
+
+
+class StringPool:
+    """Hands out one shared copy of equal strings."""
+
+    def __init__(self, size: int = 65536) -> None:
+        # Bounded, unlike sys.intern(), since clients choose these strings
+        self.size = size
+        self._strings: OrderedDict[str, str] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._strings)
+
+    def intern(self, text: str) -> str:
+        shared = self._strings.get(text)
+        if shared is not None:
+            self._strings.move_to_end(text)
+            return shared
+
+        self._strings[text] = text
+        if len(self._strings) > self.size:
+            self._strings.popitem(last=False)
+        return text
+
+
+@dataclass(frozen=True)
+class HostRecord:
+    """Immutable per-host data shared by every session from that host."""
+
+    host: str
+    address: ipaddress.IPv4Address | ipaddress.IPv6Address | None
+
+
+STRINGS = StringPool()
+
+# Records live as long as a session from the host holds on to them
+_hosts: "weakref.WeakValueDictionary[str, HostRecord]" = weakref.WeakValueDictionary()
+
+
+def intern_string(text: str) -> str:
+    return STRINGS.intern(text)
+
+
+def host_record(host: str) -> HostRecord:
+    record = _hosts.get(host)
+    if record is None:
+        try:
+            address = ipaddress.ip_address(host)
+        except ValueError:
+            address = None
+        record = HostRecord(intern_string(host), address)
+        _hosts[record.host] = record
+    return record
@@ -0,0 +1,36 @@
+from src.config import LimitsConfig
+
+# Message tags have their own allowance on top of LINELEN (IRCv3 message-tags)
+TAGS_LIMIT = 8191
+
+# Commands whose comma-separated targets are not the first parameter
+TARGET_PARAM = {"WHOIS": -1}
+
+_limits = LimitsConfig()
+
+
+def set_limits(config: LimitsConfig) -> None:
+    global _limits
+    _limits = config
+
+
+def limits() -> LimitsConfig:
+    return _limits
+
+
+def line_too_long(line: bytes) -> bool:
+    """Checks a raw line, CRLF included, against LINELEN and the tag allowance."""
+    if len(line) <= _limits.linelen:
+        return False
+
+    if line.startswith(b"@"):
+        tags, _, line = line.partition(b" ")
+        if len(tags) > TAGS_LIMIT:
+            return True
+    return len(line) > _limits.linelen
+
+
+def targmax_token() -> str:
+    return "TARGMAX=" + ",".join(
+        f"{command}:{count or ''}" for command, count in sorted(_limits.targmax.items())
+    )
@@ -5,6 +5,7 @@ import signal
 import sys
 
 from src.config import load_config
+from src.profiling import ProfilerBusyError
 from src.server import Server
 
 
@@ -50,6 +51,16 @@ async def main() -> None:
     for sig in (signal.SIGINT, signal.SIGTERM):
         loop.add_signal_handler(sig, _signal_handler)
 
+    def _profile_handler() -> None:
+        profiler = server_app.command_handler.profiler
+        try:
+            profiler.start(cfg.server.profiling.signal_seconds)
+        except (ProfilerBusyError, OSError) as e:
+            logging.warning(f"Profile not started: {e}")
+
+    # SIGUSR1 takes a sampling profile, e.g. kill -USR1 <pid>
+    loop.add_signal_handler(signal.SIGUSR1, _profile_handler)
+
     server_task = asyncio.create_task(server_app.start())
 
     try:
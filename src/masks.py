@@ -0,0 +1,220 @@
+import re
+import sys
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+
+from src.casemapping import casefold
+
+WILDCARDS = frozenset("*?")
+
+
+def normalize_mask(mask: str) -> str:
+    """Expands a partial mask (nick, user@host, nick!user) to nick!user@host."""
+    if "!" not in mask and "@" not in mask:
+        if "." in mask or ":" in mask:
+            mask = f"*!*@{mask}"
+        else:
+            mask = f"{mask}!*@*"
+    elif "@" not in mask:
+        mask = f"{mask}@*"
+    elif "!" not in mask:
+        mask = f"*!{mask}"
+
+    nick, _, rest = mask.partition("!")
+    user, _, host = rest.partition("@")
+    return casefold(f"{nick or '*'}!{user or '*'}@{host or '*'}")
+
+
+def compile_mask(mask: str) -> re.Pattern[str]:
+    pattern = "".join(
+        ".*" if char == "*" else "." if char == "?" else re.escape(char)
+        for char in mask
+    )
+    return re.compile(pattern, re.DOTALL)
+
+
+def _literal_prefix(text: str) -> str:
+    for i, char in enumerate(text):
+        if char in WILDCARDS:
+            return text[:i]
+    return text
+
+
+@dataclass
+class MaskEntry:
+    mask: str
+    setter: str
+    set_at: float
+    pattern: re.Pattern[str]
+
+
+@dataclass
+class _TrieNode:
+    children: dict[str, "_TrieNode"] = field(default_factory=dict)
+    entries: list[MaskEntry] = field(default_factory=list)
+
+
+class _Trie:
+    __slots__ = ("root",)
+
+    def __init__(self) -> None:
+        # Created on first insert: most lists (channel +b/+e/+I) stay empty
+        self.root: _TrieNode | None = None
+
+    def insert(self, key: str, entry: MaskEntry) -> None:
+        if self.root is None:
+            self.root = _TrieNode()
+        node = self.root
+        for char in key:
+            node = node.children.setdefault(char, _TrieNode())
+        node.entries.append(entry)
+
+    def remove(self, key: str, entry: MaskEntry) -> None:
+        node = self.root
+        if node is None:
+            return
+        for char in key:
+            child = node.children.get(char)
+            if child is None:
+                return
+            node = child
+        if entry in node.entries:
+            node.entries.remove(entry)
+
+    def candidates(self, text: str) -> list[MaskEntry]:
+        # Every entry whose key is a prefix of text
+        node = self.root
+        if node is None:
+            return []
+        found = list(node.entries)
+        for char in text:
+            child = node.children.get(char)
+            if child is None:
+                break
+            node = child
+            found.extend(node.entries)
+        return found
+
+
+class MaskList:
+    """A ban-style mask list matched without scanning every entry."""
+
+    CACHE_SIZE = 1024
+
+    def __init__(self) -> None:
+        self.entries: dict[str, MaskEntry] = {}
+        self._exact: dict[str, MaskEntry] = {}
+        self._host_suffix = _Trie()
+        self._host_prefix = _Trie()
+        self._nick_prefix = _Trie()
+        self._user_prefix = _Trie()
+        self._generic: list[MaskEntry] = []
+        self._cache: OrderedDict[str, str] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def __contains__(self, mask: str) -> bool:
+        return normalize_mask(mask) in self.entries
+
+    def _index(self, entry: MaskEntry) -> tuple[_Trie | None, str]:
+        # The most selective literal part: host suffix, host prefix, nick
+        # prefix or user prefix. Only masks whose part matched are run.
+        nick, _, rest = entry.mask.partition("!")
+        user, _, host = rest.partition("@")
+
+        suffix = _literal_prefix(host[::-1])
+        if suffix:
+            return self._host_suffix, suffix
+        prefix = _literal_prefix(host)
+        if prefix:
+            return self._host_prefix, prefix
+        prefix = _literal_prefix(nick)
+        if prefix:
+            return self._nick_prefix, prefix
+        prefix = _literal_prefix(user)
+        if prefix:
+            return self._user_prefix, prefix
+        return None, ""
+
+    def add(self, mask: str, setter: str = "") -> str | None:
+        mask = normalize_mask(mask)
+        if mask in self.entries:
+            return None
+
+        entry = MaskEntry(mask, setter, time.time(), compile_mask(mask))
+        self.entries[mask] = entry
+
+        if not WILDCARDS.intersection(mask):
+            self._exact[mask] = entry
+        else:
+            trie, key = self._index(entry)
+            if trie is None:
+                self._generic.append(entry)
+            else:
+                trie.insert(key, entry)
+
+        self._cache.clear()
+        return mask
+
+    def remove(self, mask: str) -> str | None:
+        mask = normalize_mask(mask)
+        entry = self.entries.pop(mask, None)
+        if entry is None:
+            return None
+
+        if self._exact.pop(mask, None) is None:
+            trie, key = self._index(entry)
+            if trie is None:
+                self._generic.remove(entry)
+            else:
+                trie.remove(key, entry)
+
+        self._cache.clear()
+        return mask
+
+    def memory_usage(self) -> int:
+        # Entries dominate; the tries only hold references to them
+        size = sys.getsizeof(self.entries) + sys.getsizeof(self._cache)
+        for entry in self.entries.values():
+            size += sys.getsizeof(entry) + sys.getsizeof(entry.mask)
+        return size
+
+    def _candidates(self, nick: str, host: str, user: str = "") -> list[MaskEntry]:
+        return (
+            self._host_suffix.candidates(host[::-1])
+            + self._host_prefix.candidates(host)
+            + self._nick_prefix.candidates(nick)
+            + self._user_prefix.candidates(user)
+            + self._generic
+        )
+
+    def matches(self, mask: str) -> bool:
+        return self.find(mask) is not None
+
+    def find(self, mask: str) -> str | None:
+        # Returns the first list entry matching the given hostmask
+        if not self.entries:
+            return None
+
+        mask = casefold(mask)
+        cached = self._cache.get(mask)
+        if cached is not None:
+            self._cache.move_to_end(mask)
+            return cached or None
+
+        found = mask if mask in self._exact else None
+        if found is None:
+            nick, _, rest = mask.partition("!")
+            user, _, host = rest.partition("@")
+            for entry in self._candidates(nick, host, user):
+                if entry.pattern.fullmatch(mask):
+                    found = entry.mask
+                    break
+
+        # An empty string caches a miss
+        self._cache[mask] = found or ""
+        if len(self._cache) > self.CACHE_SIZE:
+            self._cache.popitem(last=False)
+        return found
@@ -0,0 +1,88 @@
+import asyncio
+import logging
+
+from src.commands import CommandHandler
+from src.config import PipelineConfig
+from src.protocol import IRCMessage
+from src.session import ClientSession
+
+# Answered as soon as they are read, ahead of anything still queued
+URGENT_COMMANDS = frozenset({"PING", "PONG"})
+
+
+class CommandPipeline:
+    """Runs one client's commands in arrival order on a task of its own."""
+
+    def __init__(
+        self,
+        session: ClientSession,
+        handler: CommandHandler,
+        config: PipelineConfig,
+    ) -> None:
+        self.session = session
+        self.handler = handler
+        self.burst = config.burst
+        self.close_timeout = config.close_timeout
+        self.logger = logging.getLogger(self.__class__.__name__)
+
+        self.queue: asyncio.Queue[IRCMessage | None] = asyncio.Queue(config.queue_size)
+        self.processed = 0
+        self.peak_depth = 0
+        self._task: asyncio.Task[None] | None = None
+
+    @property
+    def depth(self) -> int:
+        return self.queue.qsize()
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._run())
+
+    async def submit(self, message: IRCMessage) -> None:
+        if message.command in URGENT_COMMANDS:
+            await self._handle(message)
+            return
+
+        # Waits while the queue is full, which stops this client's reading
+        await self.queue.put(message)
+        self.peak_depth = max(self.peak_depth, self.queue.qsize())
+
+    async def close(self) -> None:
+        # Lines read before the client went away still run, in order, unless
+        # the worker is stuck, e.g. in drain() on a client that stopped reading
+        task, self._task = self._task, None
+        if task is None:
+            return
+
+        try:
+            self.queue.put_nowait(None)
+        except asyncio.QueueFull:
+            task.cancel()
+        done, _ = await asyncio.wait({task}, timeout=self.close_timeout)
+        if not done:
+            self.logger.warning(
+                f"Cancelling commands of {self.session.host} still running"
+                f" after {self.close_timeout:g}s"
+            )
+            task.cancel()
+
+    async def _run(self) -> None:
+        while True:
+            message = await self.queue.get()
+            if message is None:
+                return
+
+            # Whatever is left after a QUIT has nobody to answer to
+            if self.session.closed:
+                continue
+
+            await self._handle(message)
+            self.processed += 1
+            # A deep queue takes turns with other clients
+            if self.processed % self.burst == 0:
+                await asyncio.sleep(0)
+
+    async def _handle(self, message: IRCMessage) -> None:
+        try:
+            await self.handler.handle(self.session, message)
+        except Exception as e:
+            self.logger.error(f"Command processing error: {e}")
@@ -0,0 +1,183 @@
+import asyncio
+import cProfile
+import logging
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from dataclasses import dataclass
+from types import FrameType
+
+from src.config import ProfilingConfig
+
+PROFILE_CPU = "cpu"
+PROFILE_SAMPLE = "sample"
+
+# Stages timed on every line when spans are on. Waiting for a line is not
+# timed: "decode" starts once readline() has returned it.
+STAGES = ("decode", "parse", "dispatch", "send")
+
+
+class ProfilerBusyError(RuntimeError):
+    pass
+
+
+def _collapse(frame: FrameType | None) -> str:
+    names: list[str] = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+
+class _Sampler(threading.Thread):
+    """Records the stack of one thread at a fixed interval, from another thread."""
+
+    def __init__(self, target: int, interval: float) -> None:
+        super().__init__(name="profile-sampler", daemon=True)
+        self.target = target
+        self.interval = interval
+        self.stacks: Counter[str] = Counter()
+        self.stopped = threading.Event()
+
+    def run(self) -> None:
+        while not self.stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.target)
+            if frame is not None:
+                self.stacks[_collapse(frame)] += 1
+
+    def dump(self, path: str) -> None:
+        # Collapsed stacks, as flame graph tools read them
+        with open(path, "w") as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+
+
+class Profiler:
+    """Profiles the event loop thread for a while and writes a profile file."""
+
+    def __init__(self, config: ProfilingConfig) -> None:
+        self.directory = config.directory
+        self.max_seconds = config.max_seconds
+        self.sample_interval = config.sample_interval
+        self.logger = logging.getLogger(self.__class__.__name__)
+
+        self.path: str | None = None
+        self._cpu: cProfile.Profile | None = None
+        self._sampler: _Sampler | None = None
+        self._timer: asyncio.TimerHandle | None = None
+
+    @property
+    def running(self) -> bool:
+        return self.path is not None
+
+    def start(self, seconds: float, mode: str = PROFILE_SAMPLE) -> str:
+        if self.running:
+            raise ProfilerBusyError("A profile is already running")
+        if mode not in (PROFILE_CPU, PROFILE_SAMPLE):
+            raise ValueError(f"Unknown profile mode: {mode}")
+
+        seconds = min(seconds, self.max_seconds)
+        os.makedirs(self.directory, exist_ok=True)
+        stamp = time.strftime("%Y%m%d-%H%M%S")
+        extension = "prof" if mode == PROFILE_CPU else "folded"
+        path = os.path.join(self.directory, f"{mode}-{stamp}.{extension}")
+
+        # Only marked as running once the profiler has actually started
+        if mode == PROFILE_CPU:
+            cpu = cProfile.Profile()
+            cpu.enable()
+            self._cpu = cpu
+        else:
+            sampler = _Sampler(threading.get_ident(), self.sample_interval)
+            sampler.start()
+            self._sampler = sampler
+        self.path = path
+
+        loop = asyncio.get_running_loop()
+        self._timer = loop.call_later(seconds, self.stop)
+        self.logger.info(f"Profiling ({mode}) for {seconds:g}s into {self.path}")
+        return self.path
+
+    def stop(self) -> str | None:
+        path, self.path = self.path, None
+        if path is None:
+            return None
+
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+        try:
+            if self._cpu is not None:
+                self._cpu.disable()
+                self._cpu.dump_stats(path)
+            if self._sampler is not None:
+                self._sampler.stopped.set()
+                self._sampler.join()
+                self._sampler.dump(path)
+        except OSError as e:
+            self.logger.error(f"Could not write profile to {path}: {e}")
+            return None
+        finally:
+            self._cpu = None
+            self._sampler = None
+
+        self.logger.info(f"Wrote profile to {path}")
+        return path
+
+
+@dataclass
+class SpanStats:
+    count: int = 0
+    total: float = 0.0
+    peak: float = 0.0
+
+
+class Spans:
+    """Running totals of the time spent in each stage of handling a line."""
+
+    def __init__(self) -> None:
+        self.enabled = False
+        self.stats: dict[str, SpanStats] = {}
+
+    def record(self, stage: str, started: float) -> None:
+        elapsed = time.perf_counter() - started
+        stats = self.stats.get(stage)
+        if stats is None:
+            stats = self.stats[stage] = SpanStats()
+        stats.count += 1
+        stats.total += elapsed
+        if elapsed > stats.peak:
+            stats.peak = elapsed
+
+    def reset(self) -> None:
+        self.stats.clear()
+
+    def summary(self, commands: int = 5) -> list[str]:
+        def line(name: str, stats: SpanStats) -> str:
+            average = stats.total / stats.count * 1e6
+            return (
+                f"{name}: {stats.count} calls, {stats.total:.3f}s total,"
+                f" {average:.1f}us avg, {stats.peak * 1e6:.0f}us peak"
+            )
+
+        lines = [
+            line(stage, self.stats[stage]) for stage in STAGES if stage in self.stats
+        ]
+        slowest = sorted(
+            (item for item in self.stats.items() if item[0] not in STAGES),
+            key=lambda item: item[1].total,
+            reverse=True,
+        )
+        lines.extend(line(name, stats) for name, stats in slowest[:commands])
+        return lines
+
+
+_SPANS = Spans()
+
+
+def spans() -> Spans:
+    return _SPANS
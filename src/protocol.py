@@ -1,20 +1,48 @@
 from dataclasses import dataclass, field
 
+TAG_UNESCAPES = {":": ";", "s": " ", "\\": "\\", "r": "\r", "n": "\n"}
+
 
 @dataclass
 class IRCMessage:
     command: str
     params: list[str] = field(default_factory=list)
     prefix: str | None = None
+    tags: dict[str, str] = field(default_factory=dict)
 
 
 class IRCParser:
+    @staticmethod
+    def parse_tags(raw: str) -> dict[str, str]:
+        tags: dict[str, str] = {}
+        for item in raw.split(";"):
+            if not item:
+                continue
+            key, _, value = item.partition("=")
+
+            unescaped: list[str] = []
+            chars = iter(value)
+            for char in chars:
+                if char == "\\":
+                    escaped = next(chars, "")
+                    unescaped.append(TAG_UNESCAPES.get(escaped, escaped))
+                else:
+                    unescaped.append(char)
+            tags[key] = "".join(unescaped)
+        return tags
+
     @staticmethod
     def parse(data: str) -> IRCMessage:
         data = data.strip()
         if not data:
             raise ValueError("Empty message")
 
+        tags: dict[str, str] = {}
+        if data.startswith("@"):
+            raw_tags, data = data[1:].split(" ", 1)
+            tags = IRCParser.parse_tags(raw_tags)
+            data = data.lstrip()
+
         prefix = None
         if data.startswith(":"):
             prefix, data = data[1:].split(" ", 1)
@@ -27,4 +55,4 @@ class IRCParser:
             args = data.split()
 
         command = args.pop(0).upper()
-        return IRCMessage(command=command, params=args, prefix=prefix)
+        return IRCMessage(command=command, params=args, prefix=prefix, tags=tags)
@@ -0,0 +1,157 @@
+import asyncio
+import logging
+import time
+from collections import deque
+from collections.abc import AsyncIterator, Collection
+from dataclasses import dataclass
+from typing import TypeVar
+
+from src.config import SchedulingConfig
+
+T = TypeVar("T")
+
+
+class FanoutScheduler:
+    """Splits large fan-outs into slices under a loop-wide budget per tick."""
+
+    def __init__(self, config: SchedulingConfig | None = None) -> None:
+        self.configure(config or SchedulingConfig())
+        self.loop: asyncio.AbstractEventLoop | None = None
+        self.reset_scheduled = False
+        self.yields = 0
+
+    def configure(self, config: SchedulingConfig) -> None:
+        self.threshold = config.large_fanout
+        self.slice_size = config.broadcast_slice
+        self.tick_budget = config.tick_budget
+        self.remaining = config.tick_budget
+
+    async def slices(self, members: Collection[T]) -> AsyncIterator[Collection[T]]:
+        # Ordinary channels are neither charged nor delayed
+        if len(members) <= self.threshold:
+            yield members
+            return
+
+        # Members may come and go while this fan-out waits for its turn
+        snapshot = list(members)
+        started = time.perf_counter()
+        for start in range(0, len(snapshot), self.slice_size):
+            now = time.perf_counter()
+            if self._spend(now - started):
+                self.yields += 1
+                await asyncio.sleep(0)
+                now = time.perf_counter()
+            started = now
+            yield [
+                member
+                for member in snapshot[start : start + self.slice_size]
+                if member in members
+            ]
+
+    def _spend(self, seconds: float) -> bool:
+        loop = asyncio.get_running_loop()
+        if loop is not self.loop:
+            self.loop = loop
+            self.reset_scheduled = False
+            self.remaining = self.tick_budget
+
+        if not self.reset_scheduled:
+            # The budget comes back once the loop has gone round
+            self.reset_scheduled = True
+            loop.call_soon(self._reset)
+
+        self.remaining -= seconds
+        return self.remaining <= 0
+
+    def _reset(self) -> None:
+        self.reset_scheduled = False
+        self.remaining = self.tick_budget
+
+
+_FANOUT = FanoutScheduler()
+
+
+def set_scheduling(config: SchedulingConfig) -> None:
+    _FANOUT.configure(config)
+
+
+def fanout() -> FanoutScheduler:
+    return _FANOUT
+
+
+@dataclass
+class LagStats:
+    current: float
+    peak: float
+    p50: float
+    p99: float
+    samples: int
+
+
+class LagMonitor:
+    """Event loop lag: how much later than scheduled a periodic timer runs."""
+
+    WINDOW = 1000
+
+    def __init__(self, config: SchedulingConfig) -> None:
+        self.interval = config.lag_interval
+        self.warning = config.lag_warning
+        self.report_interval = config.lag_report
+        self.logger = logging.getLogger(self.__class__.__name__)
+
+        self.samples: deque[float] = deque(maxlen=self.WINDOW)
+        self.current = 0.0
+        self.peak = 0.0
+        self._expected = 0.0
+        self._next_report = 0.0
+        self._timer: asyncio.TimerHandle | None = None
+
+    def start(self) -> None:
+        loop = asyncio.get_running_loop()
+        self._next_report = loop.time() + self.report_interval
+        self._schedule(loop)
+
+    def stop(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+    def _schedule(self, loop: asyncio.AbstractEventLoop) -> None:
+        self._expected = loop.time() + self.interval
+        self._timer = loop.call_at(self._expected, self._sample)
+
+    def _sample(self) -> None:
+        loop = asyncio.get_running_loop()
+        self.record(max(0.0, loop.time() - self._expected))
+        if self.report_interval > 0 and loop.time() >= self._next_report:
+            self._next_report = loop.time() + self.report_interval
+            self.report()
+        self._schedule(loop)
+
+    def record(self, lag: float) -> None:
+        self.current = lag
+        self.peak = max(self.peak, lag)
+        self.samples.append(lag)
+        if lag >= self.warning:
+            self.logger.warning(f"Event loop lagged {lag * 1000:.1f} ms")
+
+    def stats(self) -> LagStats:
+        ordered = sorted(self.samples)
+        if not ordered:
+            return LagStats(self.current, self.peak, 0.0, 0.0, 0)
+
+        def percentile(fraction: float) -> float:
+            return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+        return LagStats(
+            self.current, self.peak, percentile(0.5), percentile(0.99), len(ordered)
+        )
+
+    def report(self) -> None:
+        stats = self.stats()
+        self.logger.info(
+            f"Event loop lag: p50 {stats.p50 * 1000:.1f} ms,"
+            f" p99 {stats.p99 * 1000:.1f} ms, peak {stats.peak * 1000:.1f} ms"
+            f" over {stats.samples} samples"
+        )
+        self.peak = 0.0
@@ -1,25 +1,45 @@
 import asyncio
 import logging
+import ssl
+import time
+from functools import partial
 
-from src.channel_manager import ChannelManager
 from src.commands import CommandHandler
-from src.config import ServerConfig
+from src.config import ServerConfig, WebSocketListenerConfig
+from src.limits import line_too_long
+from src.pipeline import CommandPipeline
+from src.profiling import spans
 from src.protocol import IRCParser
-from src.session import ClientSession
-from src.user_manager import UserManager
+from src.scheduling import LagMonitor
+from src.session import ClientSession, Reader, Writer
+from src.tls import TLSHandshaker, create_server_context, peer_certfp
+from src.transport import Connection
+from src.websocket import accept as accept_websocket
 
 
 class Server:
     def __init__(self, config: ServerConfig):
         self.config = config
         self.server: asyncio.Server | None = None
+        self.tls_servers: list[asyncio.Server] = []
+        self.tls_handshakers: list[TLSHandshaker] = []
+        self.websocket_servers: list[asyncio.Server] = []
+        self.pipelines: dict[ClientSession, CommandPipeline] = {}
         self.logger = logging.getLogger(self.__class__.__name__)
 
         self.command_handler = CommandHandler(self.config)
+        self.lag_monitor = LagMonitor(self.config.scheduling)
 
     async def start(self) -> None:
-        self.server = await asyncio.start_server(
-            self.handle_client, self.config.host, self.config.port
+        self.lag_monitor.start()
+        await self.start_tls_listeners()
+        await self.start_websocket_listeners()
+
+        loop = asyncio.get_running_loop()
+        self.server = await loop.create_server(
+            partial(Connection, self.handle_connection),
+            self.config.host,
+            self.config.port,
         )
 
         if self.server.sockets:
@@ -29,44 +49,185 @@ class Server:
         async with self.server:
             await self.server.serve_forever()
 
+    async def start_tls_listeners(self) -> None:
+        loop = asyncio.get_running_loop()
+        contexts: dict[tuple[str, str, int], ssl.SSLContext] = {}
+
+        for listener in self.config.tls:
+            key = (listener.certfile, listener.keyfile, listener.session_tickets)
+            if key not in contexts:
+                contexts[key] = create_server_context(listener)
+
+            handshaker = TLSHandshaker(listener, contexts[key])
+            tls_server = await loop.create_server(
+                partial(
+                    Connection,
+                    partial(self.handle_tls_client, handshaker),
+                    paused=True,
+                ),
+                listener.host,
+                listener.port,
+            )
+            self.tls_handshakers.append(handshaker)
+            self.tls_servers.append(tls_server)
+
+            if tls_server.sockets:
+                addr = tls_server.sockets[0].getsockname()
+                self.logger.info(f"TLS listener is listening at {addr}")
+
+    async def start_websocket_listeners(self) -> None:
+        loop = asyncio.get_running_loop()
+        for listener in self.config.websocket:
+            websocket_server = await loop.create_server(
+                partial(Connection, partial(self.handle_websocket_client, listener)),
+                listener.host,
+                listener.port,
+            )
+            self.websocket_servers.append(websocket_server)
+
+            if websocket_server.sockets:
+                addr = websocket_server.sockets[0].getsockname()
+                self.logger.info(f"WebSocket listener is listening at {addr}")
+
     async def stop(self) -> None:
+        self.lag_monitor.stop()
+        self.command_handler.close()
+
+        for tls_server in self.tls_servers:
+            tls_server.close()
+            await tls_server.wait_closed()
+        self.tls_servers.clear()
+
+        for websocket_server in self.websocket_servers:
+            websocket_server.close()
+            await websocket_server.wait_closed()
+        self.websocket_servers.clear()
+
         if self.server:
             self.logger.info("Shutting down server...")
             self.server.close()
             await self.server.wait_closed()
             self.logger.info("Server stopped.")
 
+    async def handle_connection(self, connection: Connection) -> None:
+        await self.handle_client(connection, connection)
+
+    async def handle_tls_client(
+        self, handshaker: TLSHandshaker, connection: Connection
+    ) -> None:
+        # Banned peers are dropped before paying for a handshake
+        peer = connection.get_extra_info("peername")
+        if peer and self.command_handler.bans.check(None, peer[0]):
+            connection.close()
+            return
+
+        if not await handshaker.handshake(connection):
+            connection.close()
+            return
+
+        certfp = peer_certfp(connection)
+        await self.handle_client(connection, connection, certfp=certfp)
+
+    async def handle_websocket_client(
+        self, listener: WebSocketListenerConfig, connection: Connection
+    ) -> None:
+        # Banned peers are dropped before the HTTP upgrade
+        peer = connection.get_extra_info("peername")
+        if peer and self.command_handler.bans.check(None, peer[0]):
+            connection.close()
+            return
+
+        websocket = await accept_websocket(connection, listener)
+        if websocket is None:
+            return
+
+        # Client messages arrive as lines, so the regular loop serves them
+        pump = asyncio.create_task(websocket.pump())
+        try:
+            await self.handle_client(websocket.lines, websocket)
+        finally:
+            pump.cancel()
+
     async def handle_client(
-        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+        self,
+        reader: Reader,
+        writer: Writer,
+        certfp: str | None = None,
     ) -> None:
-        session = ClientSession(reader, writer, self.config.name)
+        session = ClientSession(
+            reader,
+            writer,
+            self.config.name,
+            flush_policy=self.config.output.flush_policy,
+            max_buffered=self.config.output.max_buffered,
+        )
+        session.certfp = certfp
         self.logger.info(f"Connected from {session.host}")
+        events = self.command_handler.events
+        events.emit("connect", session)
+
+        ban = self.command_handler.bans.check(None, session.host)
+        if ban is not None:
+            await self.command_handler.disconnect_banned(session, ban)
+            events.emit("quit", session, reason=session.quit_reason)
+            return
 
+        pipeline = CommandPipeline(session, self.command_handler, self.config.pipeline)
+        self.pipelines[session] = pipeline
+        pipeline.start()
+        timing = spans()
         try:
             while True:
                 data = await reader.readline()
                 if not data:
                     break
+                session.bytes_in += len(data)
+
+                started = time.perf_counter() if timing.enabled else 0.0
+                if line_too_long(data):
+                    await session.send_error("417", ":Input line was too long")
+                    continue
 
                 line = data.decode("utf-8", errors="ignore").strip()
                 if not line:
                     continue
+                if timing.enabled:
+                    timing.record("decode", started)
+                    started = time.perf_counter()
 
                 try:
-                    self.logger.debug(f"Received: {line}")
+                    if self.logger.isEnabledFor(logging.DEBUG):
+                        self.logger.debug(f"Received: {line}")
                     message = IRCParser.parse(line)
-                    await self.command_handler.handle(session, message)
                 except ValueError:
-                    pass
-                except Exception as e:
-                    self.logger.error(f"Command processing error: {e}")
+                    continue
+                if timing.enabled:
+                    timing.record("parse", started)
+                await pipeline.submit(message)
 
         except Exception as e:
             self.logger.error(f"Client error {session.host}: {e}")
         finally:
             self.logger.info(f"Disconnected {session.host}")
-            if session.nickname:
-                UserManager().remove_user(session.nickname)
-                ChannelManager().remove_user_from_all_channels(session)
+            try:
+                await pipeline.close()
+            finally:
+                # The nick is freed and peers see the QUIT however it ended
+                del self.pipelines[session]
+                await self.command_handler.unregister(session)
+                await session.quit()
+            events.emit(
+                "quit",
+                session,
+                reason=session.quit_reason or "Connection closed",
+                commands=pipeline.processed,
+                bytes_in=session.bytes_in,
+                bytes_out=session.bytes_out,
+            )
 
-            await session.quit()
+    def queue_depths(self) -> dict[str, int]:
+        # Commands waiting per client, for spotting who is falling behind
+        return {
+            session.nickname or session.host: pipeline.depth
+            for session, pipeline in self.pipelines.items()
+        }
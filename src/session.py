@@ -1,31 +1,160 @@
+from __future__ import annotations
+
 import asyncio
 import logging
+import time
+from collections.abc import AsyncIterator, Iterable
+from contextlib import asynccontextmanager
+from functools import cached_property
+from typing import TYPE_CHECKING, Any, Protocol
+
+from src.casemapping import casefold
+from src.interning import host_record
+from src.profiling import spans
+
+if TYPE_CHECKING:
+    from src.channel import Channel
+
+# Parent of the per-connection loggers. Those are deliberately not registered
+# with logging's manager, which would keep one alive for every connection the
+# server has ever accepted.
+_SESSION_LOGGER = logging.getLogger("Session")
+
+# Socket writes are timed as the "send" stage when spans are on
+_SPANS = spans()
+
+
+# Output flush policies (see OutputConfig)
+FLUSH_IMMEDIATE = "immediate"
+FLUSH_TICK = "tick"
+
+# Seconds quit() waits for the transport to finish sending and close
+CLOSE_TIMEOUT = 5.0
+
+
+def _connection_logger(name: str) -> logging.Logger:
+    logger = logging.Logger(name)
+    logger.parent = _SESSION_LOGGER
+    return logger
+
+
+class Reader(Protocol):
+    """The part of asyncio.StreamReader the server's line loop reads from."""
+
+    async def readline(self) -> bytes: ...
+
+
+class Writer(Protocol):
+    """The part of asyncio.StreamWriter a session writes through."""
+
+    def write(self, data: bytes) -> None: ...
+
+    def writelines(self, data: Iterable[bytes]) -> None: ...
+
+    async def drain(self) -> None: ...
+
+    def close(self) -> None: ...
+
+    async def wait_closed(self) -> None: ...
+
+    def is_closing(self) -> bool: ...
+
+    def get_extra_info(self, name: str, default: Any = None) -> Any: ...
 
 
 class ClientSession:
     def __init__(
         self,
-        reader: asyncio.StreamReader,
-        writer: asyncio.StreamWriter,
+        reader: Reader,
+        writer: Writer,
         server_name: str,
+        flush_policy: str = FLUSH_IMMEDIATE,
+        max_buffered: int = 65536,
     ):
         self.reader = reader
         self.writer = writer
         self.server_name = server_name
+        self.flush_policy = flush_policy
+        self.max_buffered = max_buffered
 
         addr = writer.get_extra_info("peername")
-        self.host = addr[0] if addr else "unknown"
+        # Shared by every session from the same host
+        self.host_record = host_record(addr[0] if addr else "unknown")
+        self.host = self.host_record.host
         self.port = addr[1] if addr else 0
 
-        self.nickname: str | None = None
-        self.username: str | None = None
+        self._nickname: str | None = None
+        # Casefolded nickname, kept in step with nickname
+        self.nick_key: str | None = None
+        self._username: str | None = None
+        self._hostmask: str | None = None
         self.realname: str | None = None
         self.is_registered: bool = False
+        self.channels: set[Channel] = set()
 
         self.password_attempt: str | None = None
+        self.certfp: str | None = None
+        self.account: str | None = None
+        self.is_oper: bool = False
+        self.away: str | None = None
+        # MONITOR targets: casefolded nick -> nick as the client gave it
+        self.monitored: dict[str, str] = {}
+
+        self.caps: int = 0
+        self.cap_version: int = 0
+        self.cap_negotiating: bool = False
+        self.sasl_mechanism: str | None = None
+        self.sasl_buffer: str = ""
+
+        # Connection time and traffic, for the access log
+        self.connected_at: float = time.monotonic()
+        self.bytes_in: int = 0
+        self.bytes_out: int = 0
+
         self.closed: bool = False
+        # Shown to channel peers in the QUIT sent once the connection is gone
+        self.quit_reason: str | None = None
+        self._cork_depth: int = 0
+        self._pending: list[bytes] = []
+        self._pending_bytes: int = 0
+        # Waiting in the tick flusher
+        self._queued: bool = False
 
-        self.logger = logging.getLogger(f"Session({self.host}:{self.port})")
+    @cached_property
+    def logger(self) -> logging.Logger:
+        # Built on first use: most connections never log past registration
+        return _connection_logger(f"Session({self.host}:{self.port})")
+
+    @property
+    def nickname(self) -> str | None:
+        return self._nickname
+
+    @nickname.setter
+    def nickname(self, value: str | None) -> None:
+        self._nickname = value
+        self.nick_key = casefold(value) if value else None
+        self._hostmask = None
+
+    @property
+    def username(self) -> str | None:
+        return self._username
+
+    @username.setter
+    def username(self, value: str | None) -> None:
+        self._username = value
+        self._hostmask = None
+
+    @property
+    def hostmask(self) -> str:
+        # Built once per nick or username change rather than on every relay
+        if self._hostmask is None:
+            self._hostmask = (
+                f"{self.nickname or '*'}!{self.username or '*'}@{self.host}"
+            )
+        return self._hostmask
+
+    def is_alive(self) -> bool:
+        return not self.closed and not self.writer.is_closing()
 
     async def send_reply(self, *args: str) -> None:
         if self.closed:
@@ -35,10 +164,118 @@ class ClientSession:
             return
 
         response = " ".join(args) + "\r\n"
+        if self._cork_depth:
+            data = response.encode("utf-8")
+            self._pending.append(data)
+            self._pending_bytes += len(data)
+            # A large corked reply set leaves in bounded writes, with drain()
+            if self._pending_bytes >= self.max_buffered:
+                await self.flush()
+            return
+
+        if self.flush_policy == FLUSH_TICK:
+            data = response.encode("utf-8")
+            self._pending.append(data)
+            self._pending_bytes += len(data)
+            # Joining a batch that is already waiting costs nothing more
+            if not self._queued or self._pending_bytes >= self.max_buffered:
+                await self._schedule_flush()
+            return
+
+        try:
+            data = response.encode("utf-8")
+            started = time.perf_counter() if _SPANS.enabled else 0.0
+            self.writer.write(data)
+            if _SPANS.enabled:
+                _SPANS.record("send", started)
+            self.bytes_out += len(data)
+            await self.writer.drain()
+            if _SESSION_LOGGER.isEnabledFor(logging.DEBUG):
+                self.logger.debug(f"Sent: {response.strip()}")
+        except Exception as e:
+            self.logger.error(f"Send error: {e}")
+
+    async def send_now(self, *args: str) -> None:
+        # Skips the cork and the tick batch, so a keep-alive reply does not
+        # wait for whatever a slow command is still producing
+        if self.closed:
+            return
+
+        response = " ".join(args) + "\r\n"
+        try:
+            data = response.encode("utf-8")
+            started = time.perf_counter() if _SPANS.enabled else 0.0
+            self.writer.write(data)
+            if _SPANS.enabled:
+                _SPANS.record("send", started)
+            self.bytes_out += len(data)
+            await self.writer.drain()
+        except Exception as e:
+            self.logger.error(f"Send error: {e}")
+
+    async def _schedule_flush(self) -> None:
+        # Everything queued until the loop comes round again leaves in one
+        # writelines() call, i.e. one send per socket per iteration
+        if self._pending_bytes >= self.max_buffered:
+            self._write_pending()
+        else:
+            self._queued = True
+            _TICK_FLUSHER.add(self)
+
+        try:
+            # Back-pressure is applied once per batch rather than per reply
+            await self.writer.drain()
+        except Exception as e:
+            self.logger.error(f"Send error: {e}")
+
+    def _write_pending(self) -> None:
+        self._queued = False
+        if not self._cork_depth:
+            self._write_buffered()
+
+    def _write_buffered(self) -> bool:
+        if not self._pending:
+            return False
+
+        data, self._pending = self._pending, []
+        self._pending_bytes = 0
+        if self.closed:
+            return False
+
+        try:
+            started = time.perf_counter() if _SPANS.enabled else 0.0
+            self.writer.writelines(data)
+            if _SPANS.enabled:
+                _SPANS.record("send", started)
+            self.bytes_out += sum(map(len, data))
+            if _SESSION_LOGGER.isEnabledFor(logging.DEBUG):
+                self.logger.debug(f"Flushed {len(data)} replies")
+        except Exception as e:
+            self.logger.error(f"Send error: {e}")
+            return False
+        return True
+
+    @asynccontextmanager
+    async def corked(self) -> AsyncIterator[None]:
+        # Replies produced while corked leave in a single buffered write
+        self._cork_depth += 1
+        try:
+            yield
+        finally:
+            self._cork_depth -= 1
+            if not self._cork_depth:
+                await self.flush()
+
+    async def flush(self) -> None:
+        if not self._pending:
+            return
+
+        self._queued = False
+        if not self._write_buffered():
+            return
+
         try:
-            self.writer.write(response.encode("utf-8"))
             await self.writer.drain()
-            self.logger.debug(f"Sent: {response.strip()}")
         except Exception as e:
             self.logger.error(f"Send error: {e}")
 
@@ -54,11 +291,48 @@ class ClientSession:
         if self.closed:
             return
 
+        # Queued replies go out without drain(): the client may have stopped
+        # reading, and close() still sends what the transport holds
+        self._queued = False
+        self._write_buffered()
         self.closed = True
 
         self.logger.info("Closing connection")
         try:
             self.writer.close()
-            await self.writer.wait_closed()
+            await asyncio.wait_for(self.writer.wait_closed(), CLOSE_TIMEOUT)
         except Exception:
             pass
+
+
+class _TickFlusher:
+    """Writes out the sessions that queued output during one loop iteration."""
+
+    def __init__(self) -> None:
+        self.sessions: list[ClientSession] = []
+        self.loop: asyncio.AbstractEventLoop | None = None
+        self.scheduled = False
+
+    def add(self, session: ClientSession) -> None:
+        loop = asyncio.get_running_loop()
+        if loop is not self.loop:
+            # A previous loop may have stopped before its callback ran
+            self.loop = loop
+            self.sessions = []
+            self.scheduled = False
+
+        self.sessions.append(session)
+        if not self.scheduled:
+            self.scheduled = True
+            loop.call_soon(self.run)
+
+    def run(self) -> None:
+        self.scheduled = False
+        sessions, self.sessions = self.sessions, []
+        for session in sessions:
+            # Sessions flushed early have nothing left and are skipped
+            if session._queued:
+                session._write_pending()
+
+
+_TICK_FLUSHER = _TickFlusher()
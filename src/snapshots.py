@@ -0,0 +1,111 @@
+import asyncio
+import json
+import logging
+import os
+import threading
+from collections.abc import Callable
+from dataclasses import asdict
+from typing import Any
+
+
+class JsonSnapshot:
+    """A list of dataclass records saved to a JSON file shortly after changes."""
+
+    SAVE_DELAY = 1.0
+
+    def __init__(
+        self,
+        path: str | None,
+        records: Callable[[], list[Any]],
+        logger: logging.Logger,
+        what: str,
+    ) -> None:
+        self.path = path
+        self.records = records
+        self.logger = logger
+        self.what = what
+
+        self._save_timer: asyncio.TimerHandle | None = None
+        self._dirty: bool = False
+        self._writes: set[asyncio.Task[None]] = set()
+        # Snapshots are numbered so that an older one never overwrites a newer
+        self._taken = 0
+        self._written = 0
+        self._lock = threading.Lock()
+
+    def load(self) -> list[dict[str, Any]]:
+        if not self.path or not os.path.exists(self.path):
+            return []
+
+        try:
+            with open(self.path) as f:
+                entries: list[dict[str, Any]] = json.load(f)
+        except (OSError, ValueError) as e:
+            self.logger.error(f"Could not load {self.what} from {self.path}: {e}")
+            return []
+        return entries
+
+    def changed(self) -> None:
+        if not self.path:
+            return
+
+        self._dirty = True
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self.save()
+            return
+
+        if self._save_timer is None:
+            self._save_timer = loop.call_later(self.SAVE_DELAY, self._on_save)
+
+    def _on_save(self) -> None:
+        self._save_timer = None
+        if not self._dirty:
+            return
+
+        # Only the list is copied here; records changed in place meanwhile are
+        # saved with either value, and written again with the next change
+        self._dirty = False
+        self._taken += 1
+        task = asyncio.ensure_future(
+            self._save_in_thread(self._taken, list(self.records()))
+        )
+        self._writes.add(task)
+        task.add_done_callback(self._writes.discard)
+
+    async def _save_in_thread(self, number: int, records: list[Any]) -> None:
+        if not await asyncio.to_thread(self._write, number, records):
+            # Tried again with the next change, or at close
+            self._dirty = True
+
+    def save(self) -> None:
+        # Written on the calling thread, e.g. at shutdown
+        if not self.path or not (self._dirty or self._writes):
+            return
+
+        self._taken += 1
+        self._dirty = not self._write(self._taken, list(self.records()))
+
+    def _write(self, number: int, records: list[Any]) -> bool:
+        assert self.path is not None
+        with self._lock:
+            if number <= self._written:
+                return True
+
+            temp_path = f"{self.path}.tmp"
+            try:
+                with open(temp_path, "w") as f:
+                    json.dump([asdict(record) for record in records], f)
+                os.replace(temp_path, self.path)
+            except OSError as e:
+                self.logger.error(f"Could not save {self.what} to {self.path}: {e}")
+                return False
+            self._written = number
+            return True
+
+    def close(self) -> None:
+        if self._save_timer is not None:
+            self._save_timer.cancel()
+            self._save_timer = None
+        self.save()
@@ -0,0 +1,70 @@
+import asyncio
+import hashlib
+import logging
+import ssl
+
+from src.config import TLSListenerConfig
+from src.session import Writer
+from src.transport import Connection
+
+
+def create_server_context(listener: TLSListenerConfig) -> ssl.SSLContext:
+    context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+    context.minimum_version = ssl.TLSVersion.TLSv1_2
+    context.load_cert_chain(listener.certfile, listener.keyfile)
+
+    # Tickets let a reconnecting client resume instead of paying for a full
+    # handshake. The ticket keys live in the context, so it must be shared.
+    context.options &= ~ssl.OP_NO_TICKET
+    context.num_tickets = listener.session_tickets
+
+    # Client certificates are optional and only used for SASL EXTERNAL
+    if listener.client_ca:
+        context.load_verify_locations(listener.client_ca)
+        context.verify_mode = ssl.CERT_OPTIONAL
+    return context
+
+
+def peer_certfp(writer: Writer) -> str | None:
+    ssl_object = writer.get_extra_info("ssl_object")
+    if ssl_object is None:
+        return None
+
+    cert = ssl_object.getpeercert(binary_form=True)
+    if not cert:
+        return None
+    return hashlib.sha256(cert).hexdigest()
+
+
+class TLSHandshaker:
+    def __init__(
+        self, listener: TLSListenerConfig, context: ssl.SSLContext | None = None
+    ) -> None:
+        self.listener = listener
+        self.context = context or create_server_context(listener)
+        self.pending = asyncio.Semaphore(listener.max_pending_handshakes)
+        self.logger = logging.getLogger(self.__class__.__name__)
+
+        self.handshakes: int = 0
+        self.resumed: int = 0
+        self.failures: int = 0
+
+    async def handshake(self, connection: Connection) -> bool:
+        # asyncio runs the TLS state machine on the loop thread, so we bound how
+        # many handshakes can be in flight and how long each one may take.
+        async with self.pending:
+            try:
+                await connection.start_tls(
+                    self.context,
+                    ssl_handshake_timeout=self.listener.handshake_timeout,
+                )
+            except (ssl.SSLError, OSError) as e:
+                self.failures += 1
+                self.logger.debug(f"TLS handshake failed: {e}")
+                return False
+
+        self.handshakes += 1
+        ssl_object = connection.get_extra_info("ssl_object")
+        if ssl_object is not None and ssl_object.session_reused:
+            self.resumed += 1
+        return True
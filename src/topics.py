@@ -0,0 +1,110 @@
+import logging
+import time
+from dataclasses import dataclass
+
+from src.casemapping import casefold
+from src.channel import Channel
+from src.channel_manager import ChannelManager
+from src.config import ChannelsConfig
+from src.snapshots import JsonSnapshot
+
+
+@dataclass
+class SavedTopic:
+    channel: str
+    topic: str
+    set_by: str
+    set_at: float
+    # Last time the channel was seen: topic set or handed back, or in use
+    # when the store was pruned
+    used_at: float = 0.0
+
+
+class TopicStore:
+    """Channel topics kept on disk across restarts, by channel name."""
+
+    def __init__(self, config: ChannelsConfig) -> None:
+        self.path = config.topics_path
+        self.max_topics = config.topics_max
+        self.max_age = config.topics_max_age
+        self.logger = logging.getLogger(self.__class__.__name__)
+
+        self.topics: dict[str, SavedTopic] = {}
+        self._snapshot = JsonSnapshot(self.path, self._records, self.logger, "topics")
+
+        self.load()
+
+    def __len__(self) -> int:
+        return len(self.topics)
+
+    def restore(self, channel: Channel) -> None:
+        saved = self.topics.get(channel.name_key)
+        if saved is not None and not channel.topic:
+            channel.set_topic(saved.topic, saved.set_by, saved.set_at)
+            saved.used_at = time.time()
+
+    def update(self, channel: Channel) -> None:
+        if not self.path:
+            return
+
+        if channel.topic:
+            self.topics[channel.name_key] = SavedTopic(
+                channel.name,
+                channel.topic,
+                channel.topic_set_by,
+                channel.topic_set_at,
+                time.time(),
+            )
+        elif self.topics.pop(channel.name_key, None) is None:
+            return
+        self._snapshot.changed()
+
+    def prune(self, now: float | None = None) -> int:
+        now = time.time() if now is None else now
+        channels = ChannelManager().channels
+        for key, saved in self.topics.items():
+            # Topics of live channels are kept however old they are
+            if key in channels:
+                saved.used_at = now
+
+        cutoff = now - self.max_age
+        stale = [key for key, saved in self.topics.items() if saved.used_at < cutoff]
+        excess = len(self.topics) - len(stale) - self.max_topics
+        if excess > 0:
+            kept = sorted(
+                (saved.used_at, key)
+                for key, saved in self.topics.items()
+                if saved.used_at >= cutoff
+            )
+            stale.extend(key for _, key in kept[:excess])
+
+        for key in stale:
+            del self.topics[key]
+        if stale:
+            self.logger.info(f"Dropped {len(stale)} unused topics")
+        return len(stale)
+
+    def _records(self) -> list[SavedTopic]:
+        # Pruned as each snapshot is taken, so the store cannot only grow
+        self.prune()
+        return list(self.topics.values())
+
+    def save(self) -> None:
+        self._snapshot.save()
+
+    def load(self) -> None:
+        entries = self._snapshot.load()
+        if not entries:
+            return
+
+        now = time.time()
+        for entry in entries:
+            saved = SavedTopic(**entry)
+            # Snapshots from before used_at was kept count as fresh
+            saved.used_at = saved.used_at or now
+            self.topics[casefold(saved.channel)] = saved
+        self.prune(now)
+        self.logger.info(f"Loaded {len(self.topics)} topics from {self.path}")
+
+    def close(self) -> None:
+        self._snapshot.close()
@@ -0,0 +1,216 @@
+from __future__ import annotations
+
+import asyncio
+import ssl
+from collections import deque
+from collections.abc import Callable, Coroutine, Iterable
+from typing import Any, cast
+
+# Bytes a client may send without a line break before it is dropped
+DEFAULT_LIMIT = 65536
+# Consumed bytes kept at the front of the buffer before it is compacted
+COMPACT_AFTER = 16384
+
+
+class Connection(asyncio.Protocol):
+    """A client connection read from its own buffer and written to directly."""
+
+    def __init__(
+        self,
+        on_connect: Callable[[Connection], Coroutine[Any, Any, None]] | None = None,
+        limit: int = DEFAULT_LIMIT,
+        paused: bool = False,
+    ) -> None:
+        self.limit = limit
+        # TLS clients are not read until start_tls(), which gets the ClientHello
+        self._paused = paused
+        self.transport: asyncio.Transport | None = None
+        self._on_connect = on_connect
+        self._task: asyncio.Task[None] | None = None
+
+        self._buffer = bytearray()
+        self._start = 0
+        self._eof = False
+        self._exception: BaseException | None = None
+        self._reading_paused = False
+        self._read_waiter: asyncio.Future[None] | None = None
+
+        self._writing_paused = False
+        # Every writer blocked in drain() until writing resumes
+        self._drain_waiters: deque[asyncio.Future[None]] = deque()
+        self._closed: asyncio.Future[None] | None = None
+
+    # asyncio.Protocol callbacks
+
+    def connection_made(self, transport: asyncio.BaseTransport) -> None:
+        self.transport = cast(asyncio.Transport, transport)
+        if self._paused:
+            self.transport.pause_reading()
+        loop = asyncio.get_running_loop()
+        self._closed = loop.create_future()
+        if self._on_connect is not None:
+            self._task = loop.create_task(self._on_connect(self))
+
+    def data_received(self, data: bytes) -> None:
+        self._buffer += data
+        self._wake_reader()
+        # Stop reading from a client that sends faster than it is served
+        if (
+            not self._reading_paused
+            and self.transport is not None
+            and len(self._buffer) - self._start > 2 * self.limit
+        ):
+            self._reading_paused = True
+            self.transport.pause_reading()
+
+    def eof_received(self) -> bool | None:
+        self._eof = True
+        self._wake_reader()
+        return None
+
+    def connection_lost(self, exc: Exception | None) -> None:
+        self._eof = True
+        self._exception = exc
+        self._wake_reader()
+
+        for waiter in self._drain_waiters:
+            if not waiter.done():
+                waiter.set_exception(exc or ConnectionResetError("Connection lost"))
+        if self._closed is not None and not self._closed.done():
+            self._closed.set_result(None)
+
+    def pause_writing(self) -> None:
+        self._writing_paused = True
+
+    def resume_writing(self) -> None:
+        self._writing_paused = False
+        for waiter in self._drain_waiters:
+            if not waiter.done():
+                waiter.set_result(None)
+
+    # Reading
+
+    def _wake_reader(self) -> None:
+        waiter, self._read_waiter = self._read_waiter, None
+        if waiter is not None and not waiter.done():
+            waiter.set_result(None)
+
+    async def _wait_for_data(self) -> None:
+        if self._exception is not None:
+            raise self._exception
+        self._read_waiter = asyncio.get_running_loop().create_future()
+        await self._read_waiter
+
+    def _take(self, end: int) -> bytes:
+        data = bytes(self._buffer[self._start : end])
+        if end == len(self._buffer):
+            self._buffer.clear()
+            self._start = 0
+        elif end > COMPACT_AFTER:
+            del self._buffer[:end]
+            self._start = 0
+        else:
+            self._start = end
+
+        if (
+            self._reading_paused
+            and self.transport is not None
+            and len(self._buffer) - self._start <= self.limit
+        ):
+            self._reading_paused = False
+            self.transport.resume_reading()
+        return data
+
+    async def readline(self) -> bytes:
+        # Like StreamReader.readline(): b"" at EOF, partial data before it
+        while True:
+            end = self._buffer.find(b"\n", self._start)
+            if end >= 0:
+                return self._take(end + 1)
+            if len(self._buffer) - self._start > self.limit:
+                raise ValueError("Separator is not found, and chunk exceed the limit")
+            if self._eof:
+                return self._take(len(self._buffer))
+            await self._wait_for_data()
+
+    async def readuntil(self, separator: bytes = b"\n") -> bytes:
+        while True:
+            end = self._buffer.find(separator, self._start)
+            if end >= 0:
+                return self._take(end + len(separator))
+            if len(self._buffer) - self._start > self.limit:
+                raise asyncio.LimitOverrunError(
+                    "Separator is not found, and chunk exceed the limit",
+                    len(self._buffer) - self._start,
+                )
+            if self._eof:
+                partial = self._take(len(self._buffer))
+                raise asyncio.IncompleteReadError(partial, None)
+            await self._wait_for_data()
+
+    async def readexactly(self, n: int) -> bytes:
+        while len(self._buffer) - self._start < n:
+            if self._eof:
+                partial = self._take(len(self._buffer))
+                raise asyncio.IncompleteReadError(partial, n)
+            await self._wait_for_data()
+        return self._take(self._start + n)
+
+    # Writing (session.Writer)
+
+    def write(self, data: bytes) -> None:
+        if self.transport is not None:
+            self.transport.write(data)
+
+    def writelines(self, data: Iterable[bytes]) -> None:
+        if self.transport is not None:
+            self.transport.writelines(data)
+
+    async def drain(self) -> None:
+        if self._exception is not None:
+            raise self._exception
+        if not self._writing_paused or self.is_closing():
+            return
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._drain_waiters.append(waiter)
+        try:
+            await waiter
+        finally:
+            self._drain_waiters.remove(waiter)
+
+    def close(self) -> None:
+        if self.transport is not None:
+            self.transport.close()
+
+    async def wait_closed(self) -> None:
+        if self._closed is not None:
+            await self._closed
+
+    def is_closing(self) -> bool:
+        return self.transport is None or self.transport.is_closing()
+
+    def get_extra_info(self, name: str, default: Any = None) -> Any:
+        if self.transport is None:
+            return default
+        return self.transport.get_extra_info(name, default)
+
+    async def start_tls(
+        self,
+        sslcontext: ssl.SSLContext,
+        *,
+        ssl_handshake_timeout: float | None = None,
+    ) -> None:
+        if self.transport is None:
+            raise ConnectionResetError("Connection lost")
+        # The loop resumes reading once the TLS protocol is in place
+        transport = await asyncio.get_running_loop().start_tls(
+            self.transport,
+            self,
+            sslcontext,
+            server_side=True,
+            ssl_handshake_timeout=ssl_handshake_timeout,
+        )
+        if transport is None:
+            raise ConnectionResetError("Connection lost")
+        self.transport = transport
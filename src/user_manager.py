@@ -1,5 +1,7 @@
 import logging
+from collections.abc import Iterator
 
+from src.casemapping import casefold
 from src.session import ClientSession
 
 
@@ -10,45 +12,97 @@ class UserManager:
         if cls._instance is None:
             cls._instance = super(UserManager, cls).__new__(cls)
             cls._instance.users = {}
+            cls._instance.by_host = {}
+            cls._instance.by_username = {}
+            cls._instance.watchers = {}
             cls._instance.logger = logging.getLogger(cls.__name__)
         return cls._instance
 
     def __init__(self) -> None:
         self.users: dict[str, "ClientSession"]
+        # Secondary indexes for WHO queries: lowercased host/username to the
+        # matching sessions, keyed by casefolded nick
+        self.by_host: dict[str, dict[str, "ClientSession"]]
+        self.by_username: dict[str, dict[str, "ClientSession"]]
+        # MONITOR reverse index: casefolded nick to the sessions watching it,
+        # so presence changes reach only those sessions
+        self.watchers: dict[str, set["ClientSession"]]
         self.logger: logging.Logger
 
-    @staticmethod
-    def _irc_lower(nick: str) -> str:
-        return nick.lower().replace("[", "{").replace("]", "}").replace("\\", "|")
-
     def add_user(self, nickname: str, session: "ClientSession") -> None:
-        low_nickname = self._irc_lower(nickname)
+        low_nickname = casefold(nickname)
 
-        if self.is_nick_taken(nickname):
+        if low_nickname in self.users:
             raise ValueError(f"Nickname '{low_nickname}' is already in use!")
 
         self.users[low_nickname] = session
+        self.by_host.setdefault(session.host.lower(), {})[low_nickname] = session
+        if session.username:
+            index = self.by_username.setdefault(session.username.lower(), {})
+            index[low_nickname] = session
         self.logger.info(f"User added: {low_nickname}")
 
     def get_session(self, nickname: str) -> "ClientSession | None":
-        return self.users.get(self._irc_lower(nickname))
+        return self.users.get(casefold(nickname))
 
     def remove_user(self, nickname: str) -> None:
-        low_nickname = self._irc_lower(nickname)
-        if low_nickname in self.users:
-            del self.users[low_nickname]
+        low_nickname = casefold(nickname)
+        session = self.users.pop(low_nickname, None)
+        if session is not None:
+            self._unindex(self.by_host, session.host, low_nickname)
+            if session.username:
+                self._unindex(self.by_username, session.username, low_nickname)
             self.logger.info(f"User removed: {nickname}")
 
+    @staticmethod
+    def _unindex(
+        index: dict[str, dict[str, "ClientSession"]], key: str, nick_key: str
+    ) -> None:
+        sessions = index.get(key.lower())
+        if sessions is not None:
+            sessions.pop(nick_key, None)
+            if not sessions:
+                del index[key.lower()]
+
+    def _lookup(
+        self, index: dict[str, dict[str, "ClientSession"]], key: str
+    ) -> Iterator["ClientSession"]:
+        for nick_key, session in list(index.get(key.lower(), {}).items()):
+            # Skip entries that outlived a reset of the nick table
+            if self.users.get(nick_key) is session:
+                yield session
+
+    def find_by_host(self, host: str) -> Iterator["ClientSession"]:
+        return self._lookup(self.by_host, host)
+
+    def find_by_username(self, username: str) -> Iterator["ClientSession"]:
+        return self._lookup(self.by_username, username)
+
+    def watch(self, session: "ClientSession", nick_key: str) -> None:
+        self.watchers.setdefault(nick_key, set()).add(session)
+
+    def unwatch(self, session: "ClientSession", nick_key: str) -> None:
+        watchers = self.watchers.get(nick_key)
+        if watchers is not None:
+            watchers.discard(session)
+            if not watchers:
+                del self.watchers[nick_key]
+
+    def watchers_of(self, nickname: str) -> list["ClientSession"]:
+        # A copy, since notifying a watcher may end up unwatching
+        return list(self.watchers.get(casefold(nickname), ()))
+
     def is_nick_taken(self, nickname: str) -> bool:
-        return self._irc_lower(nickname) in self.users
+        return casefold(nickname) in self.users
 
     def change_nick(self, old_nick: str, new_nick: str) -> None:
         session = self.get_session(old_nick)
         if session:
-            low_new = self._irc_lower(new_nick)
-            if low_new in self.users and low_new != self._irc_lower(old_nick):
+            low_old = casefold(old_nick)
+            low_new = casefold(new_nick)
+            if low_new in self.users and low_new != low_old:
                 raise ValueError(f"Nickname '{low_new}' is already in use!")
 
             self.remove_user(old_nick)
             self.add_user(new_nick, session)
-            self.logger.info(f"Nick changed: {self._irc_lower(old_nick)} -> {low_new}")
+            self.logger.info(f"Nick changed: {low_old} -> {low_new}")
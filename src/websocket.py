@@ -0,0 +1,467 @@
+import asyncio
+import base64
+import hashlib
+import logging
+import struct
+import zlib
+from collections import OrderedDict, deque
+from collections.abc import AsyncIterator, Iterable
+from typing import Any
+
+from src.config import WebSocketListenerConfig
+from src.transport import Connection
+
+GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+TEXT_PROTOCOL = "text.ircv3.net"
+BINARY_PROTOCOL = "binary.ircv3.net"
+
+OP_CONTINUATION = 0x0
+OP_TEXT = 0x1
+OP_BINARY = 0x2
+OP_CLOSE = 0x8
+OP_PING = 0x9
+OP_PONG = 0xA
+
+CLOSE_NORMAL = 1000
+CLOSE_PROTOCOL_ERROR = 1002
+CLOSE_INVALID_DATA = 1007
+CLOSE_POLICY_VIOLATION = 1008
+CLOSE_TOO_BIG = 1009
+
+# permessage-deflate strips this from every compressed message (RFC 7692)
+DEFLATE_TAIL = b"\x00\x00\xff\xff"
+# Shorter payloads are sent as they are; compressing them rarely pays off
+COMPRESS_MIN = 128
+
+logger = logging.getLogger("WebSocket")
+
+
+class WebSocketError(Exception):
+    """A protocol violation by the client, closed with the given code."""
+
+    def __init__(self, code: int, reason: str) -> None:
+        super().__init__(reason)
+        self.code = code
+
+
+def accept_key(key: str) -> str:
+    digest = hashlib.sha1((key + GUID).encode("ascii")).digest()
+    return base64.b64encode(digest).decode("ascii")
+
+
+def frame_header(opcode: int, length: int, rsv1: int = 0) -> bytes:
+    # Server frames are never masked
+    first = 0x80 | rsv1 | opcode
+    if length < 126:
+        return bytes((first, length))
+    if length < 65536:
+        return struct.pack("!BBH", first, 126, length)
+    return struct.pack("!BBQ", first, 127, length)
+
+
+def control_frame(opcode: int, payload: bytes = b"") -> bytes:
+    return frame_header(opcode, len(payload)) + payload
+
+
+def close_frame(code: int, reason: str = "") -> bytes:
+    return control_frame(OP_CLOSE, struct.pack("!H", code) + reason.encode()[:120])
+
+
+def unmask(payload: bytes, mask: bytes) -> bytes:
+    # XOR the whole payload at once through big integers
+    length = len(payload)
+    key = (mask * (length // 4 + 1))[:length]
+    value = int.from_bytes(payload, "big") ^ int.from_bytes(key, "big")
+    return value.to_bytes(length, "big")
+
+
+class FrameEncoder:
+    """Builds server data frames, shared by every WebSocket connection."""
+
+    CACHE_SIZE = 256
+
+    def __init__(self) -> None:
+        # Frames are unmasked and compressed without context takeover, so a
+        # line broadcast to many web clients is framed and compressed once
+        self._cache: OrderedDict[tuple[bytes, int, int], bytes] = OrderedDict()
+
+    def encode(self, payload: bytes, opcode: int, wbits: int = 0) -> bytes:
+        key = (payload, opcode, wbits)
+        frame = self._cache.get(key)
+        if frame is not None:
+            self._cache.move_to_end(key)
+            return frame
+
+        rsv1 = 0
+        if wbits and len(payload) >= COMPRESS_MIN:
+            compressor = zlib.compressobj(wbits=-wbits)
+            data = compressor.compress(payload) + compressor.flush(zlib.Z_SYNC_FLUSH)
+            data = data.removesuffix(DEFLATE_TAIL)
+            if len(data) < len(payload):
+                payload, rsv1 = data, 0x40
+
+        frame = frame_header(opcode, len(payload), rsv1) + payload
+        self._cache[key] = frame
+        if len(self._cache) > self.CACHE_SIZE:
+            self._cache.popitem(last=False)
+        return frame
+
+
+FRAMES = FrameEncoder()
+
+
+def parse_extensions(value: str) -> list[tuple[str, dict[str, str | None]]]:
+    offers: list[tuple[str, dict[str, str | None]]] = []
+    for offer in value.split(","):
+        name, *params = (part.strip() for part in offer.split(";"))
+        if not name:
+            continue
+        parsed: dict[str, str | None] = {}
+        for param in params:
+            key, sep, arg = param.partition("=")
+            parsed[key.strip()] = arg.strip().strip('"') if sep else None
+        offers.append((name, parsed))
+    return offers
+
+
+def negotiate_deflate(value: str) -> tuple[str, int] | None:
+    """Picks the first acceptable permessage-deflate offer and its window bits."""
+    for name, params in parse_extensions(value):
+        if name != "permessage-deflate":
+            continue
+        if not params.keys() <= {
+            "server_no_context_takeover",
+            "client_no_context_takeover",
+            "server_max_window_bits",
+            "client_max_window_bits",
+        }:
+            continue
+
+        response = ["permessage-deflate", "server_no_context_takeover"]
+        if "client_no_context_takeover" in params:
+            response.append("client_no_context_takeover")
+
+        wbits = 15
+        if "server_max_window_bits" in params:
+            bits = params["server_max_window_bits"] or ""
+            # zlib cannot produce 8-bit windows for raw deflate streams
+            if not bits.isdigit() or not 9 <= int(bits) <= 15:
+                continue
+            wbits = int(bits)
+            response.append(f"server_max_window_bits={wbits}")
+        return "; ".join(response), wbits
+    return None
+
+
+def parse_request(data: bytes) -> tuple[str, dict[str, str]] | None:
+    request_line, *lines = data.decode("latin-1").split("\r\n")
+    parts = request_line.split()
+    if len(parts) != 3 or not parts[2].startswith("HTTP/"):
+        return None
+
+    headers: dict[str, str] = {}
+    for line in lines:
+        if not line:
+            continue
+        name, sep, value = line.partition(":")
+        if not sep:
+            return None
+        name = name.strip().lower()
+        if name in headers:
+            headers[name] += ", " + value.strip()
+        else:
+            headers[name] = value.strip()
+    return parts[0], headers
+
+
+def http_response(status: str, headers: Iterable[str] = ()) -> bytes:
+    lines = [f"HTTP/1.1 {status}", *headers, "", ""]
+    return "\r\n".join(lines).encode("latin-1")
+
+
+class LineBuffer:
+    """Lines decoded from client messages, waiting for the server's line loop."""
+
+    def __init__(self, limit: int) -> None:
+        self.limit = limit
+        self.size = 0
+        self._lines: deque[bytes] = deque()
+        self._eof = False
+        self._readable = asyncio.Event()
+        self._writable = asyncio.Event()
+        self._writable.set()
+
+    def feed(self, line: bytes) -> None:
+        self._lines.append(line)
+        self.size += len(line)
+        self._readable.set()
+        # Like a Connection's buffer: frames then back up and pause the socket
+        if self.size > 2 * self.limit:
+            self._writable.clear()
+
+    def feed_eof(self) -> None:
+        self._eof = True
+        self._readable.set()
+        self._writable.set()
+
+    async def wait_writable(self) -> None:
+        await self._writable.wait()
+
+    async def readline(self) -> bytes:
+        # Like StreamReader.readline(): b"" once the client has gone
+        while not self._lines:
+            if self._eof:
+                return b""
+            self._readable.clear()
+            await self._readable.wait()
+
+        line = self._lines.popleft()
+        self.size -= len(line)
+        if self.size <= self.limit:
+            self._writable.set()
+        return line
+
+
+class WebSocketConnection:
+    """An upgraded connection, shaped like the StreamWriter a session uses."""
+
+    def __init__(
+        self,
+        stream: Connection,
+        binary: bool = False,
+        wbits: int = 0,
+        max_message_size: int = 16384,
+        max_lines_per_message: int = 8,
+    ) -> None:
+        self.stream = stream
+        self.opcode = OP_BINARY if binary else OP_TEXT
+        # Window bits for compressed server messages; 0 when not negotiated
+        self.wbits = wbits
+        self.max_message_size = max_message_size
+        self.max_lines_per_message = max_lines_per_message
+        self.lines = LineBuffer(max_message_size)
+        self.close_sent = False
+        self._inflater = zlib.decompressobj(wbits=-15) if wbits else None
+
+    def _frames(self, data: bytes) -> list[bytes]:
+        return [
+            FRAMES.encode(line, self.opcode, self.wbits)
+            for line in data.split(b"\r\n")
+            if line
+        ]
+
+    def write(self, data: bytes) -> None:
+        if self.close_sent:
+            return
+        self.stream.writelines(self._frames(data))
+
+    def writelines(self, data: Iterable[bytes]) -> None:
+        if self.close_sent:
+            return
+        frames: list[bytes] = []
+        for chunk in data:
+            frames.extend(self._frames(chunk))
+        self.stream.writelines(frames)
+
+    async def drain(self) -> None:
+        await self.stream.drain()
+
+    def close(self) -> None:
+        self.send_close(CLOSE_NORMAL)
+        self.stream.close()
+
+    async def wait_closed(self) -> None:
+        await self.stream.wait_closed()
+
+    def is_closing(self) -> bool:
+        return self.stream.is_closing()
+
+    def get_extra_info(self, name: str, default: Any = None) -> Any:
+        return self.stream.get_extra_info(name, default)
+
+    def send_close(self, code: int, reason: str = "") -> None:
+        if self.close_sent or self.stream.is_closing():
+            return
+        self.close_sent = True
+        self.stream.write(close_frame(code, reason))
+
+    async def read_frame(self) -> tuple[bool, int, bool, bytes]:
+        head = await self.stream.readexactly(2)
+        fin = bool(head[0] & 0x80)
+        compressed = bool(head[0] & 0x40)
+        opcode = head[0] & 0x0F
+        if head[0] & 0x30 or (compressed and self._inflater is None):
+            raise WebSocketError(CLOSE_PROTOCOL_ERROR, "Unexpected reserved bits")
+        if not head[1] & 0x80:
+            raise WebSocketError(CLOSE_PROTOCOL_ERROR, "Client frames must be masked")
+
+        length = head[1] & 0x7F
+        if length == 126:
+            (length,) = struct.unpack("!H", await self.stream.readexactly(2))
+        elif length == 127:
+            (length,) = struct.unpack("!Q", await self.stream.readexactly(8))
+        if length > self.max_message_size:
+            raise WebSocketError(CLOSE_TOO_BIG, "Message too big")
+
+        mask = await self.stream.readexactly(4)
+        payload = unmask(await self.stream.readexactly(length), mask)
+        return fin, opcode, compressed, payload
+
+    async def messages(self) -> AsyncIterator[bytes]:
+        parts: list[bytes] = []
+        size = 0
+        message_opcode = 0
+        compressed = False
+
+        while True:
+            fin, opcode, rsv1, payload = await self.read_frame()
+
+            if opcode >= OP_CLOSE:
+                if not fin or len(payload) > 125:
+                    raise WebSocketError(CLOSE_PROTOCOL_ERROR, "Bad control frame")
+                if opcode == OP_CLOSE:
+                    code = payload[:2] if len(payload) >= 2 else b""
+                    if not self.close_sent:
+                        self.close_sent = True
+                        self.stream.write(control_frame(OP_CLOSE, code))
+                    return
+                if opcode == OP_PING:
+                    self.stream.write(control_frame(OP_PONG, payload))
+                elif opcode != OP_PONG:
+                    raise WebSocketError(CLOSE_PROTOCOL_ERROR, "Unknown opcode")
+                continue
+
+            if opcode == OP_CONTINUATION:
+                if not message_opcode:
+                    raise WebSocketError(CLOSE_PROTOCOL_ERROR, "Nothing to continue")
+            elif opcode in (OP_TEXT, OP_BINARY):
+                if message_opcode:
+                    raise WebSocketError(CLOSE_PROTOCOL_ERROR, "Expected continuation")
+                message_opcode, compressed = opcode, rsv1
+            else:
+                raise WebSocketError(CLOSE_PROTOCOL_ERROR, "Unknown opcode")
+
+            size += len(payload)
+            if size > self.max_message_size:
+                raise WebSocketError(CLOSE_TOO_BIG, "Message too big")
+            parts.append(payload)
+            if not fin:
+                continue
+
+            message = b"".join(parts)
+            if compressed:
+                message = self._inflate(message)
+            if message_opcode == OP_TEXT:
+                try:
+                    message.decode("utf-8")
+                except UnicodeDecodeError:
+                    raise WebSocketError(CLOSE_INVALID_DATA, "Invalid UTF-8")
+
+            parts, size, message_opcode, compressed = [], 0, 0, False
+            yield message
+
+    def _inflate(self, data: bytes) -> bytes:
+        inflater = self._inflater
+        if inflater is None:
+            raise WebSocketError(CLOSE_PROTOCOL_ERROR, "Compression not negotiated")
+        # Bounded, so a small frame cannot expand into a huge message
+        message = inflater.decompress(data + DEFLATE_TAIL, self.max_message_size + 1)
+        if len(message) > self.max_message_size or inflater.unconsumed_tail:
+            raise WebSocketError(CLOSE_TOO_BIG, "Message too big")
+        return message
+
+    async def pump(self) -> None:
+        try:
+            async for message in self.messages():
+                # One IRC line per message; the trailing CRLF is optional
+                lines = (message.rstrip(b"\r\n") + b"\r\n").split(b"\n")[:-1]
+                if len(lines) > self.max_lines_per_message:
+                    raise WebSocketError(CLOSE_POLICY_VIOLATION, "Too many lines")
+                # Stop reading frames until the line loop catches up
+                await self.lines.wait_writable()
+                for line in lines:
+                    self.lines.feed(line + b"\n")
+        except WebSocketError as e:
+            logger.debug(f"Closing WebSocket: {e}")
+            self.send_close(e.code, str(e))
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            self.lines.feed_eof()
+
+
+def upgrade_error(
+    request: tuple[str, dict[str, str]] | None, listener: WebSocketListenerConfig
+) -> bytes | None:
+    if request is None or request[0] != "GET":
+        return http_response("400 Bad Request")
+
+    headers = request[1]
+    upgrade = headers.get("upgrade", "").lower()
+    connection = headers.get("connection", "").lower()
+    if upgrade != "websocket" or "upgrade" not in connection:
+        return http_response("400 Bad Request")
+    if headers.get("sec-websocket-version") != "13":
+        return http_response("426 Upgrade Required", ["Sec-WebSocket-Version: 13"])
+    if not headers.get("sec-websocket-key"):
+        return http_response("400 Bad Request")
+    if (
+        listener.allowed_origins
+        and headers.get("origin") not in listener.allowed_origins
+    ):
+        return http_response("403 Forbidden")
+    return None
+
+
+async def accept(
+    stream: Connection, listener: WebSocketListenerConfig
+) -> WebSocketConnection | None:
+    """Performs the HTTP upgrade; returns None once a failed client is dropped."""
+    try:
+        data = await asyncio.wait_for(
+            stream.readuntil(b"\r\n\r\n"), listener.handshake_timeout
+        )
+    except (
+        asyncio.TimeoutError,
+        asyncio.IncompleteReadError,
+        asyncio.LimitOverrunError,
+        ConnectionError,
+    ):
+        stream.close()
+        return None
+
+    request = parse_request(data)
+    error = upgrade_error(request, listener)
+    if request is None or error is not None:
+        stream.write(error or http_response("400 Bad Request"))
+        stream.close()
+        return None
+
+    headers = request[1]
+    response = [
+        "Upgrade: websocket",
+        "Connection: Upgrade",
+        f"Sec-WebSocket-Accept: {accept_key(headers['sec-websocket-key'])}",
+    ]
+
+    # Text is assumed when the client names no protocol we support
+    offered = [p.strip() for p in headers.get("sec-websocket-protocol", "").split(",")]
+    protocol = next((p for p in offered if p in (BINARY_PROTOCOL, TEXT_PROTOCOL)), None)
+    if protocol:
+        response.append(f"Sec-WebSocket-Protocol: {protocol}")
+
+    wbits = 0
+    if listener.permessage_deflate:
+        deflate = negotiate_deflate(headers.get("sec-websocket-extensions", ""))
+        if deflate:
+            extension, wbits = deflate
+            response.append(f"Sec-WebSocket-Extensions: {extension}")
+
+    stream.write(http_response("101 Switching Protocols", response))
+    return WebSocketConnection(
+        stream,
+        binary=protocol == BINARY_PROTOCOL,
+        wbits=wbits,
+        max_message_size=listener.max_message_size,
+        max_lines_per_message=listener.max_lines_per_message,
+    )
@@ -1,10 +1,19 @@
 import asyncio
-from collections.abc import AsyncGenerator
+import shutil
+import subprocess
+import time
+from collections.abc import AsyncGenerator, Iterator
+from unittest.mock import AsyncMock, MagicMock
 
 import pytest
 
-from src.config import ServerConfig
+from src.casemapping import casefold
+from src.channel_manager import ChannelManager
+from src.commands import CommandHandler
+from src.config import LimitsConfig, ServerConfig
+from src.limits import set_limits
 from src.server import Server
+from src.user_manager import UserManager
 
 
 @pytest.fixture
@@ -34,3 +43,112 @@ async def running_server(server_config: ServerConfig) -> AsyncGenerator[int, Non
         await server_task
     except asyncio.CancelledError:
         pass
+
+
+@pytest.fixture(scope="session")
+def tls_cert(tmp_path_factory: pytest.TempPathFactory) -> tuple[str, str]:
+    if shutil.which("openssl") is None:
+        pytest.skip("openssl binary is required to generate a test certificate")
+
+    directory = tmp_path_factory.mktemp("tls")
+    certfile = directory / "cert.pem"
+    keyfile = directory / "key.pem"
+    subprocess.run(
+        [
+            "openssl",
+            "req",
+            "-x509",
+            "-newkey",
+            "ec",
+            "-pkeyopt",
+            "ec_paramgen_curve:prime256v1",
+            "-nodes",
+            "-days",
+            "1",
+            "-subj",
+            "/CN=localhost",
+            "-keyout",
+            str(keyfile),
+            "-out",
+            str(certfile),
+        ],
+        check=True,
+        capture_output=True,
+    )
+    return str(certfile), str(keyfile)
+
+
+@pytest.fixture
+def handler_config() -> ServerConfig:
+    # Overridden by test modules that need other settings
+    return ServerConfig(
+        name="test.server", host="127.0.0.1", port=6667, password="password"
+    )
+
+
+@pytest.fixture
+def command_handler(handler_config: ServerConfig) -> Iterator[CommandHandler]:
+    UserManager().users = {}
+    UserManager().watchers = {}
+    ChannelManager().channels = {}
+
+    handler = CommandHandler(handler_config)
+    yield handler
+    handler.close()
+    set_limits(LimitsConfig())
+
+
+def make_session(
+    nickname: str | None = None, host: str = "10.0.0.1", caps: int = 0
+) -> MagicMock:
+    """A ClientSession stand-in; sessions with a nickname count as registered."""
+    session = MagicMock()
+    session.nickname = nickname
+    session.nick_key = casefold(nickname) if nickname else None
+    session.username = nickname.lower() if nickname else None
+    session.realname = f"{nickname} Real" if nickname else None
+    session.host = host
+    session.port = 40000
+    session.hostmask = f"{nickname or '*'}!{session.username or '*'}@{host}"
+    session.server_name = "test.server"
+    session.is_registered = nickname is not None
+    session.is_oper = False
+    session.account = None
+    session.certfp = None
+    session.password_attempt = None
+    session.away = None
+    session.caps = caps
+    session.cap_version = 0
+    session.cap_negotiating = False
+    session.sasl_mechanism = None
+    session.sasl_buffer = ""
+    session.channels = set()
+    session.monitored = {}
+    session.closed = False
+    session.connected_at = time.monotonic()
+    session.send_reply = AsyncMock()
+    session.send_now = AsyncMock()
+    session.send_error = AsyncMock()
+    session.flush = AsyncMock()
+    session.quit = AsyncMock()
+    return session
+
+
+def make_user(
+    command_handler: CommandHandler,
+    nickname: str,
+    host: str = "10.0.0.1",
+    caps: int = 0,
+) -> MagicMock:
+    session = make_session(nickname, host, caps)
+    command_handler.user_manager.add_user(nickname, session)
+    return session
+
+
+def replies(session: MagicMock, code: str) -> list[tuple[str, ...]]:
+    # Relayed lines are sent whole; numerics and commands come in parts
+    return [
+        call.args
+        for call in session.send_reply.call_args_list
+        if call.args[1:2] == (code,)
+    ]
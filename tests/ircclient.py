@@ -18,6 +18,10 @@ class IRCClient:
         await self.writer.drain()
 
         await self.wait_for_message("001")
+        # RPL_ISUPPORT may span several lines; a round trip marks the end of
+        # the registration burst
+        await self.send(f"ISON {self.nick}")
+        await self.wait_for_message(" 303 ")
 
     async def send(self, command: str) -> None:
         if self.writer:
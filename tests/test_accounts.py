@@ -0,0 +1,101 @@
+from pathlib import Path
+from unittest.mock import AsyncMock
+
+import pytest
+
+from src.accounts import (
+    Account,
+    CachingAccountStore,
+    MemoryAccountStore,
+    SQLiteAccountStore,
+    create_account_store,
+)
+from src.auth import hash_password, verify_password
+from src.config import AccountsConfig
+
+
+@pytest.fixture
+def account() -> Account:
+    return Account("Alice", "sha256$00$ff", ("AB12",))
+
+
+@pytest.mark.asyncio
+async def test_memory_store_lookups_are_case_insensitive(account: Account) -> None:
+    store = MemoryAccountStore([account])
+
+    assert await store.get("alice") == account
+    assert await store.get("ALICE") == account
+    assert await store.find_by_certfp("ab12") == account
+    assert await store.get("bob") is None
+
+
+@pytest.mark.asyncio
+async def test_sqlite_store_persists_accounts(tmp_path: Path, account: Account) -> None:
+    path = str(tmp_path / "accounts.db")
+    store = SQLiteAccountStore(path)
+    store.add_account(account)
+    store.close()
+
+    reopened = SQLiteAccountStore(path)
+    assert await reopened.get("alice") == Account("Alice", "sha256$00$ff", ("ab12",))
+    assert await reopened.find_by_certfp("AB12") is not None
+    assert await reopened.find_by_certfp("ffff") is None
+    reopened.close()
+
+
+@pytest.mark.asyncio
+async def test_caching_store_hits_backend_once(account: Account) -> None:
+    inner = MemoryAccountStore([account])
+    inner.get = AsyncMock(return_value=account)  # type: ignore
+    store = CachingAccountStore(inner, size=10, ttl=60.0)
+
+    assert await store.get("alice") == account
+    assert await store.get("Alice") == account
+    inner.get.assert_awaited_once()
+
+    store.invalidate()
+    await store.get("alice")
+    assert inner.get.await_count == 2
+
+
+@pytest.mark.asyncio
+async def test_caching_store_evicts_oldest() -> None:
+    store = CachingAccountStore(MemoryAccountStore(), size=2, ttl=60.0)
+
+    for name in ("a", "b", "c"):
+        await store.get(name)
+
+    assert len(store._cache) == 2
+    assert "name:a" not in store._cache
+
+
+def test_create_account_store_from_config(tmp_path: Path) -> None:
+    memory = create_account_store(
+        AccountsConfig(accounts={"alice": {"password": "x", "certfp": ["ab"]}})
+    )
+    assert isinstance(memory, MemoryAccountStore)
+    assert "alice" in memory.accounts
+
+    sqlite = create_account_store(
+        AccountsConfig(backend="sqlite", path=str(tmp_path / "a.db"))
+    )
+    assert isinstance(sqlite, CachingAccountStore)
+    sqlite.close()
+
+    with pytest.raises(ValueError, match="Unknown account store"):
+        create_account_store(AccountsConfig(backend="ldap"))
+
+
+def test_plaintext_memory_passwords_can_log_in() -> None:
+    hashed = hash_password("secret", n=2**10)
+    store = create_account_store(
+        AccountsConfig(
+            accounts={"alice": {"password": "secret"}, "bob": {"password": hashed}}
+        )
+    )
+    assert isinstance(store, MemoryAccountStore)
+
+    alice = store.accounts["alice"]
+    assert alice.password_hash != "secret"
+    assert verify_password("secret", alice.password_hash)
+    assert store.accounts["bob"].password_hash == hashed
@@ -0,0 +1,105 @@
+import asyncio
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+
+from src.auth import (
+    AuthBusyError,
+    Authenticator,
+    hash_password,
+    protect_plaintext,
+    verify_password,
+)
+from src.commands import CommandHandler
+from src.config import AuthConfig, ServerConfig
+
+
+@pytest.fixture
+def stored() -> str:
+    return hash_password("hunter2", n=2**10)
+
+
+def test_hash_and_verify_roundtrip(stored: str) -> None:
+    assert stored.startswith("scrypt$1024$")
+    assert verify_password("hunter2", stored) is True
+    assert verify_password("hunter3", stored) is False
+
+
+def test_plaintext_is_never_stored_as_is() -> None:
+    stored = protect_plaintext("password")
+
+    assert "password" not in stored
+    assert verify_password("password", stored) is True
+    assert verify_password("Password", stored) is False
+
+
+def test_verify_rejects_malformed_hashes() -> None:
+    assert verify_password("x", "scrypt$not$a$hash") is False
+    assert verify_password("x", "md5$abc") is False
+
+
+@pytest.mark.asyncio
+async def test_verify_runs_in_executor_and_caches(stored: str) -> None:
+    auth = Authenticator(AuthConfig())
+
+    with patch("src.auth.verify_password", wraps=verify_password) as spy:
+        assert await auth.verify("hunter2", stored) is True
+        assert await auth.verify("hunter2", stored) is True
+        assert spy.call_count == 1
+
+        assert await auth.verify("wrong", stored) is False
+        assert await auth.verify("wrong", stored) is False
+        assert spy.call_count == 3
+
+    auth.close()
+
+
+@pytest.mark.asyncio
+async def test_verify_limits_pending_checks(stored: str) -> None:
+    auth = Authenticator(AuthConfig(workers=1, max_pending=1))
+
+    first = asyncio.create_task(auth.verify("hunter2", stored))
+    await asyncio.sleep(0)
+
+    with pytest.raises(AuthBusyError):
+        await auth.verify("other", stored)
+
+    assert await first is True
+    assert auth.pending == 0
+    auth.close()
+
+
+@pytest.mark.asyncio
+async def test_server_password_accepts_hashed_config(stored: str) -> None:
+    auth = Authenticator(AuthConfig(), stored)
+
+    assert await auth.verify_server_password("hunter2") is True
+    assert await auth.verify_server_password(None) is False
+    auth.close()
+
+
+@pytest.mark.asyncio
+async def test_registration_rejected_when_auth_is_busy() -> None:
+    config = ServerConfig(
+        name="test.server", host="127.0.0.1", port=6667, password="password"
+    )
+    handler = CommandHandler(config)
+    handler.authenticator.verify_server_password = AsyncMock(  # type: ignore
+        side_effect=AuthBusyError()
+    )
+
+    session = MagicMock()
+    session.nickname = "Michal"
+    session.username = "michal"
+    session.is_registered = False
+    session.cap_negotiating = False
+    session.account = None
+    session.send_error = AsyncMock()
+    session.quit = AsyncMock()
+
+    await handler.check_registration(session)
+
+    session.send_error.assert_called_with(
+        "263", "PASS", ":Server busy, try again later"
+    )
+    session.quit.assert_called_once()
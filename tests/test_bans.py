@@ -0,0 +1,209 @@
+import asyncio
+import ipaddress
+import json
+import time
+from pathlib import Path
+
+import pytest
+from conftest import make_session, make_user
+
+from src.bans import BanEngine, CIDRTrie, normalize_ban_mask, parse_network
+from src.commands import CommandHandler
+from src.config import BansConfig, ServerConfig
+from src.protocol import IRCMessage
+from src.server import Server
+
+
+@pytest.fixture
+def engine() -> BanEngine:
+    return BanEngine(BansConfig())
+
+
+@pytest.fixture
+def handler_config() -> ServerConfig:
+    return ServerConfig(
+        name="test.server",
+        host="127.0.0.1",
+        port=6667,
+        password="password",
+        opers={"admin": "secret"},
+    )
+
+
+def test_normalize_ban_mask() -> None:
+    assert normalize_ban_mask("Evil.Host") == "*@evil.host"
+    assert normalize_ban_mask("bob@10.0.0.0/8") == "bob@10.0.0.0/8"
+
+
+def test_cidr_trie_finds_all_containing_networks() -> None:
+    trie = CIDRTrie()
+    for mask in ("10.0.0.0/8", "10.1.0.0/16", "10.1.2.3", "2001:db8::/32"):
+        network = parse_network(mask)
+        assert network is not None
+        trie.insert(network, mask)
+
+    assert trie.lookup(ipaddress.ip_address("10.1.2.3")) == [
+        "10.0.0.0/8",
+        "10.1.0.0/16",
+        "10.1.2.3",
+    ]
+
+    assert trie.lookup(ipaddress.ip_address("2001:db8::1")) == ["2001:db8::/32"]
+
+
+def test_check_matches_networks_and_wildcards(engine: BanEngine) -> None:
+    engine.add("K", "*@192.168.0.0/16", "lan", "admin")
+    engine.add("K", "bot*@10.0.0.1", "bots", "admin")
+    engine.add("G", "*@*.example.com", "spam", "admin")
+
+    assert engine.check(None, "192.168.4.2") is not None
+    assert engine.check(None, "10.0.0.1") is None
+    ban = engine.check("botnet", "10.0.0.1")
+    assert ban is not None and ban.reason == "bots"
+    assert engine.check("user", "10.0.0.1") is None
+    assert engine.check(None, "shell.EXAMPLE.com") is not None
+    assert engine.check(None, "example.org") is None
+
+    assert engine.remove("*@192.168.0.0/16") is not None
+    assert engine.check(None, "192.168.4.2") is None
+
+
+def test_user_patterns_are_not_matched_before_registration(
+    engine: BanEngine,
+) -> None:
+    engine.add("K", "?@*.example.com", "one letter", "admin")
+    engine.add("K", "*@*.example.com", "anyone", "admin")
+    engine.remove("*@*.example.com")
+
+    assert engine.check(None, "shell.example.com") is None
+    ban = engine.check("x", "shell.example.com")
+    assert ban is not None and ban.reason == "one letter"
+    assert engine.check("xy", "shell.example.com") is None
+
+
+def test_user_pattern_bans_are_indexed_by_user_prefix(engine: BanEngine) -> None:
+    for i in range(5_000):
+        engine.add("K", f"bot{i}x@*", "mass", "admin")
+
+    assert len(engine._user_masks._candidates("*", "any.host", "bot7x")) == 1
+    assert engine.check("bot7x", "any.host") is not None
+    assert engine.check("bot7y", "any.host") is None
+
+
+def test_expired_ban_does_not_hide_a_live_one(
+    engine: BanEngine, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    short = engine.add("K", "*@*.example.com", "short", "admin", duration=60)
+    engine.add("K", "*@*shell.example.com", "live", "admin")
+    assert short.expires_at is not None
+
+    expires_at = short.expires_at
+    monkeypatch.setattr(time, "time", lambda: expires_at + 1)
+    ban = engine.check(None, "shell.example.com")
+    assert ban is not None and ban.reason == "live"
+
+
+def test_expired_bans_are_removed_in_order(engine: BanEngine) -> None:
+    first = engine.add("K", "*@10.0.0.1", "short", "admin", duration=60)
+    engine.add("K", "*@10.0.0.2", "long", "admin", duration=3600)
+
+    assert first.expires_at is not None
+    assert engine.expire(first.expires_at) == [first]
+    assert engine.check(None, "10.0.0.1") is None
+    assert engine.check(None, "10.0.0.2") is not None
+
+
+@pytest.mark.asyncio
+async def test_expiry_timer_fires(engine: BanEngine) -> None:
+    engine.add("K", "*@10.0.0.1", "short", "admin", duration=0.01)
+    await asyncio.sleep(0.05)
+
+    assert len(engine) == 0
+    engine.close()
+
+
+def test_bans_survive_restart(tmp_path: Path) -> None:
+    path = str(tmp_path / "bans.json")
+    engine = BanEngine(BansConfig(path=path))
+    engine.add("G", "*@203.0.113.0/24", "abuse", "admin")
+    engine.add("K", "*@old.host", "gone", "admin", duration=60)
+    engine.close()
+
+    entries = json.loads(Path(path).read_text())
+    assert {entry["mask"] for entry in entries} == {"*@203.0.113.0/24", "*@old.host"}
+
+    # Expired entries are dropped on load
+    entries[1]["expires_at"] = 1.0
+    Path(path).write_text(json.dumps(entries))
+
+    restored = BanEngine(BansConfig(path=path))
+    ban = restored.check(None, "203.0.113.7")
+    assert ban is not None and ban.kind == "G"
+    assert restored.check(None, "old.host") is None
+
+
+def test_check_cost_does_not_grow_with_ban_count(engine: BanEngine) -> None:
+    for i in range(20_000):
+        engine.add("K", f"*@10.{i // 256}.{i % 256}.0/24", "mass", "admin")
+        engine.add("K", f"*@host{i}.example.net", "mass", "admin")
+
+    assert len(engine._networks.lookup(ipaddress.ip_address("10.3.4.5"))) == 1
+    assert len(engine._masks._candidates("*", "host7.example.net")) == 1
+    assert engine.check(None, "10.3.4.5") is not None
+    assert engine.check(None, "11.0.0.1") is None
+
+
+@pytest.mark.asyncio
+async def test_kline_requires_oper_and_disconnects_matches(
+    command_handler: CommandHandler,
+) -> None:
+    admin = make_session("Admin", "127.0.0.1")
+    victim = make_user(command_handler, "Troll", "198.51.100.7")
+
+    await command_handler.handle(admin, IRCMessage("KLINE", ["*@198.51.100.0/24"]))
+    admin.send_error.assert_called_with(
+        "481", ":Permission Denied- You're not an IRC operator"
+    )
+
+    await command_handler.handle(admin, IRCMessage("OPER", ["admin", "wrong"]))
+    admin.send_error.assert_called_with("464", ":Password incorrect")
+
+    await command_handler.handle(admin, IRCMessage("OPER", ["admin", "secret"]))
+    admin.send_error.assert_called_with("381", ":You are now an IRC operator")
+    assert admin.is_oper
+
+    await command_handler.handle(
+        admin, IRCMessage("KLINE", ["10", "*@198.51.100.0/24", "flooding"])
+    )
+
+    victim.send_error.assert_called_once_with(
+        "465", ":You are banned from this server (flooding)"
+    )
+    victim.quit.assert_called_once()
+    ban = command_handler.bans.check(None, "198.51.100.9")
+    assert ban is not None and ban.expires_at is not None
+
+    await command_handler.handle(admin, IRCMessage("UNKLINE", ["*@198.51.100.0/24"]))
+    assert command_handler.bans.check(None, "198.51.100.9") is None
+    command_handler.close()
+
+
+@pytest.mark.asyncio
+async def test_banned_connection_is_rejected_on_accept() -> None:
+    config = ServerConfig(name="test.irc", host="127.0.0.1", port=0, password="")
+    server = Server(config)
+    server.command_handler.bans.add("K", "*@127.0.0.1", "local", "admin")
+
+    listener = await asyncio.start_server(server.handle_client, "127.0.0.1", 0)
+    port = listener.sockets[0].getsockname()[1]
+
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    data = await asyncio.wait_for(reader.read(), timeout=2)
+
+    assert b" 465 * :You are banned from this server (local)" in data
+    assert b"ERROR :Closing Link" in data
+
+    writer.close()
+    listener.close()
+    await listener.wait_closed()
+    server.command_handler.close()
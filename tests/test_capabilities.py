@@ -0,0 +1,125 @@
+import pytest
+from conftest import make_session
+
+from src.capabilities import (
+    CAPABILITIES,
+    ECHO_MESSAGE,
+    MESSAGE_TAGS,
+    SASL,
+    SERVER_TIME,
+    TAG_CAPS,
+    CapabilityRegistry,
+    chunk_tokens,
+    format_tags,
+    tagged,
+)
+from src.channel import Channel
+from src.commands import CommandHandler
+from src.protocol import IRCParser
+
+
+def test_registry_assigns_distinct_bits() -> None:
+    registry = CapabilityRegistry()
+    first = registry.register("a")
+    second = registry.register("b", "x")
+
+    assert first == 1 and second == 2
+    assert registry.advertise(301) == ["a", "b"]
+    assert registry.advertise(302) == ["a", "b=x"]
+    assert registry.names(first | second) == ["a", "b"]
+
+    with pytest.raises(ValueError, match="already registered"):
+        registry.register("a")
+
+
+def test_parse_request_is_all_or_nothing() -> None:
+    assert CAPABILITIES.parse_request("sasl -server-time") == (SASL, SERVER_TIME)
+    assert CAPABILITIES.parse_request("sasl unknown") is None
+
+
+def test_tagged_renders_each_variant() -> None:
+    render = tagged(":a PRIVMSG #c :hi", {"+typing": "active"})
+
+    assert render(0) == ":a PRIVMSG #c :hi"
+    assert render(SERVER_TIME).startswith("@time=")
+    assert render(MESSAGE_TAGS) == "@+typing=active :a PRIVMSG #c :hi"
+
+
+def test_format_tags_escapes_values() -> None:
+    assert format_tags({"+a": "x y;z", "flag": ""}) == "+a=x\\sy\\:z;flag"
+
+
+def test_chunk_tokens_respects_limit() -> None:
+    assert chunk_tokens(["aaa", "bbb", "ccc"], 7) == ["aaa bbb", "ccc"]
+
+
+@pytest.mark.asyncio
+async def test_broadcast_variants_renders_once_per_group() -> None:
+    channel = Channel("#test")
+    plain = [make_session(f"p{i}") for i in range(3)]
+    timed = [make_session(f"t{i}", caps=SERVER_TIME | ECHO_MESSAGE) for i in range(3)]
+    for member in plain + timed:
+        channel.add_user(member)
+
+    calls: list[int] = []
+
+    def render(caps: int) -> str:
+        calls.append(caps)
+        return f"variant {caps}"
+
+    await channel.broadcast_variants(render, TAG_CAPS)
+
+    assert sorted(calls) == [0, SERVER_TIME]
+    plain[0].send_reply.assert_called_once_with("variant 0")
+    timed[0].send_reply.assert_called_once_with(f"variant {SERVER_TIME}")
+
+
+@pytest.mark.asyncio
+async def test_cap_req_ack_and_list(command_handler: CommandHandler) -> None:
+    session = make_session("Michal")
+
+    await command_handler.handle(
+        session, IRCParser.parse("CAP REQ :server-time echo-message")
+    )
+    session.send_reply.assert_called_with(
+        ":test.server", "CAP", "Michal", "ACK", ":server-time echo-message"
+    )
+    assert session.caps == SERVER_TIME | ECHO_MESSAGE
+
+    await command_handler.handle(session, IRCParser.parse("CAP LIST"))
+    session.send_reply.assert_called_with(
+        ":test.server", "CAP", "Michal", "LIST", ":echo-message server-time"
+    )
+
+
+@pytest.mark.asyncio
+async def test_echo_message_returns_privmsg_to_sender(
+    command_handler: CommandHandler,
+) -> None:
+    sender = make_session("Michal", caps=ECHO_MESSAGE)
+    receiver = make_session("Hubert")
+    command_handler.user_manager.users["hubert"] = receiver
+
+    await command_handler.handle(sender, IRCParser.parse("PRIVMSG Hubert :hi"))
+
+    receiver.send_reply.assert_called_once_with(":Michal PRIVMSG Hubert :hi")
+    sender.send_reply.assert_called_once_with(":Michal PRIVMSG Hubert :hi")
+
+
+@pytest.mark.asyncio
+async def test_tagmsg_only_reaches_message_tags_clients(
+    command_handler: CommandHandler,
+) -> None:
+    channel = command_handler.channel_manager.get_or_create_channel("#test")
+    sender = make_session("Michal", caps=MESSAGE_TAGS)
+    capable = make_session("Hubert", caps=MESSAGE_TAGS)
+    legacy = make_session("Kacper")
+    for member in (sender, capable, legacy):
+        channel.add_user(member)
+
+    await command_handler.handle(
+        sender, IRCParser.parse("@+typing=active TAGMSG #test")
+    )
+
+    capable.send_reply.assert_called_once_with("@+typing=active :Michal TAGMSG #test")
+    legacy.send_reply.assert_not_called()
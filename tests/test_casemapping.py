@@ -0,0 +1,103 @@
+import asyncio
+from collections.abc import Iterator
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+
+from src.casemapping import (
+    DEFAULT_CASEMAPPING,
+    casefold,
+    casemapping,
+    set_casemapping,
+)
+from src.channel_manager import ChannelManager
+from src.commands import CommandHandler
+from src.config import ServerConfig
+from src.protocol import IRCMessage
+from src.session import ClientSession
+from src.user_manager import UserManager
+
+
+@pytest.fixture(autouse=True)
+def restore_casemapping() -> Iterator[None]:
+    yield
+    set_casemapping(DEFAULT_CASEMAPPING)
+
+
+@pytest.mark.parametrize(
+    ("name", "folded"),
+    [
+        ("ascii", "nick[a]\\~"),
+        ("strict-rfc1459", "nick{a}|~"),
+        ("rfc1459", "nick{a}|^"),
+    ],
+)
+def test_casemappings_fold_their_own_characters(name: str, folded: str) -> None:
+    set_casemapping(name)
+
+    assert casemapping() == name
+    assert casefold("NICK[A]\\~") == folded
+
+
+def test_unknown_casemapping_is_rejected() -> None:
+    with pytest.raises(ValueError, match="Unknown casemapping"):
+        set_casemapping("unicode")
+
+
+def test_session_keeps_casefolded_nick() -> None:
+    writer = MagicMock()
+    writer.get_extra_info.return_value = ("127.0.0.1", 1234)
+    session = ClientSession(MagicMock(spec=asyncio.StreamReader), writer, "srv")
+
+    session.nickname = "Wojtek[PL]"
+    assert session.nick_key == "wojtek{pl}"
+
+    session.nickname = None
+    assert session.nick_key is None
+
+
+def test_channel_lookup_uses_casemapping() -> None:
+    manager = ChannelManager()
+    manager.channels = {}
+
+    channel = manager.create_channel("#Polska[PL]")
+
+    assert channel.name_key == "#polska{pl}"
+    assert manager.get_channel("#POLSKA{pl}") is channel
+
+
+@pytest.mark.asyncio
+async def test_isupport_is_sent_after_welcome() -> None:
+    UserManager().users = {}
+    config = ServerConfig(
+        name="test.server",
+        host="127.0.0.1",
+        port=6667,
+        password="",
+        casemapping="ascii",
+    )
+    handler = CommandHandler(config)
+
+    session = MagicMock()
+    session.server_name = "test.server"
+    session.host = "127.0.0.1"
+    session.nickname = None
+    session.username = None
+    session.is_registered = False
+    session.cap_negotiating = False
+    session.account = None
+    session.send_reply = AsyncMock()
+    session.send_error = AsyncMock()
+
+    await handler.handle(session, IRCMessage("NICK", ["Wojtek"]))
+    await handler.handle(session, IRCMessage("USER", ["w", "0", "*", "W"]))
+
+    assert session.send_reply.call_args.args[1] == "005"
+    # The tokens no longer fit on one line
+    lines = [
+        call.args for call in session.send_reply.call_args_list if call.args[1] == "005"
+    ]
+    assert len(lines) == 2
+    assert "CASEMAPPING=ascii" in lines[0]
+    assert all(line[-1] == ":are supported by this server" for line in lines)
+    handler.close()
@@ -1,7 +1,10 @@
+import asyncio
+from collections.abc import Callable
 from unittest.mock import AsyncMock, MagicMock
 
 import pytest
 
+from src.capabilities import BATCH
 from src.channel import Channel
 
 
@@ -97,3 +100,147 @@ async def test_broadcast_with_skip_user(
 
     recipient.send_reply.assert_called_once_with("Secret message")
     mock_session.send_reply.assert_not_called()
+
+
+def named(nickname: str) -> MagicMock:
+    session = MagicMock()
+    session.nickname = nickname
+    session.channels = set()
+    return session
+
+
+def test_names_lines_are_chunked_within_budget(channel: Channel) -> None:
+    members = [named(f"user{i:04d}") for i in range(100)]
+    for member in members:
+        channel.add_user(member)
+
+    lines = channel.names_lines(50)
+
+    assert len(lines) > 1
+    assert all(len(line) <= 50 for line in lines)
+    assert " ".join(lines).split() == ["@user0000"] + [
+        f"user{i:04d}" for i in range(1, 100)
+    ]
+
+
+def test_names_lines_follow_joins_parts_and_renames(channel: Channel) -> None:
+    alice, bob, carol = named("alice"), named("bob"), named("carol")
+    channel.add_user(alice)
+    channel.add_user(bob)
+    assert channel.names_lines(100) == ["@alice bob"]
+
+    channel.add_user(carol)
+    bob.nickname = "robert"
+    channel.refresh_names(bob)
+    assert channel.names_lines(100) == ["@alice robert carol"]
+
+    channel.remove_user(alice)
+    assert channel.names_lines(100) == ["@robert carol"]
+    assert channel not in alice.channels
+
+
+def test_voice_and_op_prefixes_in_names(channel: Channel) -> None:
+    alice, bob = named("alice"), named("bob")
+    channel.add_user(alice)
+    channel.add_user(bob)
+    assert channel.names_lines(100, multi_prefix=True) == ["@alice bob"]
+
+    assert channel.set_voice(alice, True)
+    assert channel.set_voice(bob, True)
+    assert not channel.set_voice(bob, True)
+    assert channel.names_lines(100) == ["@alice +bob"]
+    assert channel.names_lines(100, multi_prefix=True) == ["@+alice +bob"]
+
+    channel.set_operator(alice, False)
+    assert channel.names_lines(100) == ["+alice +bob"]
+
+
+def test_mode_string_hides_key_from_outsiders(channel: Channel) -> None:
+    channel.key = "secret"
+    channel.limit = 10
+
+    assert channel.mode_string() == ["+ntkl", "secret", "10"]
+    assert channel.mode_string(show_key=False) == ["+ntkl", "*", "10"]
+
+
+def test_names_lines_reuse_cached_chunks(channel: Channel) -> None:
+    for i in range(10):
+        channel.add_user(named(f"u{i}"))
+
+    first = channel.names_lines(20)
+    second = channel.names_lines(20)
+
+    assert all(a is b for a, b in zip(first, second))
+
+
+def test_names_lines_compact_after_many_parts(channel: Channel) -> None:
+    members = [named(f"user{i:03d}") for i in range(200)]
+    for member in members:
+        channel.add_user(member)
+    channel.names_lines(30)
+
+    for member in members[:190]:
+        channel.remove_user(member)
+
+    lines = channel.names_lines(30)
+    assert len(lines) == 4
+    assert len(" ".join(lines).split()) == 10
+
+
+def joiner(nickname: str, caps: int = 0) -> MagicMock:
+    session = named(nickname)
+    session.caps = caps
+    session.server_name = "test.server"
+    session.send_reply = AsyncMock()
+    return session
+
+
+def join_line(session: MagicMock) -> Callable[[int], str]:
+    return lambda caps: f":{session.nickname} JOIN #test"
+
+
+@pytest.mark.asyncio
+async def test_batched_joins_are_sent_together(channel: Channel) -> None:
+    channel.join_window = 0.01
+    old, batching = joiner("old"), joiner("batcher", BATCH)
+    for member in (old, batching):
+        channel.add_user(member)
+
+    newcomers = [joiner(f"new{i}") for i in range(3)]
+    for newcomer in newcomers:
+        channel.add_user(newcomer)
+        await channel.announce_join(newcomer, join_line(newcomer))
+
+    old.send_reply.assert_not_called()
+    await asyncio.sleep(0.05)
+
+    assert [c.args[0] for c in old.send_reply.call_args_list] == [
+        ":new0 JOIN #test",
+        ":new1 JOIN #test",
+        ":new2 JOIN #test",
+    ]
+
+    sent = [c.args for c in batching.send_reply.call_args_list]
+    assert sent[0][1:4] == ("BATCH", sent[0][2], "pyirc/joins")
+    assert sent[1][0].startswith(f"@batch={sent[0][2][1:]} ")
+    assert sent[-1][1] == "BATCH"
+
+    # Each newcomer saw its own JOIN at once and only later joiners after
+    assert newcomers[0].send_reply.call_count == 3
+    assert newcomers[2].send_reply.call_count == 1
+
+
+@pytest.mark.asyncio
+async def test_quiet_joins_are_revealed_on_first_message(channel: Channel) -> None:
+    channel.quiet_joins = True
+    old, lurker = joiner("old"), joiner("lurker")
+    channel.add_user(old)
+    channel.add_user(lurker)
+
+    await channel.announce_join(lurker, join_line(lurker))
+    old.send_reply.assert_not_called()
+    assert not channel.is_announced(lurker)
+
+    await channel.reveal(lurker)
+    old.send_reply.assert_called_once_with(":lurker JOIN #test")
+    assert channel.is_announced(lurker)
@@ -1,8 +1,9 @@
+import time
 from unittest.mock import MagicMock
 
 import pytest
 
-from src.channel_manager import ChannelManager
+from src.channel_manager import ChannelLimitError, ChannelManager, ListFilter
 
 
 @pytest.fixture
@@ -16,6 +17,7 @@ def channel_manager() -> ChannelManager:
 def mock_session() -> MagicMock:
     session = MagicMock()
     session.nickname = "Wojtek"
+    session.channels = set()
     return session
 
 
@@ -77,3 +79,148 @@ def test_remove_user_from_all_channels_and_cleanup(
 
     assert channel_manager.channel_exists("#empty") is False
     assert len(channel_manager.channels) == 1
+
+
+def test_channels_by_size_follows_membership(
+    channel_manager: ChannelManager,
+) -> None:
+    small = channel_manager.create_channel("#small")
+    big = channel_manager.create_channel("#big")
+    empty = channel_manager.create_channel("#empty")
+    members = [MagicMock() for _ in range(3)]
+    for member in members:
+        member.channels = set()
+        big.add_user(member)
+    small.add_user(members[0])
+
+    assert list(channel_manager.channels_by_size()) == [big, small, empty]
+    assert list(channel_manager.channels_by_size(min_users=1, max_users=2)) == [small]
+
+    big.remove_user(members[1])
+    big.remove_user(members[2])
+    assert list(channel_manager.channels_by_size(min_users=1)) == [small, big]
+
+
+def test_list_filter_parses_elist_conditions() -> None:
+    query = ListFilter.parse(
+        [">2", "<10", "C<60", "T>5", "#py*", "!#pyirc"], now=1000.0
+    )
+
+    assert query.min_users == 3
+    assert query.max_users == 9
+    assert query.created_after == 1000.0 - 3600
+    assert query.topic_before == 1000.0 - 300
+    assert len(query.masks) == 1 and len(query.excluded) == 1
+
+
+def test_list_channels_applies_filters(channel_manager: ChannelManager) -> None:
+    python = channel_manager.create_channel("#python")
+    pyirc = channel_manager.create_channel("#pyirc")
+    rust = channel_manager.create_channel("#rust")
+    for channel, size in ((python, 3), (pyirc, 3), (rust, 5)):
+        for _ in range(size):
+            member = MagicMock()
+            member.channels = set()
+            channel.add_user(member)
+    python.topic = "Python talk"
+    python.topic_set_at = time.time() - 600
+
+    def listed(*tokens: str) -> list[str]:
+        query = ListFilter.parse(tokens)
+        return [channel.name for channel in channel_manager.list_channels(query)]
+
+    assert listed() == ["#rust", "#python", "#pyirc"]
+    assert listed(">3") == ["#rust"]
+    assert listed("<4", "!#pyirc") == ["#python"]
+    assert listed("#py*") == ["#python", "#pyirc"]
+    assert listed("T>5") == ["#python"]
+    assert listed("T<5") == []
+    assert listed("C>1") == []
+    assert listed("#PyIrc", ">1") == ["#pyirc"]
+
+
+def test_channel_is_deleted_when_last_member_leaves(
+    channel_manager: ChannelManager,
+) -> None:
+    channel = channel_manager.create_channel("#short")
+    member = MagicMock()
+    member.channels = set()
+
+    channel.add_user(member)
+    channel.remove_user(member)
+
+    assert not channel_manager.channel_exists("#short")
+    assert list(channel_manager.channels_by_size()) == []
+
+
+def test_max_channels_caps_creation(channel_manager: ChannelManager) -> None:
+    channel_manager.max_channels = 2
+    try:
+        channel_manager.create_channel("#one")
+        channel_manager.create_channel("#two")
+        with pytest.raises(ChannelLimitError):
+            channel_manager.create_channel("#three")
+    finally:
+        channel_manager.max_channels = 0
+
+    assert len(channel_manager.channels) == 2
+
+
+def test_refusals_are_counted_and_rarely_logged(
+    channel_manager: ChannelManager,
+    monkeypatch: pytest.MonkeyPatch,
+    caplog: pytest.LogCaptureFixture,
+) -> None:
+    def no_scan() -> int:
+        raise AssertionError("memory_usage() scans every channel")
+
+    monkeypatch.setattr(channel_manager, "memory_usage", no_scan)
+    monkeypatch.setattr(channel_manager, "max_channels", 1)
+    monkeypatch.setattr(channel_manager, "refused", 0)
+    monkeypatch.setattr(channel_manager, "_warned_at", 0.0)
+    channel_manager.create_channel("#one")
+
+    for i in range(100):
+        with pytest.raises(ChannelLimitError):
+            channel_manager.create_channel(f"#other{i}")
+
+    assert channel_manager.refused == 100
+    warnings = [r for r in caplog.records if "Channel limit" in r.message]
+    assert len(warnings) == 1
+
+
+def test_memory_usage_follows_channel_state(channel_manager: ChannelManager) -> None:
+    channel = channel_manager.create_channel("#measured")
+    empty = channel_manager.memory_usage()
+    assert empty == channel.memory_usage() > 0
+
+    for i in range(50):
+        member = MagicMock()
+        member.nickname = f"user{i}"
+        member.channels = set()
+        channel.add_user(member)
+        channel.bans.add(f"*!*@host{i}.example.com")
+    channel.names_lines(400, False)
+
+    assert channel_manager.memory_usage() > empty + 50 * 100
+
+
+def test_common_peers_are_deduplicated(channel_manager: ChannelManager) -> None:
+    session, friend, other, quiet = (MagicMock() for _ in range(4))
+    for member in (session, friend, other, quiet):
+        member.channels = set()
+        member.caps = 0
+    friend.caps = 1
+
+    for name in ("#a", "#b", "#c"):
+        channel = channel_manager.get_or_create_channel(name)
+        channel.add_user(session)
+        channel.add_user(friend)
+    channel.add_user(other)
+    hidden = channel_manager.get_or_create_channel("#hidden")
+    hidden.add_user(quiet)
+    hidden.add_user(session)
+    hidden.unannounced[session] = lambda caps: ""
+
+    assert channel_manager.common_peers(session) == {friend, other}
+    assert channel_manager.common_peers(session, required_caps=1) == {friend}
@@ -1,36 +1,17 @@
 from unittest.mock import ANY, AsyncMock, MagicMock
 
 import pytest
+from conftest import make_session, make_user
 
 from src.channel_manager import ChannelManager
 from src.commands import CommandHandler
-from src.config import ServerConfig
 from src.protocol import IRCMessage
 from src.user_manager import UserManager
 
 
-@pytest.fixture
-def command_handler() -> CommandHandler:
-    UserManager().users = {}
-    ChannelManager().channels = {}
-
-    config = ServerConfig(
-        name="test.server", host="127.0.0.1", port=6667, password="password"
-    )
-    return CommandHandler(config)
-
-
 @pytest.fixture
 def registered_session() -> MagicMock:
-    session = MagicMock()
-    session.nickname = "Michal"
-    session.username = "michal"
-    session.host = "127.0.0.1"
-    session.is_registered = True
-    session.send_reply = AsyncMock()
-    session.send_error = AsyncMock()
-    session.quit = AsyncMock()
-    return session
+    return make_session("Michal", "127.0.0.1")
 
 
 @pytest.mark.asyncio
@@ -40,6 +21,8 @@ async def test_registration_fail_bad_password(command_handler: CommandHandler) -
     session.username = "michal"
     session.password_attempt = "wrong_password"
     session.is_registered = False
+    session.cap_negotiating = False
+    session.account = None
     session.send_error = AsyncMock()
     session.quit = AsyncMock()
 
@@ -116,6 +99,7 @@ async def test_privmsg_broadcast_to_channel_members(
 
     hubert_session = MagicMock()
     hubert_session.nickname = "Hubert"
+    hubert_session.caps = 0
     hubert_session.send_reply = AsyncMock()
     channel.add_user(hubert_session)
 
@@ -172,6 +156,7 @@ async def test_kick_success_as_operator(
 
     victim_session = MagicMock()
     victim_session.nickname = "Victim"
+    victim_session.caps = 0
     victim_session.send_reply = AsyncMock()
     command_handler.user_manager.users["victim"] = victim_session
     channel.add_user(victim_session)
@@ -226,3 +211,372 @@ async def test_kick_fail_user_not_in_channel(
     await command_handler.handle(registered_session, msg)
 
     registered_session.send_error.assert_called_with("441", "Random", channel_name, ANY)
+
+
+@pytest.mark.asyncio
+async def test_join_multiple_channels_with_keys(
+    command_handler: CommandHandler, registered_session: MagicMock
+) -> None:
+    locked = command_handler.channel_manager.get_or_create_channel("#locked")
+    locked.key = "secret"
+
+    msg = IRCMessage("JOIN", ["#a,#locked,#b", "x,secret"])
+    await command_handler.handle(registered_session, msg)
+
+    for name in ("#a", "#locked", "#b"):
+        channel = command_handler.channel_manager.get_channel(name)
+        assert channel is not None
+        assert registered_session in channel.members
+
+
+@pytest.mark.asyncio
+async def test_join_with_wrong_key_is_rejected(
+    command_handler: CommandHandler, registered_session: MagicMock
+) -> None:
+    locked = command_handler.channel_manager.get_or_create_channel("#locked")
+    locked.key = "secret"
+
+    msg = IRCMessage("JOIN", ["#locked", "wrong"])
+    await command_handler.handle(registered_session, msg)
+
+    registered_session.send_error.assert_called_with("475", "#locked", ANY)
+    assert registered_session not in locked.members
+
+
+@pytest.mark.asyncio
+async def test_part_multiple_channels_with_reason(
+    command_handler: CommandHandler, registered_session: MagicMock
+) -> None:
+    await command_handler.handle(registered_session, IRCMessage("JOIN", ["#a,#b"]))
+    registered_session.send_reply.reset_mock()
+
+    msg = IRCMessage("PART", ["#a,#b,#missing", "Bye"])
+    await command_handler.handle(registered_session, msg)
+
+    registered_session.send_reply.assert_any_call(":Michal PART #a :Bye")
+    registered_session.send_reply.assert_any_call(":Michal PART #b :Bye")
+    registered_session.send_error.assert_called_with("403", "#missing", ANY)
+
+
+@pytest.mark.asyncio
+async def test_join_zero_parts_all_channels(
+    command_handler: CommandHandler, registered_session: MagicMock
+) -> None:
+    await command_handler.handle(registered_session, IRCMessage("JOIN", ["#a,#b"]))
+    await command_handler.handle(registered_session, IRCMessage("JOIN", ["0"]))
+
+    for channel in command_handler.channel_manager.channels.values():
+        assert registered_session not in channel.members
+
+
+@pytest.mark.asyncio
+async def test_privmsg_multiple_targets(
+    command_handler: CommandHandler, registered_session: MagicMock
+) -> None:
+    hubert = MagicMock()
+    hubert.caps = 0
+    hubert.send_reply = AsyncMock()
+    command_handler.user_manager.users["hubert"] = hubert
+
+    channel = command_handler.channel_manager.get_or_create_channel("#test")
+    channel.add_user(registered_session)
+    kacper = MagicMock()
+    kacper.caps = 0
+    kacper.send_reply = AsyncMock()
+    channel.add_user(kacper)
+
+    msg = IRCMessage("PRIVMSG", ["Hubert,#test,Hubert", "Hi"])
+    await command_handler.handle(registered_session, msg)
+
+    hubert.send_reply.assert_called_once_with(":Michal PRIVMSG Hubert :Hi")
+    kacper.send_reply.assert_called_once_with(":Michal PRIVMSG #test :Hi")
+
+
+@pytest.mark.asyncio
+async def test_names_split_across_lines_within_limit(
+    command_handler: CommandHandler, registered_session: MagicMock
+) -> None:
+    registered_session.server_name = "test.server"
+    channel = command_handler.channel_manager.get_or_create_channel("#big")
+    for i in range(300):
+        member = MagicMock()
+        member.nickname = f"nick{i:05d}"
+        channel.add_user(member)
+    channel.add_user(registered_session)
+
+    await command_handler.handle(registered_session, IRCMessage("NAMES", ["#big"]))
+
+    lines = [
+        " ".join(call.args) for call in registered_session.send_reply.call_args_list
+    ]
+    names = [line for line in lines if " 353 " in line]
+
+    assert len(names) > 1
+    assert all(len(line.encode()) + 2 <= 512 for line in names)
+    assert sum(len(line.split(":")[-1].split()) for line in names) == 301
+    assert " 366 " in lines[-1]
+
+
+@pytest.mark.asyncio
+async def test_names_for_unknown_channel_only_ends_list(
+    command_handler: CommandHandler, registered_session: MagicMock
+) -> None:
+    registered_session.server_name = "test.server"
+    await command_handler.handle(registered_session, IRCMessage("NAMES", ["#nope"]))
+
+    registered_session.send_reply.assert_called_once_with(
+        ":test.server", "366", "Michal", "#nope", ":End of /NAMES list"
+    )
+
+
+@pytest.mark.asyncio
+async def test_part_after_quiet_join_is_not_broadcast(
+    command_handler: CommandHandler, registered_session: MagicMock
+) -> None:
+    channel = command_handler.channel_manager.get_or_create_channel("#quiet")
+    other = MagicMock()
+    other.nickname = "Other"
+    other.caps = 0
+    other.send_reply = AsyncMock()
+    channel.add_user(other)
+    channel.quiet_joins = True
+
+    await command_handler.handle(registered_session, IRCMessage("JOIN", ["#quiet"]))
+    await command_handler.handle(registered_session, IRCMessage("PART", ["#quiet"]))
+
+    other.send_reply.assert_not_called()
+    registered_session.send_reply.assert_any_call(":Michal PART #quiet")
+
+
+@pytest.mark.asyncio
+async def test_mode_changes_are_broadcast_once(
+    command_handler: CommandHandler,
+) -> None:
+    op = make_session("Michal")
+    other = make_session("Hubert")
+    command_handler.user_manager.users["hubert"] = other
+    for session in (op, other):
+        await command_handler.handle(session, IRCMessage("JOIN", ["#test"]))
+    other.send_reply.reset_mock()
+
+    await command_handler.handle(op, IRCMessage("MODE", ["#test", "+mv-t", "Hubert"]))
+
+    other.send_reply.assert_called_once_with(
+        ":Michal!michal@10.0.0.1 MODE #test +mv-t Hubert"
+    )
+    channel = command_handler.channel_manager.get_channel("#test")
+    assert channel is not None
+    assert channel.modes == {"n", "m"}
+    assert channel.prefixes(other) == "+"
+
+    await command_handler.handle(op, IRCMessage("MODE", ["#test"]))
+    op.send_reply.assert_any_call(":test.server", "324", "Michal", "#test", "+mn")
+
+
+@pytest.mark.asyncio
+async def test_quiet_join_is_hidden_until_a_mode_names_it(
+    command_handler: CommandHandler,
+) -> None:
+    op = make_session("Michal")
+    lurker = make_session("Hubert")
+    command_handler.user_manager.users["hubert"] = lurker
+    await command_handler.handle(op, IRCMessage("JOIN", ["#test"]))
+    channel = command_handler.channel_manager.get_channel("#test")
+    assert channel is not None
+    channel.quiet_joins = True
+    await command_handler.handle(lurker, IRCMessage("JOIN", ["#test"]))
+
+    # The lurker sees themselves in NAMES, nobody else sees them
+    lurker.send_reply.assert_any_call(
+        ":test.server", "353", "Hubert", "=", "#test", ":@Michal Hubert"
+    )
+    op.send_reply.reset_mock()
+    await command_handler.handle(op, IRCMessage("NAMES", ["#test"]))
+    op.send_reply.assert_any_call(
+        ":test.server", "353", "Michal", "=", "#test", ":@Michal"
+    )
+    await command_handler.handle(op, IRCMessage("WHO", ["#test"]))
+    assert not any("Hubert" in call.args for call in op.send_reply.call_args_list)
+
+    op.send_reply.reset_mock()
+    await command_handler.handle(op, IRCMessage("MODE", ["#test", "+v", "Hubert"]))
+    assert [call.args for call in op.send_reply.call_args_list] == [
+        (":Hubert!hubert@10.0.0.1 JOIN #test",),
+        (":Michal!michal@10.0.0.1 MODE #test +v Hubert",),
+    ]
+
+
+@pytest.mark.asyncio
+async def test_nick_change_reveals_a_quiet_join_first(
+    command_handler: CommandHandler,
+) -> None:
+    op = make_session("Michal")
+    lurker = make_user(command_handler, "Hubert")
+    await command_handler.handle(op, IRCMessage("JOIN", ["#test"]))
+    channel = command_handler.channel_manager.get_channel("#test")
+    assert channel is not None
+    channel.quiet_joins = True
+    await command_handler.handle(lurker, IRCMessage("JOIN", ["#test"]))
+
+    op.send_reply.reset_mock()
+    await command_handler.handle(lurker, IRCMessage("NICK", ["Kacper"]))
+    assert [call.args for call in op.send_reply.call_args_list] == [
+        (":Hubert!hubert@10.0.0.1 JOIN #test",),
+        (":Hubert!hubert@10.0.0.1 NICK Kacper",),
+    ]
+
+
+@pytest.mark.asyncio
+async def test_mode_requires_operator(command_handler: CommandHandler) -> None:
+    op = make_session("Michal")
+    other = make_session("Hubert")
+    for session in (op, other):
+        await command_handler.handle(session, IRCMessage("JOIN", ["#test"]))
+
+    await command_handler.handle(other, IRCMessage("MODE", ["#test", "+i"]))
+    await command_handler.handle(other, IRCMessage("MODE", ["#test", "+X"]))
+
+    other.send_error.assert_any_call("482", "#test", ":You're not channel operator")
+    other.send_error.assert_any_call(
+        "472", "X", ":is unknown mode char to me for #test"
+    )
+
+
+@pytest.mark.asyncio
+async def test_ban_blocks_join_unless_excepted(
+    command_handler: CommandHandler,
+) -> None:
+    op = make_session("Michal")
+    banned = make_session("Troll", host="bad.example.com")
+    await command_handler.handle(op, IRCMessage("JOIN", ["#test"]))
+    await command_handler.handle(
+        op, IRCMessage("MODE", ["#test", "+b", "*!*@*.example.com"])
+    )
+
+    await command_handler.handle(banned, IRCMessage("JOIN", ["#test"]))
+    banned.send_error.assert_called_once_with(
+        "474", "#test", ":Cannot join channel (+b)"
+    )
+
+    await command_handler.handle(op, IRCMessage("MODE", ["#test", "+e", "Troll"]))
+    await command_handler.handle(banned, IRCMessage("JOIN", ["#test"]))
+    channel = command_handler.channel_manager.get_channel("#test")
+    assert channel is not None and banned in channel.members
+
+    op.send_reply.reset_mock()
+    await command_handler.handle(op, IRCMessage("MODE", ["#test", "b"]))
+    op.send_reply.assert_any_call(
+        ":test.server",
+        "367",
+        "Michal",
+        "#test",
+        "*!*@*.example.com",
+        "Michal!michal@10.0.0.1",
+        ANY,
+    )
+    op.send_reply.assert_called_with(
+        ":test.server", "368", "Michal", "#test", ":End of channel ban list"
+    )
+
+
+@pytest.mark.asyncio
+async def test_banned_member_cannot_speak(command_handler: CommandHandler) -> None:
+    op = make_session("Michal")
+    member = make_session("Hubert", host="bad.example.com")
+    for session in (op, member):
+        await command_handler.handle(session, IRCMessage("JOIN", ["#test"]))
+    await command_handler.handle(
+        op, IRCMessage("MODE", ["#test", "+b", "*.example.com"])
+    )
+    op.send_reply.reset_mock()
+
+    await command_handler.handle(member, IRCMessage("PRIVMSG", ["#test", "hi"]))
+
+    member.send_error.assert_called_once_with("404", "#test", ":Cannot send to channel")
+    op.send_reply.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_invite_only_channel(command_handler: CommandHandler) -> None:
+    op = make_session("Michal")
+    guest = make_session("Hubert")
+    command_handler.user_manager.users["hubert"] = guest
+    await command_handler.handle(op, IRCMessage("JOIN", ["#test"]))
+    await command_handler.handle(op, IRCMessage("MODE", ["#test", "+il", "1"]))
+
+    await command_handler.handle(guest, IRCMessage("JOIN", ["#test"]))
+    guest.send_error.assert_called_once_with(
+        "473", "#test", ":Cannot join channel (+i)"
+    )
+
+    await command_handler.handle(op, IRCMessage("INVITE", ["Hubert", "#test"]))
+    op.send_reply.assert_any_call(":test.server", "341", "Michal", "Hubert", "#test")
+    guest.send_reply.assert_called_with(
+        ":Michal!michal@10.0.0.1", "INVITE", "Hubert", "#test"
+    )
+
+    await command_handler.handle(guest, IRCMessage("JOIN", ["#test"]))
+    guest.send_error.assert_called_with("471", "#test", ":Cannot join channel (+l)")
+
+
+@pytest.mark.asyncio
+async def test_join_refused_when_server_channel_cap_is_reached(
+    command_handler: CommandHandler, registered_session: MagicMock
+) -> None:
+    command_handler.channel_manager.max_channels = 1
+    try:
+        await command_handler.handle(registered_session, IRCMessage("JOIN", ["#a,#b"]))
+    finally:
+        command_handler.channel_manager.max_channels = 0
+
+    registered_session.send_error.assert_called_once_with(
+        "405", "#b", ":Too many channels on this server"
+    )
+    assert list(command_handler.channel_manager.channels) == ["#a"]
+
+
+@pytest.mark.asyncio
+async def test_part_deletes_emptied_channel(
+    command_handler: CommandHandler, registered_session: MagicMock
+) -> None:
+    await command_handler.handle(registered_session, IRCMessage("JOIN", ["#gone"]))
+    await command_handler.handle(registered_session, IRCMessage("PART", ["#gone"]))
+
+    assert not command_handler.channel_manager.channel_exists("#gone")
+
+
+@pytest.mark.asyncio
+async def test_nick_and_quit_reach_each_peer_once(
+    command_handler: CommandHandler,
+) -> None:
+    mover = make_session("Michal")
+    command_handler.user_manager.add_user("Michal", mover)
+    mover.monitored = {}
+    mover.quit_reason = None
+    mover.quit = AsyncMock()
+    friend = make_session("Hubert")
+    stranger = make_session("Obcy")
+
+    for name in ("#a", "#b", "#c"):
+        channel = command_handler.channel_manager.get_or_create_channel(name)
+        channel.add_user(mover)
+        channel.add_user(friend)
+    command_handler.channel_manager.get_or_create_channel("#d").add_user(stranger)
+
+    await command_handler.handle(mover, IRCMessage("NICK", ["Wojtek"]))
+
+    mover.send_reply.assert_called_once_with(":Michal!michal@10.0.0.1 NICK Wojtek")
+    friend.send_reply.assert_called_once_with(":Michal!michal@10.0.0.1 NICK Wojtek")
+    stranger.send_reply.assert_not_called()
+
+    mover.hostmask = "Wojtek!michal@10.0.0.1"
+    await command_handler.handle(mover, IRCMessage("QUIT", ["bye"]))
+    await command_handler.unregister(mover)
+
+    friend.send_reply.assert_called_with(":Wojtek!michal@10.0.0.1 QUIT :Quit: bye")
+    assert friend.send_reply.call_count == 2
+    stranger.send_reply.assert_not_called()
+    assert friend.channels == {
+        command_handler.channel_manager.get_channel(name) for name in "abc"
+    }
+    assert not mover.channels
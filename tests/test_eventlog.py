@@ -0,0 +1,120 @@
+import json
+import threading
+import time
+from pathlib import Path
+
+import pytest
+from conftest import make_session, make_user
+
+from src.commands import CommandHandler
+from src.config import AccessLogConfig, ServerConfig
+from src.eventlog import EventLog
+from src.protocol import IRCMessage
+
+
+@pytest.fixture
+def handler_config(tmp_path: Path) -> ServerConfig:
+    return ServerConfig(
+        name="test.server",
+        host="127.0.0.1",
+        port=6667,
+        password="",
+        access_log=AccessLogConfig(path=str(tmp_path / "access.jsonl")),
+    )
+
+
+def read_events(path: Path) -> list[dict[str, object]]:
+    return [json.loads(line) for line in path.read_text().splitlines()]
+
+
+def test_events_are_written_as_json_lines(tmp_path: Path) -> None:
+    path = tmp_path / "access.jsonl"
+    log = EventLog(AccessLogConfig(path=str(path)))
+
+    session = make_session("Alice")
+    session.connected_at = time.monotonic() - 2.0
+    log.emit("connect", session)
+    log.emit("quit", session, reason="Quit: bye", bytes_out=120)
+    log.close()
+
+    connect, quit_ = read_events(path)
+    assert connect["event"] == "connect"
+    assert connect["host"] == "10.0.0.1" and connect["port"] == 40000
+    assert connect["nick"] == "Alice"
+    assert isinstance(connect["age"], float) and connect["age"] >= 2.0
+    assert quit_["reason"] == "Quit: bye" and quit_["bytes_out"] == 120
+    assert log.written == 2
+
+
+def test_files_rotate_by_size(tmp_path: Path) -> None:
+    path = tmp_path / "access.jsonl"
+    log = EventLog(
+        AccessLogConfig(path=str(path), max_bytes=300, backups=2, batch_size=1)
+    )
+
+    for i in range(20):
+        log.emit("join", channel=f"#c{i}")
+    log.close()
+
+    assert path.stat().st_size <= 300
+    assert (tmp_path / "access.jsonl.1").exists()
+    assert (tmp_path / "access.jsonl.2").exists()
+    assert not (tmp_path / "access.jsonl.3").exists()
+    assert read_events(path)[-1]["channel"] == "#c19"
+
+
+def test_events_are_dropped_and_counted_when_the_writer_lags(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    path = tmp_path / "access.jsonl"
+    release = threading.Event()
+    write = EventLog._write
+
+    def stalled_write(self: EventLog, batch: list[dict[str, object]]) -> None:
+        release.wait()
+        write(self, batch)
+
+    monkeypatch.setattr(EventLog, "_write", stalled_write)
+    log = EventLog(AccessLogConfig(path=str(path), queue_size=5, batch_size=1))
+
+    started = time.perf_counter()
+    for i in range(50):
+        log.emit("join", channel=f"#c{i}")
+    # Emitting never waits for the writer
+    assert time.perf_counter() - started < 0.5
+    assert log.dropped >= 40
+
+    release.set()
+    log.close()
+
+    events = read_events(path)
+    dropped = [event for event in events if event["event"] == "dropped"]
+    assert sum(event["count"] for event in dropped) == log.dropped  # type: ignore[misc]
+    assert len(events) - len(dropped) == 50 - log.dropped
+
+
+@pytest.mark.asyncio
+async def test_channel_activity_is_logged(
+    command_handler: CommandHandler, tmp_path: Path
+) -> None:
+    path = tmp_path / "access.jsonl"
+    op = make_user(command_handler, "Op")
+    guest = make_user(command_handler, "Guest")
+
+    await command_handler.handle(op, IRCMessage("JOIN", ["#chat"]))
+    await command_handler.handle(guest, IRCMessage("JOIN", ["#chat"]))
+    await command_handler.handle(op, IRCMessage("KICK", ["#chat", "Guest", "spam"]))
+    await command_handler.handle(op, IRCMessage("PART", ["#chat", "later"]))
+    command_handler.close()
+
+    summary = [
+        (event["event"], event["nick"], event["channel"]) for event in read_events(path)
+    ]
+    assert summary == [
+        ("join", "Op", "#chat"),
+        ("join", "Guest", "#chat"),
+        ("kick", "Op", "#chat"),
+        ("part", "Op", "#chat"),
+    ]
+    kick = read_events(path)[2]
+    assert kick["target"] == "Guest" and kick["reason"] == "spam"
@@ -0,0 +1,106 @@
+import ipaddress
+import logging
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+
+from src.channel_manager import ChannelManager
+from src.commands import CommandHandler
+from src.config import ServerConfig
+from src.interning import StringPool, host_record
+from src.protocol import IRCMessage
+from src.session import ClientSession
+from src.user_manager import UserManager
+
+
+def make_session(host: str, port: int) -> ClientSession:
+    writer = MagicMock()
+    writer.get_extra_info.return_value = (host, port)
+    writer.drain = AsyncMock()
+    return ClientSession(AsyncMock(), writer, "test.server")
+
+
+def test_pool_returns_shared_copy() -> None:
+    pool = StringPool()
+    first = pool.intern("".join(["ho", "st"]))
+    second = pool.intern("".join(["hos", "t"]))
+
+    assert first == second
+    assert first is second
+
+
+def test_pool_is_bounded() -> None:
+    pool = StringPool(size=2)
+    kept = pool.intern("".join(["a", "1"]))
+    dropped = pool.intern("".join(["b", "1"]))
+    pool.intern("".join(["a", "1"]))
+    pool.intern("".join(["c", "1"]))
+
+    # "b1" was least recently used and is no longer shared
+    assert len(pool) == 2
+    assert pool.intern("".join(["a", "1"])) is kept
+    assert pool.intern("".join(["b", "1"])) is not dropped
+
+
+def test_host_record_is_shared() -> None:
+    record = host_record("192.0.2.1")
+
+    assert host_record("192.0.2.1") is record
+    assert record.address == ipaddress.ip_address("192.0.2.1")
+    assert host_record("irc.example.com").address is None
+
+
+def test_sessions_from_one_host_share_metadata() -> None:
+    first = make_session("".join(["198.51.100.", "7"]), 1000)
+    second = make_session("".join(["198.51.100", ".7"]), 1001)
+
+    assert first.host_record is second.host_record
+    assert first.host is second.host
+
+
+def test_session_logger_is_not_registered() -> None:
+    session = make_session("203.0.113.5", 4000)
+
+    assert session.logger.name == "Session(203.0.113.5:4000)"
+    assert session.logger.name not in logging.Logger.manager.loggerDict
+    assert (
+        session.logger.getEffectiveLevel()
+        == logging.getLogger("Session").getEffectiveLevel()
+    )
+
+
+def test_hostmask_follows_nick_and_username() -> None:
+    session = make_session("203.0.113.5", 4000)
+    session.nickname = "alice"
+    assert session.hostmask == "alice!*@203.0.113.5"
+
+    session.username = "ali"
+    assert session.hostmask == "alice!ali@203.0.113.5"
+
+    session.nickname = "bob"
+    assert session.hostmask == "bob!ali@203.0.113.5"
+
+
+@pytest.mark.asyncio
+async def test_registration_interns_user_strings() -> None:
+    UserManager().users = {}
+    ChannelManager().channels = {}
+    handler = CommandHandler(
+        ServerConfig(name="test.server", host="127.0.0.1", port=6667, password="")
+    )
+
+    sessions = []
+    for i in range(2):
+        session = make_session("192.0.2.10", 5000 + i)
+        await handler.handle(session, IRCMessage("NICK", [f"user{i}"]))
+        await handler.handle(
+            session,
+            IRCMessage(
+                "USER", ["".join(["gu", "est"]), "0", "*", "".join(["Gu", "est"])]
+            ),
+        )
+        sessions.append(session)
+
+    assert sessions[0].username is sessions[1].username
+    assert sessions[0].realname is sessions[1].realname
+    handler.close()
@@ -0,0 +1,162 @@
+import asyncio
+from collections.abc import Iterator
+from pathlib import Path
+
+import pytest
+from conftest import make_session, make_user
+
+from src.channel import Channel
+from src.channel_manager import ChannelManager
+from src.commands import CommandHandler
+from src.config import LimitsConfig, ServerConfig, load_config
+from src.limits import line_too_long, set_limits, targmax_token
+from src.protocol import IRCMessage
+from src.server import Server
+from src.user_manager import UserManager
+
+
+@pytest.fixture(autouse=True)
+def restore_limits() -> Iterator[None]:
+    yield
+    set_limits(LimitsConfig())
+
+
+def make_handler(limits: LimitsConfig) -> CommandHandler:
+    UserManager().users = {}
+    ChannelManager().channels = {}
+    config = ServerConfig(
+        name="test.server",
+        host="127.0.0.1",
+        port=6667,
+        password="",
+        limits=limits,
+    )
+    return CommandHandler(config)
+
+
+def test_line_length_excludes_tags() -> None:
+    set_limits(LimitsConfig(linelen=64))
+
+    assert not line_too_long(b"PRIVMSG #a :" + b"x" * 50 + b"\r\n")
+    assert line_too_long(b"PRIVMSG #a :" + b"x" * 60 + b"\r\n")
+    assert not line_too_long(b"@" + b"t" * 500 + b" PRIVMSG #a :hi\r\n")
+    assert line_too_long(b"@" + b"t" * 9000 + b" PRIVMSG #a :hi\r\n")
+
+
+def test_targmax_token_marks_unlimited_commands() -> None:
+    set_limits(LimitsConfig(targmax={"PRIVMSG": 4, "JOIN": 0}))
+
+    assert targmax_token() == "TARGMAX=JOIN:,PRIVMSG:4"
+
+
+def test_channel_length_comes_from_limits() -> None:
+    set_limits(LimitsConfig(channellen=10))
+
+    assert Channel.is_valid_name("#" + "a" * 9)
+    assert not Channel.is_valid_name("#" + "a" * 10)
+
+
+def test_limits_are_loaded_from_config(tmp_path: Path) -> None:
+    path = tmp_path / "config.yaml"
+    path.write_text(
+        "server:\n"
+        "  name: test\n"
+        "  host: 127.0.0.1\n"
+        "  port: 6667\n"
+        "  password: ''\n"
+        "  limits:\n"
+        "    nicklen: 16\n"
+        "    maxchannels: 0\n"
+        "    targmax:\n"
+        "      privmsg: 2\n"
+        "logging:\n"
+        "  level: INFO\n"
+    )
+
+    limits = load_config(str(path)).server.limits
+    assert limits.nicklen == 16
+    assert limits.maxchannels == 0
+    assert limits.targmax["PRIVMSG"] == 2
+    assert limits.targmax["WHOIS"] == 4
+
+
+@pytest.mark.asyncio
+async def test_limits_are_advertised() -> None:
+    handler = make_handler(LimitsConfig(nicklen=16, maxchannels=20))
+
+    tokens = handler.isupport_tokens()
+    assert "NICKLEN=16" in tokens
+    assert "CHANNELLEN=200" in tokens
+    assert "LINELEN=512" in tokens
+    assert "MAXCHANNELS=20" in tokens
+    assert "CHANLIMIT=#:20" in tokens
+    assert any(token.startswith("TARGMAX=") for token in tokens)
+    handler.close()
+
+
+@pytest.mark.asyncio
+async def test_nick_length_comes_from_limits() -> None:
+    handler = make_handler(LimitsConfig(nicklen=4))
+    session = make_session("abc")
+
+    await handler.handle(session, IRCMessage("NICK", ["abcde"]))
+    session.send_error.assert_called_once_with("432", "abcde", ":Erroneus nickname")
+
+    await handler.handle(session, IRCMessage("NICK", ["abcd"]))
+    assert session.nickname == "abcd"
+    handler.close()
+
+
+@pytest.mark.asyncio
+async def test_too_many_targets_is_rejected_before_handling() -> None:
+    handler = make_handler(LimitsConfig(targmax={"PRIVMSG": 2}))
+    sender = make_session("sender")
+    target = make_user(handler, "target")
+
+    await handler.handle(sender, IRCMessage("PRIVMSG", ["target,a,b", "hi"]))
+    sender.send_error.assert_called_once_with("407", "b", ":Too many targets")
+    target.send_reply.assert_not_called()
+
+    await handler.handle(sender, IRCMessage("PRIVMSG", ["target,a", "hi"]))
+    target.send_reply.assert_called_once()
+    handler.close()
+
+
+@pytest.mark.asyncio
+async def test_join_stops_at_maxchannels() -> None:
+    handler = make_handler(LimitsConfig(maxchannels=2))
+    session = make_session("alice")
+
+    await handler.handle(session, IRCMessage("JOIN", ["#a,#b,#c"]))
+
+    assert {channel.name for channel in session.channels} == {"#a", "#b"}
+    session.send_error.assert_called_with(
+        "405", "#c", ":You have joined too many channels"
+    )
+    handler.close()
+
+
+@pytest.mark.asyncio
+async def test_long_lines_are_refused() -> None:
+    config = ServerConfig(
+        name="test.irc",
+        host="127.0.0.1",
+        port=0,
+        password="",
+        limits=LimitsConfig(linelen=32),
+    )
+    server = Server(config)
+    listener = await asyncio.start_server(server.handle_client, "127.0.0.1", 0)
+    port = listener.sockets[0].getsockname()[1]
+
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    writer.write(b"NICK " + b"x" * 40 + b"\r\n")
+    await writer.drain()
+    line = await asyncio.wait_for(reader.readline(), timeout=2)
+
+    assert line == b":test.irc 417 * :Input line was too long\r\n"
+
+    writer.close()
+    listener.close()
+    await listener.wait_closed()
+    server.command_handler.close()
@@ -0,0 +1,54 @@
+from src.masks import MaskList, compile_mask, normalize_mask
+
+
+def test_normalize_mask_fills_missing_parts() -> None:
+    assert normalize_mask("Troll") == "troll!*@*"
+    assert normalize_mask("*.example.com") == "*!*@*.example.com"
+    assert normalize_mask("user@host") == "*!user@host"
+    assert normalize_mask("nick!user") == "nick!user@*"
+    assert normalize_mask("[Nick]!a@b") == "{nick}!a@b"
+
+
+def test_compile_mask_wildcards() -> None:
+    pattern = compile_mask("a?c*")
+    assert pattern.fullmatch("abcdef")
+    assert not pattern.fullmatch("ac")
+
+
+def test_mask_list_matches_each_index() -> None:
+    masks = MaskList()
+    masks.add("*!*@*.example.com")
+    masks.add("*!*@192.168.*")
+    masks.add("spam*!*@*")
+    masks.add("*!*bot*@*")
+    masks.add("exact!user@host")
+
+    assert masks.matches("nick!user@shell.example.com")
+    assert masks.matches("nick!user@192.168.1.10")
+    assert masks.matches("Spammer!user@host.net")
+    assert masks.matches("nick!mybot1@host.net")
+    assert masks.matches("EXACT!user@host")
+    assert not masks.matches("nick!user@example.org")
+    assert not masks.matches("nick!user@10.192.168.1")
+
+
+def test_mask_list_remove_invalidates_cache() -> None:
+    masks = MaskList()
+    masks.add("*!*@*.example.com", "op!op@host")
+
+    assert masks.matches("a!b@c.example.com")
+    assert masks.add("*!*@*.EXAMPLE.com") is None
+    assert masks.remove("*!*@*.example.com") == "*!*@*.example.com"
+    assert not masks.matches("a!b@c.example.com")
+    assert masks.remove("*!*@*.example.com") is None
+    assert len(masks) == 0
+
+
+def test_mask_list_only_checks_candidates() -> None:
+    masks = MaskList()
+    for i in range(10_000):
+        masks.add(f"*!*@host{i}.example.net")
+
+    assert len(masks._candidates("nick", "host5.example.net")) == 1
+    assert masks.matches("nick!user@host5.example.net")
+    assert not masks.matches("nick!user@host5.example.org")
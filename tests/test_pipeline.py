@@ -0,0 +1,187 @@
+import asyncio
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+from conftest import make_session
+
+from src.channel_manager import ChannelManager
+from src.commands import CommandHandler
+from src.config import PipelineConfig, ServerConfig
+from src.pipeline import CommandPipeline
+from src.protocol import IRCMessage
+from src.server import Server
+from src.user_manager import UserManager
+
+
+class RecordingHandler:
+    """Stands in for CommandHandler, noting the order commands start in."""
+
+    def __init__(self) -> None:
+        self.started: list[str] = []
+        self.release = asyncio.Event()
+
+    async def handle(self, session: MagicMock, msg: IRCMessage) -> None:
+        self.started.append(f"{session.nickname}:{msg.command}")
+        if msg.command == "SLOW":
+            await self.release.wait()
+
+
+def make_pipeline(
+    session: MagicMock, handler: RecordingHandler, **config: int
+) -> CommandPipeline:
+    pipeline = CommandPipeline(
+        session,
+        handler,  # type: ignore[arg-type]
+        PipelineConfig(**config),
+    )
+    pipeline.start()
+    return pipeline
+
+
+@pytest.mark.asyncio
+async def test_ping_skips_commands_queued_behind_a_slow_one() -> None:
+    handler = RecordingHandler()
+    pipeline = make_pipeline(make_session("A"), handler)
+
+    await pipeline.submit(IRCMessage("SLOW", []))
+    await asyncio.sleep(0)
+    for command in ("NAMES", "PING", "WHO"):
+        await pipeline.submit(IRCMessage(command, []))
+
+    assert handler.started == ["A:SLOW", "A:PING"]
+    assert pipeline.depth == 2
+
+    handler.release.set()
+    await pipeline.close()
+
+    assert handler.started == ["A:SLOW", "A:PING", "A:NAMES", "A:WHO"]
+    assert pipeline.depth == 0
+    assert pipeline.peak_depth == 2
+
+
+@pytest.mark.asyncio
+async def test_light_client_is_not_stuck_behind_a_heavy_one() -> None:
+    handler = RecordingHandler()
+    heavy = make_pipeline(make_session("Heavy"), handler, queue_size=100, burst=4)
+    light = make_pipeline(make_session("Light"), handler, burst=4)
+
+    for _ in range(40):
+        await heavy.submit(IRCMessage("WHO", []))
+    await light.submit(IRCMessage("WHO", []))
+    await heavy.close()
+    await light.close()
+
+    # One turn of the heavy client, then the light one
+    assert handler.started.index("Light:WHO") == 4
+    assert len(handler.started) == 41
+
+
+@pytest.mark.asyncio
+async def test_full_queue_holds_up_reading() -> None:
+    handler = RecordingHandler()
+    pipeline = make_pipeline(make_session("A"), handler, queue_size=2)
+    await pipeline.submit(IRCMessage("SLOW", []))
+    await asyncio.sleep(0)
+
+    await pipeline.submit(IRCMessage("WHO", []))
+    await pipeline.submit(IRCMessage("WHO", []))
+    blocked = asyncio.create_task(pipeline.submit(IRCMessage("WHO", [])))
+    await asyncio.sleep(0)
+    assert not blocked.done()
+
+    handler.release.set()
+    await blocked
+    await pipeline.close()
+    assert handler.started.count("A:WHO") == 3
+
+
+@pytest.mark.asyncio
+async def test_commands_after_quit_are_dropped() -> None:
+    handler = RecordingHandler()
+    session = make_session("A")
+    pipeline = make_pipeline(session, handler)
+
+    await pipeline.submit(IRCMessage("SLOW", []))
+    await pipeline.submit(IRCMessage("WHO", []))
+    await asyncio.sleep(0)
+    session.closed = True
+    handler.release.set()
+    await pipeline.close()
+
+    assert handler.started == ["A:SLOW"]
+
+
+@pytest.mark.asyncio
+async def test_close_cancels_a_stuck_worker() -> None:
+    handler = RecordingHandler()
+    pipeline = CommandPipeline(
+        make_session("A"),
+        handler,  # type: ignore[arg-type]
+        PipelineConfig(queue_size=1, close_timeout=0.05),
+    )
+    pipeline.start()
+    await pipeline.submit(IRCMessage("SLOW", []))
+    await pipeline.submit(IRCMessage("WHO", []))
+    await asyncio.sleep(0)
+
+    # Stuck for good, with a full queue
+    await asyncio.wait_for(pipeline.close(), 1)
+    await asyncio.sleep(0)
+    assert handler.started == ["A:SLOW"]
+
+
+@pytest.mark.asyncio
+async def test_stuck_client_is_still_unregistered() -> None:
+    UserManager().users.clear()
+    ChannelManager().channels.clear()
+    server = Server(
+        ServerConfig(
+            name="test.server",
+            host="127.0.0.1",
+            port=6667,
+            password="",
+            pipeline=PipelineConfig(close_timeout=0.05),
+        )
+    )
+    writer = MagicMock()
+    writer.get_extra_info.return_value = ("10.0.0.1", 40000)
+    writer.is_closing.return_value = False
+    writer.wait_closed = AsyncMock()
+    stalled = asyncio.Event()
+
+    async def drain() -> None:
+        # A client that stopped reading once it was registered
+        if server.command_handler.user_manager.get_session("Stuck"):
+            await stalled.wait()
+
+    writer.drain = drain
+    reader = MagicMock()
+    reader.readline = AsyncMock(
+        side_effect=[b"NICK Stuck\r\n", b"USER s 0 * :S\r\n", b"JOIN #a\r\n", b""]
+    )
+
+    await asyncio.wait_for(server.handle_client(reader, writer), 1)
+
+    assert server.command_handler.user_manager.get_session("Stuck") is None
+    assert not server.pipelines
+    server.command_handler.close()
+
+
+@pytest.mark.asyncio
+async def test_ping_is_answered_outside_the_reply_batch() -> None:
+    handler = CommandHandler(
+        ServerConfig(name="test.server", host="127.0.0.1", port=6667, password="")
+    )
+    session = make_session()
+
+    await handler.handle(session, IRCMessage("PING", ["token"]))
+    session.send_now.assert_called_once_with(
+        ":test.server", "PONG", "test.server", ":token"
+    )
+
+    await handler.handle(session, IRCMessage("PING", []))
+    session.send_error.assert_called_once_with("409", ":No origin specified")
+
+    await handler.handle(session, IRCMessage("PONG", ["test.server"]))
+    session.send_error.assert_called_once()
+    handler.close()
@@ -0,0 +1,157 @@
+import pytest
+from conftest import make_session, make_user, replies
+
+from src.capabilities import AWAY_NOTIFY
+from src.commands import CommandHandler
+from src.config import LimitsConfig
+from src.limits import set_limits
+from src.protocol import IRCMessage
+
+
+@pytest.mark.asyncio
+async def test_monitor_reports_and_lists_targets(
+    command_handler: CommandHandler,
+) -> None:
+    watcher = make_user(command_handler, "Watcher")
+    make_user(command_handler, "Alice")
+
+    await command_handler.handle(watcher, IRCMessage("MONITOR", ["+", "alice,Bob"]))
+
+    assert replies(watcher, "730") == [
+        (":test.server", "730", "Watcher", ":Alice!alice@10.0.0.1")
+    ]
+    assert replies(watcher, "731") == [(":test.server", "731", "Watcher", ":Bob")]
+    assert set(command_handler.user_manager.watchers) == {"alice", "bob"}
+
+    watcher.send_reply.reset_mock()
+    await command_handler.handle(watcher, IRCMessage("MONITOR", ["L"]))
+    assert replies(watcher, "732") == [(":test.server", "732", "Watcher", ":alice,Bob")]
+    watcher.send_error.assert_called_with("733", ":End of MONITOR list")
+
+    await command_handler.handle(watcher, IRCMessage("MONITOR", ["-", "ALICE"]))
+    assert list(watcher.monitored) == ["bob"]
+    assert set(command_handler.user_manager.watchers) == {"bob"}
+
+    await command_handler.handle(watcher, IRCMessage("MONITOR", ["C"]))
+    assert watcher.monitored == {}
+    assert command_handler.user_manager.watchers == {}
+
+
+@pytest.mark.asyncio
+async def test_monitor_list_is_bounded(command_handler: CommandHandler) -> None:
+    set_limits(LimitsConfig(monitor=2))
+    watcher = make_user(command_handler, "Watcher")
+
+    await command_handler.handle(watcher, IRCMessage("MONITOR", ["+", "a,b,c,d"]))
+
+    assert list(watcher.monitored) == ["a", "b"]
+    watcher.send_error.assert_called_once_with(
+        "734", "2", "c,d", ":Monitor list is full."
+    )
+    assert replies(watcher, "731") == [(":test.server", "731", "Watcher", ":a,b")]
+
+
+@pytest.mark.asyncio
+async def test_only_watchers_hear_about_registration_nick_and_disconnect(
+    command_handler: CommandHandler,
+) -> None:
+    watcher = make_user(command_handler, "Watcher")
+    bystander = make_user(command_handler, "Other")
+    await command_handler.handle(watcher, IRCMessage("MONITOR", ["+", "Alice,Ally"]))
+    watcher.send_reply.reset_mock()
+
+    alice = make_session()
+    alice.hostmask = "Alice!alice@10.0.0.1"
+    await command_handler.handle(alice, IRCMessage("PASS", ["password"]))
+    await command_handler.handle(alice, IRCMessage("NICK", ["Alice"]))
+    await command_handler.handle(alice, IRCMessage("USER", ["alice", "0", "*", "A"]))
+    assert replies(watcher, "730") == [
+        (":test.server", "730", "Watcher", ":Alice!alice@10.0.0.1")
+    ]
+
+    watcher.send_reply.reset_mock()
+    await command_handler.handle(alice, IRCMessage("NICK", ["Ally"]))
+    assert replies(watcher, "731") == [(":test.server", "731", "Watcher", ":Alice")]
+    assert len(replies(watcher, "730")) == 1
+
+    watcher.send_reply.reset_mock()
+    await command_handler.unregister(alice)
+    assert replies(watcher, "731") == [(":test.server", "731", "Watcher", ":Ally")]
+    assert command_handler.user_manager.get_session("Ally") is None
+
+    assert not replies(bystander, "730") and not replies(bystander, "731")
+
+
+@pytest.mark.asyncio
+async def test_unregister_leaves_a_nick_held_by_another_session(
+    command_handler: CommandHandler,
+) -> None:
+    alice = make_user(command_handler, "Alice")
+    # Picked the nick before registering, then lost the race for it
+    impostor = make_session("Alice")
+    impostor.is_registered = False
+
+    await command_handler.unregister(impostor)
+
+    assert command_handler.user_manager.get_session("Alice") is alice
+
+
+@pytest.mark.asyncio
+async def test_away_replies_and_whois(command_handler: CommandHandler) -> None:
+    alice = make_user(command_handler, "Alice")
+    bob = make_user(command_handler, "Bob")
+
+    await command_handler.handle(alice, IRCMessage("AWAY", ["Gone fishing"]))
+    assert alice.away == "Gone fishing"
+    alice.send_error.assert_called_once_with(
+        "306", ":You have been marked as being away"
+    )
+
+    await command_handler.handle(bob, IRCMessage("PRIVMSG", ["Alice", "hi"]))
+    bob.send_error.assert_called_once_with("301", "Alice", ":Gone fishing")
+
+    await command_handler.handle(bob, IRCMessage("WHOIS", ["Alice"]))
+    assert replies(bob, "301") == [
+        (":test.server", "301", "Bob", "Alice", ":Gone fishing")
+    ]
+
+    await command_handler.handle(alice, IRCMessage("AWAY", []))
+    assert alice.away is None
+    alice.send_error.assert_called_with(
+        "305", ":You are no longer marked as being away"
+    )
+
+
+@pytest.mark.asyncio
+async def test_away_notify_reaches_capable_peers_once(
+    command_handler: CommandHandler,
+) -> None:
+    alice = make_user(command_handler, "Alice")
+    capable = make_user(command_handler, "Capable")
+    capable.caps = AWAY_NOTIFY
+    plain = make_user(command_handler, "Plain")
+    elsewhere = make_user(command_handler, "Elsewhere")
+    elsewhere.caps = AWAY_NOTIFY
+
+    for name, members in (
+        ("#one", [alice, capable, plain]),
+        ("#two", [alice, capable]),
+        ("#three", [elsewhere]),
+    ):
+        channel = command_handler.channel_manager.get_or_create_channel(name)
+        for member in members:
+            channel.add_user(member)
+
+    await command_handler.handle(alice, IRCMessage("AWAY", ["brb"]))
+
+    capable.send_reply.assert_called_once_with(":Alice!alice@10.0.0.1 AWAY :brb")
+    plain.send_reply.assert_not_called()
+    elsewhere.send_reply.assert_not_called()
+    alice.send_reply.assert_not_called()
+
+    # Setting the same message again changes nothing for the peers
+    await command_handler.handle(alice, IRCMessage("AWAY", ["brb"]))
+    capable.send_reply.assert_called_once()
+
+    await command_handler.handle(alice, IRCMessage("AWAY", []))
+    capable.send_reply.assert_called_with(":Alice!alice@10.0.0.1 AWAY")
@@ -0,0 +1,144 @@
+import asyncio
+import cProfile
+import os
+import pstats
+from collections.abc import Iterator
+from pathlib import Path
+from unittest.mock import MagicMock
+
+import pytest
+from conftest import make_session
+
+from src.commands import CommandHandler
+from src.config import ProfilingConfig, ServerConfig
+from src.profiling import PROFILE_CPU, Profiler, ProfilerBusyError, spans
+from src.protocol import IRCMessage
+
+
+@pytest.fixture
+def handler_config(tmp_path: Path) -> ServerConfig:
+    return ServerConfig(
+        name="test.server",
+        host="127.0.0.1",
+        port=6667,
+        password="",
+        profiling=ProfilingConfig(directory=str(tmp_path), sample_interval=0.001),
+    )
+
+
+@pytest.fixture
+def command_handler(command_handler: CommandHandler) -> Iterator[CommandHandler]:
+    yield command_handler
+    spans().enabled = False
+    spans().reset()
+
+
+def make_oper(nickname: str = "Admin") -> MagicMock:
+    session = make_session(nickname)
+    session.is_oper = True
+    return session
+
+
+def notices(session: MagicMock) -> list[str]:
+    return [
+        call.args[3][1:]
+        for call in session.send_reply.call_args_list
+        if call.args[1] == "NOTICE"
+    ]
+
+
+def busy(seconds: float) -> None:
+    deadline = asyncio.get_running_loop().time() + seconds
+    while asyncio.get_running_loop().time() < deadline:
+        sum(range(1000))
+
+
+@pytest.mark.asyncio
+async def test_profile_is_for_operators_only(command_handler: CommandHandler) -> None:
+    session = make_oper()
+    session.is_oper = False
+
+    await command_handler.handle(session, IRCMessage("PROFILE", ["5"]))
+
+    session.send_error.assert_called_once_with(
+        "481", ":Permission Denied- You're not an IRC operator"
+    )
+    assert not command_handler.profiler.running
+
+
+@pytest.mark.asyncio
+async def test_sampling_profile_writes_collapsed_stacks(
+    command_handler: CommandHandler,
+) -> None:
+    oper = make_oper()
+
+    await command_handler.handle(oper, IRCMessage("PROFILE", ["30"]))
+    await command_handler.handle(oper, IRCMessage("PROFILE", ["30"]))
+    busy(0.05)
+    await command_handler.handle(oper, IRCMessage("PROFILE", ["STOP"]))
+
+    started, refused, wrote = notices(oper)
+    assert started.startswith("Profiling (sample) into ")
+    assert refused == "A profile is already running"
+    path = wrote.removeprefix("Wrote profile to ")
+    with open(path) as f:
+        stacks = f.read().splitlines()
+    assert any("test_profiling.py:busy" in line for line in stacks)
+    assert all(line.rsplit(" ", 1)[1].isdigit() for line in stacks)
+
+
+@pytest.mark.asyncio
+async def test_cpu_profile_stops_by_itself(tmp_path: Path) -> None:
+    profiler = Profiler(ProfilingConfig(directory=str(tmp_path)))
+    path = profiler.start(0.05, PROFILE_CPU)
+    with pytest.raises(ProfilerBusyError):
+        profiler.start(1)
+
+    await asyncio.sleep(0.1)
+
+    assert not profiler.running
+    assert os.path.exists(path)
+    pstats.Stats(path)
+
+
+class ClashingProfile:
+    def enable(self) -> None:
+        raise ValueError("Another profiling tool is already active")
+
+
+@pytest.mark.asyncio
+async def test_profile_that_fails_to_start_is_not_left_running(
+    command_handler: CommandHandler, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    oper = make_oper()
+    monkeypatch.setattr(cProfile, "Profile", ClashingProfile)
+
+    await command_handler.handle(oper, IRCMessage("PROFILE", ["5", "cpu"]))
+    await command_handler.handle(oper, IRCMessage("PROFILE", ["5", "trace"]))
+
+    assert notices(oper) == [
+        "Could not start a profile: Another profiling tool is already active",
+        "Unknown profile mode trace, use cpu or sample",
+    ]
+    assert not command_handler.profiler.running
+
+
+@pytest.mark.asyncio
+async def test_spans_time_each_stage(command_handler: CommandHandler) -> None:
+    oper = make_oper()
+    await command_handler.handle(oper, IRCMessage("PROFILE", ["SPANS", "ON"]))
+    await command_handler.handle(oper, IRCMessage("AWAY", ["lunch"]))
+    await command_handler.handle(oper, IRCMessage("PROFILE", ["SPANS"]))
+
+    lines = notices(oper)
+    assert lines[0] == "Stage timing is on"
+    assert lines[1] == "Stage timing is on"
+    assert lines[2].startswith("dispatch: 2 calls")
+    assert any(line.startswith("dispatch:AWAY: 1 calls") for line in lines)
+
+    oper.send_reply.reset_mock()
+    await command_handler.handle(oper, IRCMessage("PROFILE", ["SPANS", "RESET"]))
+    await command_handler.handle(oper, IRCMessage("PROFILE", ["SPANS", "OFF"]))
+    await command_handler.handle(oper, IRCMessage("AWAY", []))
+    assert notices(oper) == ["Stage timings are cleared", "Stage timing is off"]
+    assert "dispatch:AWAY" not in spans().stats
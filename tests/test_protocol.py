@@ -62,3 +62,16 @@ def test_parse_empty_trailing() -> None:
 def test_parse_malformed_prefix_only() -> None:
     with pytest.raises(Exception):
         IRCParser.parse(":tylko_prefix")
+
+
+def test_parse_message_tags() -> None:
+    msg = IRCParser.parse("@time=12:00;+typing=active;flag PRIVMSG #a :hi")
+    assert msg.tags == {"time": "12:00", "+typing": "active", "flag": ""}
+    assert msg.command == "PRIVMSG"
+    assert msg.params == ["#a", "hi"]
+
+
+def test_parse_tags_unescapes_values() -> None:
+    msg = IRCParser.parse(r"@+note=a\sb\:c\\d :nick TAGMSG #a")
+    assert msg.tags == {"+note": "a b;c\\d"}
+    assert msg.prefix == "nick"
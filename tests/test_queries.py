@@ -0,0 +1,157 @@
+from unittest.mock import AsyncMock
+
+import pytest
+from conftest import make_user, replies
+
+from src.commands import REPLY_CHUNK, CommandHandler
+from src.protocol import IRCMessage
+
+
+@pytest.mark.asyncio
+async def test_who_channel_lists_members_with_prefixes(
+    command_handler: CommandHandler,
+) -> None:
+    alice = make_user(command_handler, "Alice")
+    bob = make_user(command_handler, "Bob")
+    channel = command_handler.channel_manager.get_or_create_channel("#test")
+    channel.add_user(alice)
+    channel.add_user(bob)
+
+    await command_handler.handle(bob, IRCMessage("WHO", ["#test"]))
+
+    assert replies(bob, "352") == [
+        (
+            ":test.server",
+            "352",
+            "Bob",
+            "#test",
+            "alice",
+            "10.0.0.1",
+            "test.server",
+            "Alice",
+            "H@",
+            ":0 Alice Real",
+        ),
+        (
+            ":test.server",
+            "352",
+            "Bob",
+            "#test",
+            "bob",
+            "10.0.0.1",
+            "test.server",
+            "Bob",
+            "H",
+            ":0 Bob Real",
+        ),
+    ]
+    bob.send_reply.assert_called_with(
+        ":test.server", "315", "Bob", "#test", ":End of WHO list"
+    )
+
+
+@pytest.mark.asyncio
+async def test_who_uses_host_index_and_masks(command_handler: CommandHandler) -> None:
+    asker = make_user(command_handler, "Asker", host="192.0.2.1")
+    make_user(command_handler, "Alice", host="198.51.100.1")
+    make_user(command_handler, "Bob", host="198.51.100.1")
+
+    await command_handler.handle(asker, IRCMessage("WHO", ["198.51.100.1"]))
+    assert [reply[7] for reply in replies(asker, "352")] == ["Alice", "Bob"]
+
+    asker.send_reply.reset_mock()
+    await command_handler.handle(asker, IRCMessage("WHO", ["a*"]))
+    assert [reply[7] for reply in replies(asker, "352")] == ["Asker", "Alice"]
+
+
+@pytest.mark.asyncio
+async def test_who_streams_in_chunks_and_stops_on_disconnect(
+    command_handler: CommandHandler,
+) -> None:
+    asker = make_user(command_handler, "Asker")
+    for i in range(REPLY_CHUNK * 3):
+        make_user(command_handler, f"user{i}")
+
+    await command_handler.handle(asker, IRCMessage("WHO", ["*"]))
+    assert asker.flush.await_count >= 3
+
+    # The client goes away while the first chunk is being flushed
+    asker.send_reply.reset_mock()
+    asker.flush = AsyncMock(
+        side_effect=lambda: asker.is_alive.configure_mock(return_value=False)
+    )
+    await command_handler.handle(asker, IRCMessage("WHO", ["*"]))
+    assert len(replies(asker, "352")) == REPLY_CHUNK
+    assert not replies(asker, "315")
+
+
+@pytest.mark.asyncio
+async def test_whois_reports_channels_and_status(
+    command_handler: CommandHandler,
+) -> None:
+    asker = make_user(command_handler, "Asker")
+    alice = make_user(command_handler, "Alice")
+    alice.is_oper = True
+    alice.account = "alice"
+    channel = command_handler.channel_manager.get_or_create_channel("#test")
+    channel.add_user(alice)
+
+    await command_handler.handle(asker, IRCMessage("WHOIS", ["alice,ghost"]))
+
+    asker.send_reply.assert_any_call(
+        ":test.server", "311", "Asker", "Alice", "alice", "10.0.0.1", "*", ":Alice Real"
+    )
+    asker.send_reply.assert_any_call(":test.server", "319", "Asker", "Alice", ":@#test")
+    asker.send_reply.assert_any_call(
+        ":test.server", "313", "Asker", "Alice", ":is an IRC operator"
+    )
+    asker.send_reply.assert_any_call(
+        ":test.server", "330", "Asker", "Alice", "alice", ":is logged in as"
+    )
+    asker.send_error.assert_called_once_with("401", "ghost", ":No such nick/channel")
+
+
+@pytest.mark.asyncio
+async def test_list_orders_channels_by_size(command_handler: CommandHandler) -> None:
+    asker = make_user(command_handler, "Asker")
+    small = command_handler.channel_manager.get_or_create_channel("#small")
+    big = command_handler.channel_manager.get_or_create_channel("#big")
+    small.add_user(asker)
+    for i in range(3):
+        big.add_user(make_user(command_handler, f"user{i}"))
+
+    await command_handler.handle(asker, IRCMessage("LIST", []))
+
+    assert [reply[3:5] for reply in replies(asker, "322")] == [
+        ("#big", "3"),
+        ("#small", "1"),
+    ]
+    asker.send_reply.assert_called_with(":test.server", "323", "Asker", ":End of /LIST")
+
+
+@pytest.mark.asyncio
+async def test_ison_and_userhost(command_handler: CommandHandler) -> None:
+    asker = make_user(command_handler, "Asker")
+    alice = make_user(command_handler, "Alice")
+    alice.is_oper = True
+
+    await command_handler.handle(asker, IRCMessage("ISON", ["alice ghost Asker"]))
+    asker.send_reply.assert_called_with(":test.server", "303", "Asker", ":Alice Asker")
+
+    await command_handler.handle(asker, IRCMessage("USERHOST", ["Alice", "ghost"]))
+    asker.send_reply.assert_called_with(
+        ":test.server", "302", "Asker", ":Alice*=+alice@10.0.0.1"
+    )
+
+
+@pytest.mark.asyncio
+async def test_list_with_filters(command_handler: CommandHandler) -> None:
+    asker = make_user(command_handler, "Asker")
+    for name, size in (("#one", 1), ("#two", 2), ("#three", 3)):
+        channel = command_handler.channel_manager.get_or_create_channel(name)
+        for i in range(size):
+            channel.add_user(make_user(command_handler, f"{name[1:]}{i}"))
+
+    await command_handler.handle(asker, IRCMessage("LIST", [">1,!#three"]))
+
+    assert [reply[3] for reply in replies(asker, "322")] == ["#two"]
@@ -0,0 +1,237 @@
+import asyncio
+import base64
+import hashlib
+import ssl
+from pathlib import Path
+from unittest.mock import ANY, MagicMock
+
+import pytest
+from conftest import make_session
+
+from src.accounts import Account, MemoryAccountStore
+from src.auth import hash_password
+from src.channel_manager import ChannelManager
+from src.commands import CommandHandler
+from src.config import ServerConfig, TLSListenerConfig
+from src.protocol import IRCParser
+from src.server import Server
+from src.user_manager import UserManager
+
+
+@pytest.fixture
+def command_handler(command_handler: CommandHandler) -> CommandHandler:
+    command_handler.account_store = MemoryAccountStore(
+        [Account("alice", hash_password("secret", n=2**10), ("ab12",))]
+    )
+    return command_handler
+
+
+@pytest.fixture
+def session() -> MagicMock:
+    return make_session(host="127.0.0.1")
+
+
+def plain(authcid: str, password: str) -> str:
+    return base64.b64encode(f"\0{authcid}\0{password}".encode()).decode()
+
+
+async def run(handler: CommandHandler, session: MagicMock, *lines: str) -> None:
+    for line in lines:
+        await handler.handle(session, IRCParser.parse(line))
+
+
+@pytest.mark.asyncio
+async def test_cap_ls_advertises_mechanisms(
+    command_handler: CommandHandler, session: MagicMock
+) -> None:
+    await run(command_handler, session, "CAP LS 302")
+
+    advertised = session.send_reply.call_args.args[-1]
+    assert "sasl=PLAIN,EXTERNAL" in advertised.split()[0]
+    assert session.cap_negotiating is True
+
+
+@pytest.mark.asyncio
+async def test_cap_req_unknown_is_nakked(
+    command_handler: CommandHandler, session: MagicMock
+) -> None:
+    await run(command_handler, session, "CAP REQ :sasl bogus")
+
+    session.send_reply.assert_called_with(
+        ":test.server", "CAP", "*", "NAK", ":sasl bogus"
+    )
+    assert session.caps == 0
+
+
+@pytest.mark.asyncio
+async def test_sasl_plain_success_registers_after_cap_end(
+    command_handler: CommandHandler, session: MagicMock
+) -> None:
+    await run(
+        command_handler,
+        session,
+        "CAP LS 302",
+        "NICK alice",
+        "USER alice 0 * :Alice",
+        "CAP REQ sasl",
+        "AUTHENTICATE PLAIN",
+        f"AUTHENTICATE {plain('alice', 'secret')}",
+    )
+
+    assert session.account == "alice"
+    assert session.is_registered is False
+    session.send_reply.assert_any_call(
+        ":test.server", "903", "alice", ":SASL authentication successful"
+    )
+
+    await run(command_handler, session, "CAP END")
+
+    assert session.is_registered is True
+    session.send_reply.assert_any_call(":test.server", "001", "alice", ANY)
+
+
+@pytest.mark.asyncio
+async def test_sasl_plain_wrong_password(
+    command_handler: CommandHandler, session: MagicMock
+) -> None:
+    await run(
+        command_handler,
+        session,
+        "CAP REQ sasl",
+        "AUTHENTICATE PLAIN",
+        f"AUTHENTICATE {plain('alice', 'nope')}",
+    )
+
+    assert session.account is None
+    session.send_error.assert_called_with("904", ":SASL authentication failed")
+
+
+@pytest.mark.asyncio
+async def test_sasl_requires_negotiated_cap(
+    command_handler: CommandHandler, session: MagicMock
+) -> None:
+    await run(command_handler, session, "AUTHENTICATE PLAIN")
+
+    session.send_error.assert_called_with("904", ":SASL authentication failed")
+    assert session.sasl_mechanism is None
+
+
+@pytest.mark.asyncio
+async def test_sasl_external_without_certificate_fails(
+    command_handler: CommandHandler, session: MagicMock
+) -> None:
+    await run(command_handler, session, "CAP REQ sasl", "AUTHENTICATE EXTERNAL")
+
+    session.send_error.assert_any_call("908", "PLAIN,EXTERNAL", ANY)
+    session.send_error.assert_called_with("904", ":SASL authentication failed")
+
+
+@pytest.mark.asyncio
+async def test_sasl_external_with_certfp(
+    command_handler: CommandHandler, session: MagicMock
+) -> None:
+    session.certfp = "AB12"
+    await run(
+        command_handler,
+        session,
+        "CAP REQ sasl",
+        "AUTHENTICATE EXTERNAL",
+        "AUTHENTICATE +",
+    )
+
+    assert session.account == "alice"
+
+
+@pytest.mark.asyncio
+async def test_sasl_abort_and_oversized_payload(
+    command_handler: CommandHandler, session: MagicMock
+) -> None:
+    await run(command_handler, session, "CAP REQ sasl", "AUTHENTICATE PLAIN")
+    await run(command_handler, session, "AUTHENTICATE *")
+    session.send_error.assert_called_with("906", ":SASL authentication aborted")
+
+    await run(command_handler, session, "AUTHENTICATE PLAIN")
+    for _ in range(11):
+        await run(command_handler, session, "AUTHENTICATE " + "A" * 400)
+    session.send_error.assert_called_with("905", ":SASL message too long")
+
+
+@pytest.mark.asyncio
+async def test_sasl_external_over_tls(
+    tls_cert: tuple[str, str], tmp_path: Path
+) -> None:
+    UserManager().users.clear()
+    ChannelManager().channels.clear()
+
+    client_cert = tmp_path / "client.pem"
+    client_key = tmp_path / "client.key"
+    proc = await asyncio.create_subprocess_exec(
+        "openssl",
+        "req",
+        "-x509",
+        "-newkey",
+        "ec",
+        "-pkeyopt",
+        "ec_paramgen_curve:prime256v1",
+        "-nodes",
+        "-days",
+        "1",
+        "-subj",
+        "/CN=alice",
+        "-keyout",
+        str(client_key),
+        "-out",
+        str(client_cert),
+        stdout=asyncio.subprocess.DEVNULL,
+        stderr=asyncio.subprocess.DEVNULL,
+    )
+    await proc.wait()
+    der = ssl.PEM_cert_to_DER_cert(client_cert.read_text())
+    certfp = hashlib.sha256(der).hexdigest()
+
+    certfile, keyfile = tls_cert
+    listener = TLSListenerConfig(
+        host="127.0.0.1",
+        port=0,
+        certfile=certfile,
+        keyfile=keyfile,
+        client_ca=str(client_cert),
+    )
+    server_app = Server(
+        ServerConfig(
+            name="test.tls", host="127.0.0.1", port=0, password="pw", tls=[listener]
+        )
+    )
+    server_app.command_handler.account_store = MemoryAccountStore(
+        [Account("alice", "sha256$00$00", (certfp,))]
+    )
+    server_task = asyncio.create_task(server_app.start())
+    while not server_app.server or not server_app.server.sockets:
+        await asyncio.sleep(0.01)
+
+    context = ssl.SSLContext(ssl.PROTOCOL_TLS_CLIENT)
+    context.check_hostname = False
+    context.verify_mode = ssl.CERT_NONE
+    context.load_cert_chain(str(client_cert), str(client_key))
+
+    port = server_app.tls_servers[0].sockets[0].getsockname()[1]
+    reader, writer = await asyncio.open_connection("127.0.0.1", port, ssl=context)
+    try:
+        writer.write(
+            b"CAP LS 302\r\nNICK alice\r\nUSER alice 0 * :Alice\r\n"
+            b"CAP REQ sasl\r\nAUTHENTICATE EXTERNAL\r\nAUTHENTICATE +\r\nCAP END\r\n"
+        )
+        await writer.drain()
+
+        lines: list[bytes] = []
+        while not lines or b" 001 " not in lines[-1]:
+            lines.append(await asyncio.wait_for(reader.readline(), timeout=2.0))
+        assert any(b" 903 " in line for line in lines)
+    finally:
+        writer.close()
+        await server_app.stop()
+        server_task.cancel()
+        try:
+            await server_task
+        except asyncio.CancelledError:
+            pass
@@ -0,0 +1,106 @@
+import asyncio
+import logging
+import time
+from collections.abc import Iterator
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+
+from src.channel import Channel
+from src.config import SchedulingConfig
+from src.scheduling import LagMonitor, fanout, set_scheduling
+
+
+@pytest.fixture(autouse=True)
+def small_slices() -> Iterator[None]:
+    set_scheduling(SchedulingConfig(large_fanout=10, broadcast_slice=10, tick_budget=0))
+    yield
+    set_scheduling(SchedulingConfig())
+
+
+def make_channel(size: int) -> tuple[Channel, list[MagicMock]]:
+    channel = Channel("#big")
+    members = []
+    for i in range(size):
+        member = MagicMock()
+        member.nickname = f"m{i}"
+        member.caps = 0
+        member.send_reply = AsyncMock()
+        channel.add_user(member)
+        members.append(member)
+    return channel, members
+
+
+@pytest.mark.asyncio
+async def test_small_fanout_is_not_charged() -> None:
+    channel, members = make_channel(10)
+    remaining = fanout().remaining
+
+    await channel.broadcast("hello", skip_user=members[0])
+
+    assert fanout().remaining == remaining
+    assert all(m.send_reply.await_count == 1 for m in members[1:])
+    members[0].send_reply.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_large_fanout_lets_other_work_run() -> None:
+    channel, members = make_channel(100)
+    delivered_before: list[int] = []
+
+    async def other_client() -> None:
+        delivered_before.append(sum(m.send_reply.await_count for m in members))
+
+    yields = fanout().yields
+    other = asyncio.create_task(other_client())
+    await channel.broadcast("hello")
+    await other
+
+    # The other task ran part way through the fan-out, not after it
+    assert delivered_before[0] < 100
+    assert fanout().yields > yields
+    assert all(m.send_reply.await_count == 1 for m in members)
+
+
+@pytest.mark.asyncio
+async def test_members_who_leave_mid_fanout_are_skipped() -> None:
+    channel, members = make_channel(100)
+    leaver = members[-1]
+
+    async def leave() -> None:
+        channel.remove_user(leaver)
+
+    task = asyncio.create_task(leave())
+    await channel.broadcast("hello")
+    await task
+
+    leaver.send_reply.assert_not_called()
+    assert sum(m.send_reply.await_count for m in members) == 99
+
+
+def test_lag_stats_and_warnings(caplog: pytest.LogCaptureFixture) -> None:
+    monitor = LagMonitor(SchedulingConfig(lag_warning=0.5))
+    for i in range(100):
+        monitor.record(i / 1000)
+
+    with caplog.at_level(logging.WARNING):
+        monitor.record(0.6)
+    assert "Event loop lagged 600.0 ms" in caplog.text
+
+    stats = monitor.stats()
+    assert stats.samples == 101
+    assert stats.current == 0.6 and stats.peak == 0.6
+    assert stats.p50 == 0.05
+    assert stats.p99 == 0.099
+
+
+@pytest.mark.asyncio
+async def test_lag_monitor_sees_a_blocked_loop() -> None:
+    monitor = LagMonitor(SchedulingConfig(lag_interval=0.01, lag_report=0))
+    monitor.start()
+
+    time.sleep(0.05)
+    await asyncio.sleep(0.02)
+    monitor.stop()
+
+    assert monitor.peak >= 0.03
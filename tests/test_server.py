@@ -34,6 +34,7 @@ async def test_server_cleanup_on_disconnect(server_config: ServerConfig) -> None
         instance = mock_session.return_value
         instance.nickname = nickname
         instance.host = "127.0.0.1"
+        instance.channels = set()
         instance.quit = AsyncMock()
 
         user_manager.add_user(nickname, instance)
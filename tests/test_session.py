@@ -1,9 +1,10 @@
+import asyncio
 import logging
 from unittest.mock import AsyncMock, MagicMock
 
 import pytest
 
-from src.session import ClientSession
+from src.session import FLUSH_TICK, ClientSession
 
 
 @pytest.fixture
@@ -187,3 +188,129 @@ async def test_session_quit_handles_exception(
 
     assert session.closed is True
     mock_writer.close.assert_called_once()
+
+
+@pytest.mark.asyncio
+async def test_session_corked_replies_share_one_write(
+    mock_streams: tuple[AsyncMock, MagicMock], server_name: str
+) -> None:
+    mock_reader, mock_writer = mock_streams
+    session = ClientSession(mock_reader, mock_writer, server_name)
+
+    async with session.corked():
+        await session.send_reply("first")
+        async with session.corked():
+            await session.send_reply("second")
+        mock_writer.writelines.assert_not_called()
+
+    mock_writer.write.assert_not_called()
+    mock_writer.writelines.assert_called_once_with([b"first\r\n", b"second\r\n"])
+    mock_writer.drain.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_session_quit_flushes_corked_replies(
+    mock_streams: tuple[AsyncMock, MagicMock], server_name: str
+) -> None:
+    mock_reader, mock_writer = mock_streams
+    session = ClientSession(mock_reader, mock_writer, server_name)
+
+    async with session.corked():
+        await session.send_reply("ERROR :Bye")
+        await session.quit()
+
+    mock_writer.writelines.assert_called_once_with([b"ERROR :Bye\r\n"])
+    mock_writer.close.assert_called_once()
+
+
+@pytest.mark.asyncio
+async def test_session_tick_policy_coalesces_one_iteration(
+    mock_streams: tuple[AsyncMock, MagicMock], server_name: str
+) -> None:
+    mock_reader, mock_writer = mock_streams
+    session = ClientSession(
+        mock_reader, mock_writer, server_name, flush_policy=FLUSH_TICK
+    )
+
+    await session.send_reply("353")
+    await session.send_reply("366")
+    mock_writer.writelines.assert_not_called()
+
+    await asyncio.sleep(0)
+    mock_writer.write.assert_not_called()
+    mock_writer.writelines.assert_called_once_with([b"353\r\n", b"366\r\n"])
+
+    await session.send_reply("PONG")
+    await asyncio.sleep(0)
+    assert mock_writer.writelines.call_count == 2
+
+
+@pytest.mark.asyncio
+async def test_session_tick_policy_flushes_early_past_max_buffered(
+    mock_streams: tuple[AsyncMock, MagicMock], server_name: str
+) -> None:
+    mock_reader, mock_writer = mock_streams
+    session = ClientSession(
+        mock_reader, mock_writer, server_name, flush_policy=FLUSH_TICK, max_buffered=8
+    )
+
+    await session.send_reply("short")
+    mock_writer.writelines.assert_not_called()
+    await session.send_reply("longer")
+    mock_writer.writelines.assert_called_once_with([b"short\r\n", b"longer\r\n"])
+
+    await asyncio.sleep(0)
+    mock_writer.writelines.assert_called_once()
+
+
+@pytest.mark.asyncio
+async def test_session_quit_flushes_tick_queue(
+    mock_streams: tuple[AsyncMock, MagicMock], server_name: str
+) -> None:
+    mock_reader, mock_writer = mock_streams
+    session = ClientSession(
+        mock_reader, mock_writer, server_name, flush_policy=FLUSH_TICK
+    )
+
+    await session.send_reply("ERROR :Bye")
+    await session.quit()
+
+    mock_writer.writelines.assert_called_once_with([b"ERROR :Bye\r\n"])
+    mock_writer.close.assert_called_once()
+    await asyncio.sleep(0)
+    mock_writer.writelines.assert_called_once()
+
+
+@pytest.mark.asyncio
+async def test_session_corked_replies_flush_early_past_max_buffered(
+    mock_streams: tuple[AsyncMock, MagicMock], server_name: str
+) -> None:
+    mock_reader, mock_writer = mock_streams
+    session = ClientSession(mock_reader, mock_writer, server_name, max_buffered=8)
+
+    async with session.corked():
+        await session.send_reply("short")
+        mock_writer.writelines.assert_not_called()
+        await session.send_reply("longer")
+        mock_writer.writelines.assert_called_once_with([b"short\r\n", b"longer\r\n"])
+        mock_writer.drain.assert_awaited_once()
+        await session.send_reply("last")
+
+    assert mock_writer.writelines.call_args_list[-1].args == ([b"last\r\n"],)
+
+
+@pytest.mark.asyncio
+async def test_session_quit_does_not_wait_for_a_stalled_client(
+    mock_streams: tuple[AsyncMock, MagicMock], server_name: str
+) -> None:
+    mock_reader, mock_writer = mock_streams
+    mock_writer.drain = AsyncMock(side_effect=asyncio.Event().wait)
+    session = ClientSession(mock_reader, mock_writer, server_name)
+
+    async with session.corked():
+        await session.send_reply("ERROR :Bye")
+        await asyncio.wait_for(session.quit(), 1)
+
+    mock_writer.writelines.assert_called_once_with([b"ERROR :Bye\r\n"])
+    mock_writer.drain.assert_not_called()
+    mock_writer.close.assert_called_once()
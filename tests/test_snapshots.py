@@ -0,0 +1,69 @@
+import asyncio
+import json
+import logging
+import threading
+from dataclasses import dataclass
+from pathlib import Path
+
+import pytest
+
+from src.snapshots import JsonSnapshot
+
+
+@dataclass
+class Record:
+    name: str
+
+
+def make_snapshot(path: Path, records: list[Record]) -> JsonSnapshot:
+    snapshot = JsonSnapshot(
+        str(path), lambda: records, logging.getLogger("test"), "records"
+    )
+    snapshot.SAVE_DELAY = 0.01
+    return snapshot
+
+
+@pytest.mark.asyncio
+async def test_changes_are_written_once_on_a_worker_thread(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    path = tmp_path / "records.json"
+    records = [Record("a")]
+    snapshot = make_snapshot(path, records)
+    threads: list[str] = []
+    write = snapshot._write
+
+    def recording_write(number: int, batch: list[Record]) -> bool:
+        threads.append(threading.current_thread().name)
+        return write(number, batch)
+
+    monkeypatch.setattr(snapshot, "_write", recording_write)
+
+    snapshot.changed()
+    records.append(Record("b"))
+    snapshot.changed()
+    await asyncio.sleep(0.1)
+
+    assert json.loads(path.read_text()) == [{"name": "a"}, {"name": "b"}]
+    assert len(threads) == 1 and threads[0] != threading.current_thread().name
+    snapshot.close()
+    assert len(threads) == 1
+
+
+def test_an_older_snapshot_never_replaces_a_newer_one(tmp_path: Path) -> None:
+    path = tmp_path / "records.json"
+    snapshot = make_snapshot(path, [])
+
+    assert snapshot._write(2, [Record("new")])
+    assert snapshot._write(1, [Record("old")])
+    assert json.loads(path.read_text()) == [{"name": "new"}]
+
+
+def test_load_reports_unreadable_files(
+    tmp_path: Path, caplog: pytest.LogCaptureFixture
+) -> None:
+    path = tmp_path / "records.json"
+    path.write_text("{not json")
+
+    assert make_snapshot(path, []).load() == []
+    assert "Could not load records" in caplog.text
@@ -0,0 +1,154 @@
+import asyncio
+import socket
+import ssl
+from collections.abc import AsyncGenerator
+
+import pytest
+
+from src.channel_manager import ChannelManager
+from src.config import ServerConfig, TLSListenerConfig
+from src.server import Server
+from src.tls import create_server_context
+from src.user_manager import UserManager
+
+
+@pytest.fixture
+def listener(tls_cert: tuple[str, str]) -> TLSListenerConfig:
+    certfile, keyfile = tls_cert
+    return TLSListenerConfig(
+        host="127.0.0.1", port=0, certfile=certfile, keyfile=keyfile
+    )
+
+
+@pytest.fixture
+async def tls_server(listener: TLSListenerConfig) -> AsyncGenerator[Server, None]:
+    UserManager().users.clear()
+    ChannelManager().channels.clear()
+
+    config = ServerConfig(
+        name="test.tls",
+        host="127.0.0.1",
+        port=0,
+        password="password",
+        tls=[listener],
+    )
+    server_app = Server(config)
+    server_task = asyncio.create_task(server_app.start())
+
+    while not server_app.server or not server_app.server.sockets:
+        await asyncio.sleep(0.01)
+
+    yield server_app
+
+    await server_app.stop()
+    server_task.cancel()
+    try:
+        await server_task
+    except asyncio.CancelledError:
+        pass
+
+
+def client_context() -> ssl.SSLContext:
+    context = ssl.SSLContext(ssl.PROTOCOL_TLS_CLIENT)
+    context.check_hostname = False
+    context.verify_mode = ssl.CERT_NONE
+    return context
+
+
+def tls_port(server_app: Server) -> int:
+    port: int = server_app.tls_servers[0].sockets[0].getsockname()[1]
+    return port
+
+
+def connect_blocking(
+    port: int, context: ssl.SSLContext, session: ssl.SSLSession | None
+) -> ssl.SSLSession | None:
+    with socket.create_connection(("127.0.0.1", port)) as raw:
+        with context.wrap_socket(raw, session=session) as tls:
+            # TLS 1.3 tickets arrive after the handshake, so wait for a reply.
+            tls.sendall(b"PING x\r\n")
+            tls.recv(512)
+            return tls.session
+
+
+def test_create_server_context_enables_tickets(listener: TLSListenerConfig) -> None:
+    listener.session_tickets = 4
+    context = create_server_context(listener)
+
+    assert context.num_tickets == 4
+    assert not context.options & ssl.OP_NO_TICKET
+    assert context.minimum_version == ssl.TLSVersion.TLSv1_2
+
+
+@pytest.mark.asyncio
+async def test_tls_client_can_register(tls_server: Server) -> None:
+    reader, writer = await asyncio.open_connection(
+        "127.0.0.1", tls_port(tls_server), ssl=client_context()
+    )
+    try:
+        writer.write(b"PASS password\r\nNICK Secure\r\nUSER secure 0 * :Secure\r\n")
+        await writer.drain()
+
+        line = await asyncio.wait_for(reader.readline(), timeout=2.0)
+        assert b" 001 Secure " in line
+    finally:
+        writer.close()
+
+    assert tls_server.tls_handshakers[0].handshakes == 1
+
+
+@pytest.mark.asyncio
+async def test_tls_session_resumption(tls_server: Server) -> None:
+    port = tls_port(tls_server)
+    context = client_context()
+
+    session = await asyncio.to_thread(connect_blocking, port, context, None)
+    assert session is not None
+    await asyncio.to_thread(connect_blocking, port, context, session)
+
+    handshaker = tls_server.tls_handshakers[0]
+    assert handshaker.handshakes == 2
+    assert handshaker.resumed == 1
+
+
+@pytest.mark.asyncio
+async def test_plaintext_on_tls_port_is_rejected(tls_server: Server) -> None:
+    reader, writer = await asyncio.open_connection("127.0.0.1", tls_port(tls_server))
+    writer.write(b"NICK plain\r\n")
+    await writer.drain()
+
+    data = await asyncio.wait_for(reader.read(), timeout=2.0)
+    writer.close()
+
+    assert b"001" not in data
+    assert tls_server.tls_handshakers[0].failures == 1
+
+
+@pytest.mark.asyncio
+async def test_client_waiting_for_a_handshake_slot_can_register(
+    tls_server: Server,
+) -> None:
+    handshaker = tls_server.tls_handshakers[0]
+    handshaker.listener.handshake_timeout = 1.0
+    handshaker.pending = asyncio.Semaphore(1)
+    port = tls_port(tls_server)
+
+    # Holds the only slot until its handshake times out
+    _, silent = await asyncio.open_connection("127.0.0.1", port)
+    await asyncio.sleep(0.1)
+
+    reader, writer = await asyncio.open_connection(
+        "127.0.0.1", port, ssl=client_context()
+    )
+    try:
+        writer.write(b"PASS password\r\nNICK Waiter\r\nUSER waiter 0 * :Waiter\r\n")
+        await writer.drain()
+
+        line = await asyncio.wait_for(reader.readline(), timeout=3.0)
+        assert b" 001 Waiter " in line
+    finally:
+        writer.close()
+        silent.close()
+
+    assert handshaker.handshakes == 1
+    assert handshaker.failures == 1
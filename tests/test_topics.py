@@ -0,0 +1,149 @@
+from pathlib import Path
+
+import pytest
+from conftest import make_session, replies
+
+from src.channel import Channel
+from src.channel_manager import ChannelManager
+from src.commands import CommandHandler
+from src.config import ChannelsConfig, ServerConfig
+from src.protocol import IRCMessage
+from src.topics import SavedTopic, TopicStore
+from src.user_manager import UserManager
+
+
+def make_handler(topics_path: str | None = None) -> CommandHandler:
+    UserManager().users = {}
+    ChannelManager().channels = {}
+    config = ServerConfig(
+        name="test.server",
+        host="127.0.0.1",
+        port=6667,
+        password="",
+        channels=ChannelsConfig(topics_path=topics_path),
+    )
+    return CommandHandler(config)
+
+
+@pytest.mark.asyncio
+async def test_topic_is_set_broadcast_and_sent_on_join() -> None:
+    handler = make_handler()
+    op = make_session("Op")
+    await handler.handle(op, IRCMessage("JOIN", ["#chat"]))
+
+    await handler.handle(op, IRCMessage("TOPIC", ["#chat"]))
+    op.send_error.assert_called_with("331", "#chat", ":No topic is set")
+
+    await handler.handle(op, IRCMessage("TOPIC", ["#chat", "Hello world"]))
+    op.send_reply.assert_called_with(":Op!op@10.0.0.1 TOPIC #chat :Hello world")
+
+    channel = handler.channel_manager.get_channel("#chat")
+    assert channel is not None
+    assert channel.topic_set_by == "Op!op@10.0.0.1"
+
+    guest = make_session("Guest")
+    await handler.handle(guest, IRCMessage("JOIN", ["#chat"]))
+    assert replies(guest, "332") == [
+        (":test.server", "332", "Guest", "#chat :Hello world")
+    ]
+    assert replies(guest, "333") == [
+        (
+            ":test.server",
+            "333",
+            "Guest",
+            f"#chat Op!op@10.0.0.1 {int(channel.topic_set_at)}",
+        )
+    ]
+    handler.close()
+
+
+@pytest.mark.asyncio
+async def test_protected_topic_needs_operator() -> None:
+    handler = make_handler()
+    op = make_session("Op")
+    guest = make_session("Guest")
+    outsider = make_session("Outsider")
+    for session in (op, guest):
+        await handler.handle(session, IRCMessage("JOIN", ["#chat"]))
+
+    await handler.handle(guest, IRCMessage("TOPIC", ["#chat", "mine"]))
+    guest.send_error.assert_called_with("482", "#chat", ":You're not channel operator")
+
+    await handler.handle(outsider, IRCMessage("TOPIC", ["#chat", "mine"]))
+    outsider.send_error.assert_called_with(
+        "442", "#chat", ":You're not on that channel"
+    )
+
+    await handler.handle(op, IRCMessage("MODE", ["#chat", "-t"]))
+    await handler.handle(guest, IRCMessage("TOPIC", ["#chat", "mine"]))
+
+    channel = handler.channel_manager.get_channel("#chat")
+    assert channel is not None
+    assert channel.topic == "mine"
+    handler.close()
+
+
+def test_topic_replies_are_cached_until_the_topic_changes() -> None:
+    channel = Channel("#cache")
+    channel.set_topic("first", "Op!op@host", 1000.0)
+
+    replies = channel.topic_replies()
+    assert replies == ("#cache :first", "#cache Op!op@host 1000")
+    assert channel.topic_replies() is replies
+
+    channel.set_topic("second", "Op!op@host", 2000.0)
+    assert channel.topic_replies() == ("#cache :second", "#cache Op!op@host 2000")
+
+    channel.set_topic("", "Op!op@host")
+    assert channel.topic_set_by == "" and channel.topic_set_at == 0.0
+
+
+@pytest.mark.asyncio
+async def test_topics_survive_a_restart(tmp_path: Path) -> None:
+    path = str(tmp_path / "topics.json")
+    handler = make_handler(path)
+    op = make_session("Op")
+    await handler.handle(op, IRCMessage("JOIN", ["#Keep"]))
+    await handler.handle(op, IRCMessage("TOPIC", ["#Keep", "Still here"]))
+    handler.close()
+
+    store = TopicStore(ChannelsConfig(topics_path=path))
+    assert len(store) == 1
+
+    handler = make_handler(path)
+    guest = make_session("Guest")
+    await handler.handle(guest, IRCMessage("JOIN", ["#keep"]))
+    assert replies(guest, "332") == [
+        (":test.server", "332", "Guest", "#keep :Still here")
+    ]
+
+    # Clearing the topic removes it from the snapshot
+    await handler.handle(guest, IRCMessage("TOPIC", ["#keep", ""]))
+    handler.close()
+    assert len(TopicStore(ChannelsConfig(topics_path=path))) == 0
+
+
+def test_unused_topics_are_aged_out_and_capped(tmp_path: Path) -> None:
+    ChannelManager().channels = {}
+    store = TopicStore(
+        ChannelsConfig(
+            topics_path=str(tmp_path / "topics.json"),
+            topics_max=2,
+            topics_max_age=100.0,
+        )
+    )
+    live = ChannelManager().create_channel("#live")
+    for name, used_at in (
+        ("#live", 0.0),
+        ("#old", 0.0),
+        ("#recent", 950.0),
+        ("#newest", 990.0),
+    ):
+        store.topics[name] = SavedTopic(name, "topic", "Op!op@host", 900.0, used_at)
+
+    # "#old" is too old; of the rest, "#recent" is the least recently used
+    assert store.prune(now=1000.0) == 2
+    assert set(store.topics) == {"#live", "#newest"}
+    assert store.topics["#live"].used_at == 1000.0
+    assert live.name_key in store.topics
+    store.close()
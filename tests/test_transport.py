@@ -0,0 +1,188 @@
+import asyncio
+from functools import partial
+from typing import Any
+
+import pytest
+
+from src.channel_manager import ChannelManager
+from src.config import ServerConfig
+from src.server import Server
+from src.transport import Connection
+from src.user_manager import UserManager
+
+
+class FakeTransport(asyncio.Transport):
+    def __init__(self) -> None:
+        super().__init__()
+        self.written = bytearray()
+        self.reading = True
+        self.closing = False
+
+    def write(self, data: bytes | bytearray | memoryview) -> None:
+        self.written += data
+
+    def pause_reading(self) -> None:
+        self.reading = False
+
+    def resume_reading(self) -> None:
+        self.reading = True
+
+    def is_closing(self) -> bool:
+        return self.closing
+
+    def close(self) -> None:
+        self.closing = True
+
+    def get_extra_info(self, name: str, default: Any = None) -> Any:
+        return ("127.0.0.1", 4000) if name == "peername" else default
+
+
+def connect(limit: int = 64) -> tuple[Connection, FakeTransport]:
+    connection = Connection(limit=limit)
+    transport = FakeTransport()
+    connection.connection_made(transport)
+    return connection, transport
+
+
+@pytest.mark.asyncio
+async def test_readline_joins_chunks_and_keeps_the_rest() -> None:
+    connection, _ = connect()
+    connection.data_received(b"NICK al")
+    connection.data_received(b"ice\r\nUSER")
+
+    assert await connection.readline() == b"NICK alice\r\n"
+
+    pending = asyncio.create_task(connection.readline())
+    await asyncio.sleep(0)
+    assert not pending.done()
+    connection.data_received(b" alice 0 * :Alice\r\n")
+    assert await pending == b"USER alice 0 * :Alice\r\n"
+
+
+@pytest.mark.asyncio
+async def test_readline_returns_partial_data_then_nothing_at_eof() -> None:
+    connection, _ = connect()
+    connection.data_received(b"QUIT")
+    connection.eof_received()
+
+    assert await connection.readline() == b"QUIT"
+    assert await connection.readline() == b""
+
+
+@pytest.mark.asyncio
+async def test_overlong_line_is_an_error_and_pauses_reading() -> None:
+    connection, transport = connect(limit=16)
+    connection.data_received(b"x" * 40)
+
+    assert not transport.reading
+    with pytest.raises(ValueError):
+        await connection.readline()
+
+
+@pytest.mark.asyncio
+async def test_reading_resumes_once_the_buffer_is_consumed() -> None:
+    connection, transport = connect(limit=16)
+    connection.data_received(b"PING a\r\n" * 5)
+    assert not transport.reading
+
+    for _ in range(4):
+        assert await connection.readline() == b"PING a\r\n"
+    assert transport.reading
+
+
+@pytest.mark.asyncio
+async def test_readuntil_and_readexactly() -> None:
+    connection, _ = connect()
+    connection.data_received(b"GET / HTTP/1.1\r\n\r\n\x81\x05hello")
+
+    assert await connection.readuntil(b"\r\n\r\n") == b"GET / HTTP/1.1\r\n\r\n"
+    assert await connection.readexactly(2) == b"\x81\x05"
+    assert await connection.readexactly(5) == b"hello"
+
+    connection.data_received(b"abc")
+    connection.eof_received()
+    with pytest.raises(asyncio.IncompleteReadError):
+        await connection.readexactly(4)
+
+
+@pytest.mark.asyncio
+async def test_writes_go_to_the_transport_and_drain_waits_while_paused() -> None:
+    connection, transport = connect()
+    connection.write(b"PING a\r\n")
+    connection.writelines([b"PONG ", b"a\r\n"])
+    assert transport.written == b"PING a\r\nPONG a\r\n"
+
+    await connection.drain()
+
+    connection.pause_writing()
+    drain = asyncio.create_task(connection.drain())
+    await asyncio.sleep(0)
+    assert not drain.done()
+    connection.resume_writing()
+    await drain
+
+
+@pytest.mark.asyncio
+async def test_connection_lost_wakes_readers_and_writers() -> None:
+    connection, _ = connect()
+    read = asyncio.create_task(connection.readline())
+    connection.pause_writing()
+    drain = asyncio.create_task(connection.drain())
+    await asyncio.sleep(0)
+
+    connection.connection_lost(ConnectionResetError())
+
+    assert await read == b""
+    with pytest.raises(ConnectionResetError):
+        await drain
+    await connection.wait_closed()
+
+
+@pytest.mark.asyncio
+async def test_concurrent_drains_all_finish() -> None:
+    connection, _ = connect()
+    connection.pause_writing()
+    first = asyncio.create_task(connection.drain())
+    second = asyncio.create_task(connection.drain())
+    await asyncio.sleep(0)
+    assert not first.done() and not second.done()
+
+    connection.resume_writing()
+    await asyncio.gather(first, second)
+
+    connection.pause_writing()
+    first = asyncio.create_task(connection.drain())
+    second = asyncio.create_task(connection.drain())
+    await asyncio.sleep(0)
+
+    connection.connection_lost(None)
+
+    for drain in (first, second):
+        with pytest.raises(ConnectionResetError):
+            await drain
+
+
+@pytest.mark.asyncio
+async def test_server_serves_clients_over_connections() -> None:
+    UserManager().users.clear()
+    ChannelManager().channels.clear()
+    config = ServerConfig(name="test.irc", host="127.0.0.1", port=0, password="")
+    server = Server(config)
+    loop = asyncio.get_running_loop()
+    listener = await loop.create_server(
+        partial(Connection, server.handle_connection), "127.0.0.1", 0
+    )
+    port = listener.sockets[0].getsockname()[1]
+
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    writer.write(b"NICK alice\r\nUSER alice 0 * :Alice\r\n")
+    await writer.drain()
+    line = await asyncio.wait_for(reader.readline(), timeout=2)
+    assert line.startswith(b":test.irc 001 alice ")
+
+    writer.write(b"QUIT\r\n")
+    await asyncio.wait_for(reader.read(), timeout=2)
+    writer.close()
+    listener.close()
+    await listener.wait_closed()
+    server.command_handler.close()
@@ -73,3 +73,23 @@ def test_add_duplicate_user_raises_error(user_manager: UserManager) -> None:
         user_manager.add_user("WOJTEK", session2)
 
     assert user_manager.get_session("wojtek") == session1
+
+
+def test_host_and_username_indexes(user_manager: UserManager) -> None:
+    first = MagicMock()
+    first.nickname = "Wojtek"
+    first.username = "wz"
+    first.host = "10.0.0.1"
+    second = MagicMock()
+    second.nickname = "Hubert"
+    second.username = "hp"
+    second.host = "10.0.0.1"
+    user_manager.add_user("Wojtek", first)
+    user_manager.add_user("Hubert", second)
+
+    assert list(user_manager.find_by_host("10.0.0.1")) == [first, second]
+    assert list(user_manager.find_by_username("WZ")) == [first]
+
+    user_manager.remove_user("Wojtek")
+    assert list(user_manager.find_by_host("10.0.0.1")) == [second]
+    assert list(user_manager.find_by_username("wz")) == []
@@ -0,0 +1,344 @@
+import asyncio
+import os
+import struct
+import zlib
+from collections.abc import AsyncGenerator
+
+import pytest
+from test_transport import FakeTransport
+
+from src.channel_manager import ChannelManager
+from src.config import ServerConfig, WebSocketListenerConfig
+from src.server import Server
+from src.transport import Connection
+from src.user_manager import UserManager
+from src.websocket import (
+    DEFLATE_TAIL,
+    FRAMES,
+    OP_BINARY,
+    OP_CLOSE,
+    OP_PING,
+    OP_PONG,
+    OP_TEXT,
+    WebSocketConnection,
+    accept_key,
+    negotiate_deflate,
+    unmask,
+)
+
+
+class WebSocketClient:
+    def __init__(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        self.reader = reader
+        self.writer = writer
+        self.headers = ""
+
+    @classmethod
+    async def connect(cls, port: int, *headers: str) -> "WebSocketClient":
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        request = [
+            "GET / HTTP/1.1",
+            f"Host: 127.0.0.1:{port}",
+            "Upgrade: websocket",
+            "Connection: Upgrade",
+            "Sec-WebSocket-Key: dGhlIHNhbXBsZSBub25jZQ==",
+            "Sec-WebSocket-Version: 13",
+            *headers,
+            "",
+            "",
+        ]
+        writer.write("\r\n".join(request).encode())
+        client = cls(reader, writer)
+        response = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), 2)
+        client.headers = response.decode()
+        return client
+
+    def send_frame(
+        self, opcode: int, payload: bytes, fin: bool = True, masked: bool = True
+    ) -> None:
+        first = (0x80 if fin else 0) | opcode
+        mask = os.urandom(4) if masked else b""
+        length = len(payload)
+        if length < 126:
+            header = bytes((first, (0x80 if masked else 0) | length))
+        else:
+            header = struct.pack("!BBH", first, (0x80 if masked else 0) | 126, length)
+        self.writer.write(
+            header + mask + (unmask(payload, mask) if masked else payload)
+        )
+
+    def send(self, line: str) -> None:
+        self.send_frame(OP_TEXT, line.encode())
+
+    async def read_frame(self) -> tuple[int, bool, bytes]:
+        head = await asyncio.wait_for(self.reader.readexactly(2), 2)
+        length = head[1] & 0x7F
+        if length == 126:
+            (length,) = struct.unpack("!H", await self.reader.readexactly(2))
+        payload = await self.reader.readexactly(length)
+        return head[0] & 0x0F, bool(head[0] & 0x40), payload
+
+    async def wait_for(self, expected: str) -> bytes:
+        while True:
+            opcode, compressed, payload = await self.read_frame()
+            if compressed:
+                inflater = zlib.decompressobj(wbits=-15)
+                payload = inflater.decompress(payload + DEFLATE_TAIL)
+            if expected.encode() in payload:
+                return payload
+
+    async def register(self, nick: str) -> None:
+        self.send("PASS password")
+        self.send(f"NICK {nick}")
+        self.send(f"USER {nick.lower()} 0 * :{nick}")
+        await self.wait_for(":are supported by this server")
+
+    async def close(self) -> None:
+        # The server answers a close frame and then drops the connection;
+        # after closing on an error it may be gone before ours arrives
+        self.send_frame(OP_CLOSE, struct.pack("!H", 1000))
+        try:
+            await asyncio.wait_for(self.reader.read(), 2)
+        except ConnectionResetError:
+            pass
+        self.writer.close()
+
+
+@pytest.fixture
+def listener() -> WebSocketListenerConfig:
+    return WebSocketListenerConfig(host="127.0.0.1", port=0)
+
+
+@pytest.fixture
+async def ws_server(
+    listener: WebSocketListenerConfig,
+) -> AsyncGenerator[Server, None]:
+    UserManager().users.clear()
+    ChannelManager().channels.clear()
+
+    config = ServerConfig(
+        name="test.ws",
+        host="127.0.0.1",
+        port=0,
+        password="password",
+        websocket=[listener],
+    )
+    server_app = Server(config)
+    server_task = asyncio.create_task(server_app.start())
+
+    while not server_app.server or not server_app.server.sockets:
+        await asyncio.sleep(0.01)
+
+    yield server_app
+
+    await server_app.stop()
+    server_task.cancel()
+    try:
+        await server_task
+    except asyncio.CancelledError:
+        pass
+
+
+def client_frame(payload: bytes) -> bytes:
+    mask = os.urandom(4)
+    return bytes((0x80 | OP_TEXT, 0x80 | len(payload))) + mask + unmask(payload, mask)
+
+
+def ws_port(server_app: Server) -> int:
+    port: int = server_app.websocket_servers[0].sockets[0].getsockname()[1]
+    return port
+
+
+def test_accept_key_matches_rfc_example() -> None:
+    assert accept_key("dGhlIHNhbXBsZSBub25jZQ==") == "s3pPLMBiTxaQ9kYGzzhZRbK+xOo="
+
+
+def test_negotiate_deflate() -> None:
+    assert negotiate_deflate("permessage-deflate; client_max_window_bits") == (
+        "permessage-deflate; server_no_context_takeover",
+        15,
+    )
+    assert negotiate_deflate(
+        "permessage-deflate; server_max_window_bits=10; client_no_context_takeover"
+    ) == (
+        "permessage-deflate; server_no_context_takeover;"
+        " client_no_context_takeover; server_max_window_bits=10",
+        10,
+    )
+    # Unknown parameters and unusable windows skip the offer
+    assert negotiate_deflate("permessage-deflate; foo") is None
+    assert negotiate_deflate("permessage-deflate; server_max_window_bits=8") is None
+    assert negotiate_deflate("x-webkit-deflate-frame") is None
+
+
+def test_frames_are_shared_between_connections() -> None:
+    line = b":nick!user@host PRIVMSG #chan :" + b"hello " * 40
+    frame = FRAMES.encode(line, OP_TEXT, 15)
+
+    assert FRAMES.encode(bytes(line), OP_TEXT, 15) is frame
+    assert frame[0] & 0x40 and frame[1] < 126
+    inflater = zlib.decompressobj(wbits=-15)
+    assert inflater.decompress(frame[2:] + DEFLATE_TAIL) == line
+
+
+@pytest.mark.asyncio
+async def test_text_client_registers_and_chats_with_tcp_client(
+    ws_server: Server,
+) -> None:
+    web = await WebSocketClient.connect(
+        ws_port(ws_server), "Sec-WebSocket-Protocol: text.ircv3.net"
+    )
+    assert "101 Switching Protocols" in web.headers
+    assert "Sec-WebSocket-Protocol: text.ircv3.net" in web.headers
+    await web.register("Web")
+
+    assert ws_server.server is not None
+    port = ws_server.server.sockets[0].getsockname()[1]
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    writer.write(b"PASS password\r\nNICK Tcp\r\nUSER tcp 0 * :Tcp\r\n")
+    writer.write(b"JOIN #mixed\r\n")
+    await writer.drain()
+
+    web.send("JOIN #mixed")
+    await web.wait_for("366")
+    writer.write(b"PRIVMSG #mixed :hello web\r\n")
+    await writer.drain()
+
+    payload = await web.wait_for("PRIVMSG #mixed")
+    assert payload == b":Tcp PRIVMSG #mixed :hello web"
+
+    web.send("PRIVMSG Tcp :hello tcp")
+    while True:
+        line = await asyncio.wait_for(reader.readline(), 2)
+        if b"PRIVMSG Tcp" in line:
+            break
+    assert line == b":Web PRIVMSG Tcp :hello tcp\r\n"
+
+    writer.write(b"QUIT\r\n")
+    await asyncio.wait_for(reader.read(), 2)
+    writer.close()
+    await web.close()
+
+
+@pytest.mark.asyncio
+async def test_binary_protocol_and_ping(ws_server: Server) -> None:
+    web = await WebSocketClient.connect(
+        ws_port(ws_server), "Sec-WebSocket-Protocol: binary.ircv3.net, text.ircv3.net"
+    )
+    assert "Sec-WebSocket-Protocol: binary.ircv3.net" in web.headers
+
+    web.send_frame(OP_PING, b"are you there")
+    assert await web.read_frame() == (OP_PONG, False, b"are you there")
+
+    # Messages may be fragmented and still carry one line
+    web.send_frame(OP_BINARY, b"NICK Fra", fin=False)
+    web.send_frame(0, b"gment\r\n")
+    web.send("USER frag 0 * :Frag")
+    web.send("PASS password")
+
+    opcode, _, payload = await web.read_frame()
+    assert opcode == OP_BINARY
+    assert b" 464 Fragment " in payload
+    await web.close()
+
+
+@pytest.mark.asyncio
+async def test_unmasked_frame_is_a_protocol_error(ws_server: Server) -> None:
+    web = await WebSocketClient.connect(ws_port(ws_server))
+    web.send_frame(OP_TEXT, b"NICK Bad", masked=False)
+
+    opcode, _, payload = await web.read_frame()
+    assert opcode == OP_CLOSE
+    assert struct.unpack("!H", payload[:2])[0] == 1002
+    await web.close()
+
+
+@pytest.mark.asyncio
+async def test_disallowed_origin_is_refused(
+    ws_server: Server, listener: WebSocketListenerConfig
+) -> None:
+    listener.allowed_origins = ["https://chat.example.com"]
+
+    web = await WebSocketClient.connect(
+        ws_port(ws_server), "Origin: https://evil.example.com"
+    )
+    assert web.headers.startswith("HTTP/1.1 403 Forbidden")
+    await web.close()
+
+
+@pytest.mark.asyncio
+async def test_permessage_deflate(
+    ws_server: Server, listener: WebSocketListenerConfig
+) -> None:
+    listener.permessage_deflate = True
+
+    web = await WebSocketClient.connect(
+        ws_port(ws_server),
+        "Sec-WebSocket-Extensions: permessage-deflate; client_max_window_bits",
+    )
+    assert (
+        "Sec-WebSocket-Extensions: permessage-deflate; server_no_context_takeover"
+        in web.headers
+    )
+
+    # A compressed client message
+    compressor = zlib.compressobj(wbits=-15)
+    data = compressor.compress(b"PASS password") + compressor.flush(zlib.Z_SYNC_FLUSH)
+    web.writer.write(
+        bytes((0x80 | 0x40 | OP_TEXT, 0x80 | (len(data) - 4)))
+        + b"\x00\x00\x00\x00"
+        + data[:-4]
+    )
+    web.send("NICK Squeezed")
+    web.send("USER squeezed 0 * :" + "long realname " * 20)
+
+    payload = await web.wait_for(" 001 Squeezed ")
+    assert payload.startswith(b":test.ws 001 Squeezed")
+    await web.close()
+
+
+@pytest.mark.asyncio
+async def test_pump_stops_while_lines_wait_to_be_handled() -> None:
+    stream = Connection(limit=1024)
+    transport = FakeTransport()
+    stream.connection_made(transport)
+    websocket = WebSocketConnection(stream, max_message_size=64)
+    pump = asyncio.create_task(websocket.pump())
+
+    # The line loop is not reading, so the pump stops at twice the limit
+    # and the frames behind it fill the Connection until it pauses the socket
+    while transport.reading:
+        stream.data_received(client_frame(b"PRIVMSG #chat :" + b"x" * 40))
+        await asyncio.sleep(0)
+    assert websocket.lines.size <= 2 * 64 + 64
+
+    line = await websocket.lines.readline()
+    assert line == b"PRIVMSG #chat :" + b"x" * 40 + b"\r\n"
+    while websocket.lines.size:
+        await websocket.lines.readline()
+        await asyncio.sleep(0)
+    assert transport.reading
+
+    pump.cancel()
+
+
+@pytest.mark.asyncio
+async def test_message_with_too_many_lines_is_refused(
+    ws_server: Server, listener: WebSocketListenerConfig
+) -> None:
+    listener.max_lines_per_message = 2
+
+    web = await WebSocketClient.connect(ws_port(ws_server))
+    web.send("PASS password\r\nNICK Multi")
+    web.send("USER multi 0 * :Multi")
+    await web.wait_for(":are supported by this server")
+
+    web.send("PING a\r\nPING b\r\nPING c")
+    opcode, _, payload = await web.read_frame()
+    while opcode != OP_CLOSE:
+        assert b"PONG" not in payload
+        opcode, _, payload = await web.read_frame()
+    assert struct.unpack("!H", payload[:2])[0] == 1008
+    await web.close()